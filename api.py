@@ -0,0 +1,233 @@
+# api.py
+# Paginated JSON API over Scenarios, PlayStatistics and PlayTracker.
+#
+#   GET /api/scenarios?entry_date=2023-11-08&fields=value,play_count&sort=value&limit=50
+#   GET /api/scenarios?...&cursor=<next_cursor from the previous page>
+#   GET /api/scenarios/export.ndjson?fields=value,play_count&from=2023-11-01
+#
+# Pagination is keyset based, so every page costs the same no matter how deep it is.
+# There is no offline copy behind the API: while the database is unreachable every
+# route answers 503.
+import base64
+import itertools
+import json
+from datetime import date
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+from db_handler import PoolError
+from stats_db import get_data_from_db, stream_from_db, conditional_get
+
+api = Blueprint('api', __name__)
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Per resource: selectable fields, equality filters, the date column used for
+# from/to ranges, and the sortable (indexed) columns. Each sort lists the
+# columns that make its order unique, which double as the keyset; 'nullable'
+# names the key columns that may be NULL, so a cursor may carry None for them.
+RESOURCES = {
+    'scenarios': {
+        'table': 'Scenarios',
+        'fields': ['value', 'name', 'favs', 'play_count', 'entry_date'],
+        'filters': ['value', 'entry_date'],
+        'date_field': 'entry_date',
+        'sorts': {
+            'entry_date': ['entry_date', 'value'],
+            'value': ['value', 'entry_date']
+        },
+        'nullable': [],
+        'default_sort': 'entry_date'
+    },
+    'play_statistics': {
+        'table': 'PlayStatistics',
+        'fields': ['date', 'time_period', 'play_change', 'most_played_mod', 'play_count'],
+        'filters': ['date', 'time_period'],
+        'date_field': 'date',
+        'sorts': {
+            'date': ['date', 'time_period']
+        },
+        'nullable': ['date', 'time_period'],
+        'default_sort': 'date'
+    },
+    'play_tracker': {
+        'table': 'PlayTracker',
+        'fields': ['period_type', 'period_value', 'total_plays', 'most_played_mod', 'play_count'],
+        'filters': ['period_type', 'period_value'],
+        'date_field': None,
+        'sorts': {
+            'period_value': ['period_value', 'period_type']
+        },
+        'nullable': ['period_type', 'period_value'],
+        'default_sort': 'period_value'
+    }
+}
+
+
+class ApiError(Exception):
+    pass
+
+
+@api.errorhandler(PoolError)
+def database_unavailable(error):
+    return jsonify({'error': "Database unavailable; the API has no offline fallback"}), 503
+
+
+def encode_cursor(values):
+    raw = json.dumps([json_value(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, key_columns, nullable=()):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except ValueError:
+        raise ApiError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(key_columns):
+        raise ApiError("Invalid cursor")
+    # Only the scalars encode_cursor writes; anything else would reach the query as a parameter
+    for column, value in zip(key_columns, values):
+        if value is None:
+            if column not in nullable:
+                raise ApiError("Invalid cursor")
+        elif isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ApiError("Invalid cursor")
+    return values
+
+
+def keyset_condition(columns, descending):
+    # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y), which every engine can index
+    operator = '<' if descending else '>'
+    clauses = []
+    for position, column in enumerate(columns):
+        equal_parts = [f"{previous} = %s" for previous in columns[:position]]
+        clauses.append('(' + ' AND '.join(equal_parts + [f"{column} {operator} %s"]) + ')')
+    params_order = []
+    for position in range(len(columns)):
+        params_order.extend(range(position + 1))
+    return '(' + ' OR '.join(clauses) + ')', params_order
+
+
+def select_fields(resource, args):
+    fields = resource['fields']
+    selected = args.get('fields')
+    if not selected:
+        return list(fields)
+    selected = [field.strip() for field in selected.split(',') if field.strip()]
+    unknown = [field for field in selected if field not in fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+
+def filter_conditions(resource, args):
+    conditions = []
+    params = []
+    for field in resource['filters']:
+        if field in args:
+            conditions.append(f"{field} = %s")
+            params.append(args[field])
+    if resource['date_field']:
+        if 'from' in args:
+            conditions.append(f"{resource['date_field']} >= %s")
+            params.append(args['from'])
+        if 'to' in args:
+            conditions.append(f"{resource['date_field']} <= %s")
+            params.append(args['to'])
+    return conditions, params
+
+
+def json_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def build_query(resource, args):
+    selected = select_fields(resource, args)
+
+    sort = args.get('sort', resource['default_sort'])
+    if sort not in resource['sorts']:
+        raise ApiError(f"Cannot sort by {sort}; choose one of {', '.join(resource['sorts'])}")
+    key_columns = resource['sorts'][sort]
+    order = args.get('order', 'desc' if sort == resource['date_field'] else 'asc')
+    if order not in ('asc', 'desc'):
+        raise ApiError("order must be asc or desc")
+    descending = order == 'desc'
+
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    conditions, params = filter_conditions(resource, args)
+    if args.get('cursor'):
+        cursor_values = decode_cursor(args['cursor'], key_columns, resource['nullable'])
+        condition, params_order = keyset_condition(key_columns, descending)
+        conditions.append(condition)
+        params.extend(cursor_values[position] for position in params_order)
+
+    # Key columns are always fetched so the next cursor can be built
+    columns = selected + [column for column in key_columns if column not in selected]
+    query = f"SELECT {', '.join(columns)} FROM {resource['table']}"
+    if conditions:
+        query += " WHERE " + ' AND '.join(conditions)
+    direction = 'DESC' if descending else 'ASC'
+    query += " ORDER BY " + ', '.join(f"{column} {direction}" for column in key_columns)
+    query += " LIMIT %s;"
+    params.append(limit + 1)
+    return query, tuple(params), selected, key_columns, limit
+
+
+@api.route('/<resource_name>')
+@conditional_get
+def list_resource(resource_name):
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        return jsonify({'error': f"Unknown resource: {resource_name}"}), 404
+
+    try:
+        query, params, selected, key_columns, limit = build_query(resource, request.args)
+    except ApiError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = get_data_from_db(query, params)
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([page[-1][column] for column in key_columns])
+
+    data = [{field: json_value(row[field]) for field in selected} for row in page]
+    return jsonify({'data': data, 'next_cursor': next_cursor, 'limit': limit})
+
+
+@api.route('/<resource_name>/export.ndjson')
+@conditional_get
+def export_resource(resource_name):
+    # Whole-history export, one JSON object per line, streamed straight from the cursor
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        return jsonify({'error': f"Unknown resource: {resource_name}"}), 404
+
+    try:
+        selected = select_fields(resource, request.args)
+        conditions, params = filter_conditions(resource, request.args)
+    except ApiError as e:
+        return jsonify({'error': str(e)}), 400
+
+    key_columns = resource['sorts'][resource['default_sort']]
+    query = f"SELECT {', '.join(selected)} FROM {resource['table']}"
+    if conditions:
+        query += " WHERE " + ' AND '.join(conditions)
+    query += " ORDER BY " + ', '.join(key_columns) + ";"
+
+    # Fetch the first row here, so an unreachable database is a 503 rather than a cut-off stream
+    rows = stream_from_db(query, tuple(params))
+    first = next(rows, None)
+    rows = itertools.chain([first], rows) if first is not None else []
+
+    def generate():
+        for row in rows:
+            yield json.dumps(dict(zip(selected, map(json_value, row)))) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -0,0 +1,230 @@
+# archive_format.py
+# Compact columnar format for the daily moddata snapshots in data_archive.
+#
+#   python archive_format.py convert data_archive            # moddata_*.json -> moddata_*.mdc
+#   python archive_format.py convert data_archive --remove-json
+#   python archive_format.py show data_archive/moddata_20231108.mdc
+#
+# A .mdc file is MAGIC followed by one zlib stream holding a little-endian uint32
+# header length, a JSON header with the string dictionaries (values, names, tags),
+# and the integer columns back to back:
+#
+#   name_id  int32 x count     index into header['names']
+#   favs     int64 x count
+#   plays    int64 x count     the 'play-count' field
+#   tag_pos  int32 x count+1   row i's tags are tag_ids[tag_pos[i]:tag_pos[i + 1]]
+#   tag_ids  int32 x tag_pos[count]
+#
+# Names and tags repeat from day to day and between mods, so each is stored once.
+import argparse
+import glob
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+MAGIC = b'MODC\x01\n'
+EXTENSION = '.mdc'
+COMPRESS_LEVEL = 6
+
+# (column, array typecode, itemsize); typecodes are checked against itemsize at import
+COLUMNS = [('name_id', 'i', 4), ('favs', 'q', 8), ('plays', 'q', 8), ('tag_pos', 'i', 4), ('tag_ids', 'i', 4)]
+for _, typecode, itemsize in COLUMNS:
+    assert array(typecode).itemsize == itemsize
+
+
+def to_little_endian(column):
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+class Snapshot:
+    """One day's mods, held as columns. records() rebuilds the moddata JSON list."""
+
+    def __init__(self, values, names, tags, name_id, favs, plays, tag_pos, tag_ids):
+        self.values = values
+        self.names = names
+        self.tags = tags
+        self.name_id = name_id
+        self.favs = favs
+        self.plays = plays
+        self.tag_pos = tag_pos
+        self.tag_ids = tag_ids
+
+    def __len__(self):
+        return len(self.values)
+
+    def name(self, row):
+        return self.names[self.name_id[row]]
+
+    def row_tags(self, row):
+        return [self.tags[tag_id] for tag_id in self.tag_ids[self.tag_pos[row]:self.tag_pos[row + 1]]]
+
+    def play_counts(self):
+        # {value: play_count}, the shape most history lookups need, without building records
+        return dict(zip(self.values, self.plays))
+
+    def records(self):
+        return [{
+            'value': self.values[row],
+            'data-tags': self.row_tags(row),
+            'name': self.name(row),
+            'favs': self.favs[row],
+            'play-count': self.plays[row]
+        } for row in range(len(self.values))]
+
+
+class SnapshotWriter:
+    """Builds the columns one record at a time; nothing is written until close()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.values = []
+        self.names = {}
+        self.tags = {}
+        self.name_id = array('i')
+        self.favs = array('q')
+        self.plays = array('q')
+        self.tag_pos = array('i', [0])
+        self.tag_ids = array('i')
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    def write(self, record):
+        self.values.append(record['value'])
+        self.name_id.append(self.names.setdefault(record['name'], len(self.names)))
+        self.favs.append(record['favs'])
+        self.plays.append(record['play-count'])
+        for tag in record['data-tags']:
+            self.tag_ids.append(self.tags.setdefault(tag, len(self.tags)))
+        self.tag_pos.append(len(self.tag_ids))
+
+    def close(self):
+        header = json.dumps({
+            'count': len(self.values),
+            'values': self.values,
+            'names': list(self.names),
+            'tags': list(self.tags)
+        }, separators=(',', ':')).encode('utf-8')
+        parts = [struct.pack('<I', len(header)), header]
+        parts += [to_little_endian(getattr(self, column)).tobytes() for column, _, _ in COLUMNS]
+
+        # Write then rename, like the other archive writers, so readers never see a partial file
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as archive_file:
+            archive_file.write(MAGIC)
+            archive_file.write(zlib.compress(b''.join(parts), COMPRESS_LEVEL))
+        os.replace(temp_path, self.path)
+        return os.path.getsize(self.path)
+
+    def abort(self):
+        # Nothing reaches disk before close(), so a failed run has nothing to remove
+        pass
+
+
+def write_snapshot(path, records):
+    writer = SnapshotWriter(path)
+    for record in records:
+        writer.write(record)
+    return writer.close()
+
+
+def read_snapshot(path):
+    with open(path, 'rb') as archive_file:
+        data = archive_file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a columnar moddata file")
+    payload = memoryview(zlib.decompress(data[len(MAGIC):]))
+
+    header_length, = struct.unpack_from('<I', payload)
+    offset = 4 + header_length
+    header = json.loads(bytes(payload[4:offset]).decode('utf-8'))
+    count = header['count']
+
+    columns = {}
+    for column, typecode, itemsize in COLUMNS:
+        if column == 'tag_pos':
+            length = count + 1
+        elif column == 'tag_ids':
+            length = columns['tag_pos'][-1]
+        else:
+            length = count
+        values = array(typecode)
+        values.frombytes(payload[offset:offset + length * itemsize])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        columns[column] = values
+        offset += length * itemsize
+
+    return Snapshot(header['values'], header['names'], header['tags'], **columns)
+
+
+def load_moddata(path):
+    """The moddata list for one day from either archive format."""
+    if path.endswith(EXTENSION):
+        return read_snapshot(path).records()
+    with open(path, 'r') as json_file:
+        return json.load(json_file)
+
+
+def convert_file(json_path, remove_json=False):
+    # Returns (json bytes, columnar bytes), or None if the file can't round-trip exactly
+    with open(json_path, 'r') as json_file:
+        records = json.load(json_file)
+    target = os.path.splitext(json_path)[0] + EXTENSION
+    try:
+        size = write_snapshot(target, records)
+    except (KeyError, TypeError, OverflowError):
+        return None
+    if read_snapshot(target).records() != records:
+        os.remove(target)
+        return None
+
+    json_size = os.path.getsize(json_path)
+    if remove_json:
+        os.remove(json_path)
+    return json_size, size
+
+
+def convert_directory(archive_dir, remove_json=False):
+    total_json = total_columnar = 0
+    for json_path in sorted(glob.glob(os.path.join(archive_dir, 'moddata_*.json'))):
+        result = convert_file(json_path, remove_json)
+        if result is None:
+            print(f"Skipped {json_path}: does not round-trip through the columnar format")
+            continue
+        total_json += result[0]
+        total_columnar += result[1]
+        print(f"{json_path}: {result[0]} -> {result[1]} bytes")
+    if total_json:
+        print(f"Total {total_json} -> {total_columnar} bytes ({total_json / total_columnar:.1f}x smaller)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and inspect columnar moddata archives.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="Convert moddata_*.json files in a directory")
+    convert.add_argument('archive_dir', nargs='?', default='data_archive')
+    convert.add_argument('--remove-json', action='store_true', help="Delete each JSON file once converted")
+    show = commands.add_parser('show', help="Print a columnar file as the original JSON")
+    show.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        start = time.perf_counter()
+        convert_directory(args.archive_dir, args.remove_json)
+        print(f"Done in {time.perf_counter() - start:.2f}s")
+    else:
+        json.dump(load_moddata(args.path), sys.stdout, indent=4)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# archived_stats.py
+# PlayStatistics and PlayTracker rows read back from the JSON files the scraper archives,
+# for the dashboard routes to answer from while the database is unreachable.
+#
+#   dailyStats_YYYYMMDD.json   one day's PlayStatistics, also inside cleaner bundles
+#   weekTracker.json, ...      every PlayTracker row of one period type
+#
+# Rows come back shaped like the rows of the matching database queries.
+import glob
+import gzip
+import json
+import os
+
+from cleaner import BUNDLE_FILE, DAILY_FILE, file_date
+
+TRACKER_FILES = {
+    'week': 'weekTracker.json',
+    'month': 'monthTracker.json',
+    'year': 'yearTracker.json'
+}
+
+_daily = None
+
+
+def read_daily_stats(archive_dir):
+    """{date: dailyStats} for every archived day; daily files win over bundled copies."""
+    days = {}
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'bundle_*.jsonl.gz'))):
+        if not BUNDLE_FILE.match(os.path.basename(path)):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as bundle_file:
+            for line in bundle_file:
+                # Only the dailyStats lines matter, so moddata deltas are never applied
+                entry = json.loads(line)
+                if entry['kind'] == 'dailyStats':
+                    days[file_date(entry['date'])] = entry['data']
+    for path in glob.glob(os.path.join(archive_dir, 'dailyStats_*.json')):
+        match = DAILY_FILE.match(os.path.basename(path))
+        if match:
+            with open(path, 'r') as json_file:
+                days[file_date(match.group(2))] = json.load(json_file)
+    return days
+
+
+def daily_stats(archive_dir):
+    # Read again only when a file was added, replaced or bundled since the last read
+    global _daily
+    paths = glob.glob(os.path.join(archive_dir, 'dailyStats_*.json'))
+    paths += glob.glob(os.path.join(archive_dir, 'bundle_*.jsonl.gz'))
+    signature = sorted((path, os.path.getmtime(path)) for path in paths)
+    if _daily is None or _daily[0] != signature:
+        _daily = (signature, read_daily_stats(archive_dir))
+    return _daily[1]
+
+
+def statistics_rows(archive_dir, day):
+    """PlayStatistics rows of one day, as `SELECT * FROM PlayStatistics WHERE date = day` returns them."""
+    stats = daily_stats(archive_dir).get(day)
+    if stats is None:
+        return []
+    return [{'date': day,
+             'time_period': time_period,
+             'play_change': period['change'],
+             'most_played_mod': period['most_played_mod']['name'],
+             'play_count': period['most_played_mod']['play_count']}
+            for time_period, period in stats['total_plays'].items()]
+
+
+def statistics_history(archive_dir, time_period):
+    """(date, play_change, most_played_mod, play_count) of one time period for every day, newest first."""
+    rows = []
+    for day, stats in sorted(daily_stats(archive_dir).items(), reverse=True):
+        period = stats['total_plays'].get(time_period)
+        if period is not None:
+            rows.append((day, period['change'], period['most_played_mod']['name'],
+                         period['most_played_mod']['play_count']))
+    return rows
+
+
+def tracker_rows(archive_dir, period_type):
+    """PlayTracker rows of one period type, newest period first."""
+    path = os.path.join(archive_dir, TRACKER_FILES[period_type])
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as json_file:
+        tracker_data = json.load(json_file)
+    return [{'period_type': period_type,
+             'period_value': period_value,
+             'total_plays': period['total_plays'],
+             'most_played_mod': period['most_played_mod']['name'],
+             'play_count': period['most_played_mod']['play_count']}
+            for period_value, period in sorted(tracker_data.items(), reverse=True)]
@@ -0,0 +1,280 @@
+# backfill.py
+# Rebuild PlayStatistics and PlayTracker for a date range from the Scenarios history.
+#
+#   python backfill.py --start 2023-11-01 --end 2024-06-30 --workers 4
+#
+# Each worker sweeps a contiguous chunk of the range in date order over a single
+# streamed scan of Scenarios. A snapshot's total is summed once when it arrives and
+# every rolling window is then a difference of two totals; each day's most played mods
+# come from compute_daily_stats(). While few mods change from one day to the next
+# (SPARSE_CHANGES), every window (the four rolling ones and the week, month and year
+# trackers) instead keeps its per-mod play count changes and moves a day at a time:
+# the mods that changed on the entering day are added and those that changed on the
+# day leaving the window subtracted. Only the last month of snapshots plus the
+# year-start anchors stay in memory. The parent writes all rows in one transaction,
+# so a failed rebuild leaves the tables untouched.
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import groupby
+
+import db_handler
+import scenario_changes
+from period_stats import (PLAYS_BEFORE_TRACKING, ROLLING_PERIODS, SnapshotSet, WindowSums, compute_daily_stats,
+                          snapshot_changes, snapshot_total, tracker_periods)
+from scenario_changes import scenario_reads
+from snapshot_dates import to_date
+from stats_writer import delete_play_statistics, insert_play_statistics, upsert_trackers
+
+# The furthest any window looks back: 30 days rolling, or the day before the 1st of a 31-day month
+WINDOW_DAYS = 31
+FETCH_BATCH = 5000
+# Fraction of mods whose play count changed from the day before. Below SPARSE_CHANGES the
+# windows switch to running sums; at DENSE_CHANGES, about where recomputing every window
+# costs the same, they switch back. Busy stretches are measured every DENSE_CHECK_DAYS.
+SPARSE_CHANGES = 0.05
+DENSE_CHANGES = 0.08
+DENSE_CHECK_DAYS = 7
+
+# Two scalar subqueries, so each end is read off the date index (SQLite can't do both at once)
+DATE_RANGE_QUERY = "SELECT (SELECT MIN(entry_date) FROM Scenarios), (SELECT MAX(entry_date) FROM Scenarios);"
+SNAPSHOT_RANGE_QUERY = """
+    SELECT entry_date, value, name, play_count FROM Scenarios
+    WHERE entry_date BETWEEN %s AND %s
+    ORDER BY entry_date;
+"""
+
+
+def oldest_snapshot_date(connection):
+    cursor = connection.cursor()
+    cursor.execute(scenario_reads(DATE_RANGE_QUERY))
+    oldest, newest = cursor.fetchone()
+    cursor.close()
+    if oldest is None:
+        return None, None
+    return to_date(oldest), to_date(newest)
+
+
+def year_anchors(start_date, end_date):
+    # The year tracker measures from Dec 31 of the previous year
+    return {date(year - 1, 12, 31) for year in range(start_date.year, end_date.year + 1)}
+
+
+def load_snapshots(connection, dates):
+    snapshots = {day: {} for day in dates}
+    if not dates:
+        return snapshots
+    cursor = connection.cursor()
+    placeholders = ', '.join(['%s'] * len(dates))
+    cursor.execute(scenario_reads(f"""
+    SELECT value, name, play_count, entry_date FROM Scenarios
+    WHERE entry_date IN ({placeholders});
+    """), tuple(dates))
+    for value, name, play_count, entry_date in cursor.fetchall():
+        snapshots[to_date(entry_date)][value] = (name, play_count)
+    cursor.close()
+    return snapshots
+
+
+def stream_snapshots(connection, start_date, end_date):
+    """Yield (date, {value: (name, play_count)}) for every snapshot in the range, oldest first."""
+    cursor = connection.cursor(buffered=False)
+    cursor.execute(SNAPSHOT_RANGE_QUERY, (start_date, end_date))
+
+    def rows():
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH)
+            if not batch:
+                break
+            yield from batch
+
+    for entry_date, day_rows in groupby(rows(), key=lambda row: row[0]):
+        yield to_date(entry_date), {value: (name, play_count) for _, value, name, play_count in day_rows}
+    cursor.close()
+
+
+def sweep(start_date, end_date, sparse_changes=SPARSE_CHANGES, dense_changes=DENSE_CHANGES):
+    """Daily stats and trackers for every snapshot day in [start_date, end_date].
+
+    Returns (statistics, trackers): statistics holds PlayStatistics rows as
+    (date, time_period, change, most_played_mod), trackers maps
+    (period_type, period_value) to the row computed on the last day of the chunk
+    that falls in that period. Both match compute_daily_stats() day by day.
+    """
+    connection = db_handler.get_connection()
+    try:
+        oldest_date, _ = oldest_snapshot_date(connection)
+        if oldest_date is None:
+            return [], {}
+
+        # Anchors older than the streamed window are loaded up front and kept for the whole sweep
+        window_start = start_date - timedelta(days=WINDOW_DAYS)
+        anchors = year_anchors(start_date, end_date) | {oldest_date}
+        snapshots = load_snapshots(connection, sorted(day for day in anchors if day < window_start))
+        totals = {day: snapshot_total(mods) for day, mods in snapshots.items()}
+        snapshot_set = SnapshotSet(snapshots, oldest_date, totals)
+
+        compared = {}  # (earlier day, later day) -> snapshot_changes() between them
+        windows = {}  # time_period or period_type -> WindowSums, while the days are sparse
+
+        def changes(before, before_mods, after, after_mods):
+            if (before, after) not in compared:
+                compared[before, after] = snapshot_changes(before_mods, after_mods)
+            return compared[before, after]
+
+        def window_stats(day, mods):
+            # compute_daily_stats() from the running sums: only the mods that moved are touched
+            starts = [(time_period, day - timedelta(days=days)) for time_period, days in ROLLING_PERIODS]
+            starts += [(period_type, start) for period_type, _, start in tracker_periods(day)]
+            for key, start in starts:
+                # A window whose start has no snapshot measures from the oldest one, as period_totals() does
+                start = start if snapshots.get(start) else oldest_date
+                window = windows.get(key)
+                if window is None:
+                    windows[key] = WindowSums(start, snapshots[start], day, mods)
+                    continue
+                window.move_end(day, mods, changes(window.end, window.end_mods, day, mods))
+                if start != window.start:
+                    window.move_start(start, snapshots[start],
+                                      changes(window.start, window.start_mods, start, snapshots[start]))
+
+            current_total_plays = snapshot_set.total_plays(day)
+            time_periods = []
+            for time_period, days in ROLLING_PERIODS:
+                change = current_total_plays - snapshot_set.total_plays(day - timedelta(days=days))
+                time_periods.append((time_period, int(change), windows[time_period].most_played()))
+            day_trackers = []
+            for period_type, period_value, _ in tracker_periods(day):
+                total_plays, most_played_mod = windows[period_type].period_totals()
+                if period_type == 'year':
+                    total_plays += PLAYS_BEFORE_TRACKING
+                day_trackers.append((period_type, period_value, total_plays, most_played_mod))
+            return time_periods, day_trackers
+
+        statistics = []
+        trackers = {}
+        previous = None  # (day, mods) of the snapshot before
+        next_check = start_date  # While the days are dense, how often they are measured again
+        stream = scenario_changes.stream_snapshots if db_handler.change_only() else stream_snapshots
+        for day, mods in stream(connection, window_start, end_date):
+            snapshots[day] = mods
+            totals[day] = snapshot_total(mods)
+
+            if day >= start_date:
+                if windows or day >= next_check:
+                    moved = changes(*previous, day, mods) if previous else None
+                    limit = dense_changes if windows else sparse_changes
+                    if moved is None or len(moved) >= limit * len(mods):
+                        windows.clear()
+                        compared.clear()
+                        next_check = day + timedelta(days=DENSE_CHECK_DAYS)
+                    else:
+                        next_check = day
+                if day < next_check:
+                    time_periods, day_trackers = compute_daily_stats(snapshot_set, day)
+                else:
+                    time_periods, day_trackers = window_stats(day, mods)
+                statistics.extend((day,) + period for period in time_periods)
+                for tracker in day_trackers:
+                    trackers[tracker[:2]] = tracker
+            previous = day, mods
+
+            # Drop snapshots, and comparisons, that no later day in the chunk can reach
+            horizon = day - timedelta(days=WINDOW_DAYS)
+            for old_day in [old_day for old_day in snapshots if old_day < horizon and old_day not in anchors]:
+                del snapshots[old_day]
+                del totals[old_day]
+            for pair in [pair for pair in compared if pair[1] < horizon]:
+                del compared[pair]
+    finally:
+        connection.close()
+    return statistics, trackers
+
+
+def split_range(start_date, end_date, chunks):
+    days = (end_date - start_date).days + 1
+    chunks = max(1, min(chunks, days))
+    size, extra = divmod(days, chunks)
+    ranges = []
+    chunk_start = start_date
+    for index in range(chunks):
+        chunk_end = chunk_start + timedelta(days=size + (1 if index < extra else 0) - 1)
+        ranges.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+    return ranges
+
+
+def backfill(start_date=None, end_date=None, workers=1, dry_run=False):
+    """Recompute PlayStatistics for the range and the PlayTracker rows it touches."""
+    connection = db_handler.get_connection()
+    try:
+        oldest_date, newest_date = oldest_snapshot_date(connection)
+    finally:
+        connection.close()
+    if oldest_date is None:
+        raise ValueError("Scenarios is empty, nothing to backfill")
+    start_date = max(start_date or oldest_date, oldest_date)
+    end_date = min(end_date or newest_date, newest_date)
+    if start_date > end_date:
+        raise ValueError(f"No Scenarios data between {start_date} and {end_date}")
+
+    ranges = split_range(start_date, end_date, workers)
+    if len(ranges) == 1:
+        results = [sweep(start_date, end_date)]
+    else:
+        with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+            results = list(executor.map(sweep, *zip(*ranges)))
+
+    # Chunks come back in date order, so later trackers overwrite earlier ones
+    statistics = []
+    trackers = {}
+    for chunk_statistics, chunk_trackers in results:
+        statistics.extend(chunk_statistics)
+        trackers.update(chunk_trackers)
+
+    if not dry_run:
+        connection = db_handler.get_connection()
+        cursor = connection.cursor()
+        connection.start_transaction()
+        try:
+            delete_play_statistics(cursor, start_date, end_date)
+            insert_play_statistics(cursor, statistics)
+            upsert_trackers(cursor, list(trackers.values()))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+    return start_date, end_date, statistics, trackers
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild PlayStatistics and PlayTracker from the Scenarios history.")
+    parser.add_argument('--start', type=parse_date, help="First day to rebuild (default: oldest snapshot)")
+    parser.add_argument('--end', type=parse_date, help="Last day to rebuild (default: newest snapshot)")
+    parser.add_argument('--workers', type=int, default=1, help="Processes to split the range across")
+    parser.add_argument('--backend', choices=sorted(db_handler.BACKENDS), help="Database backend (default: DB_BACKEND)")
+    parser.add_argument('--dry-run', action='store_true', help="Compute everything but write nothing")
+    args = parser.parse_args()
+
+    if args.backend:
+        db_handler.configure(backend=args.backend)
+
+    started = time.perf_counter()
+    start_date, end_date, statistics, trackers = backfill(args.start, args.end, workers=args.workers, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - started
+    action = "Computed" if args.dry_run else "Rebuilt"
+    print(f"{action} {len(statistics)} PlayStatistics rows and {len(trackers)} PlayTracker rows "
+          f"for {start_date} to {end_date} in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# bench_archive_format.py
+# Size on disk and load time of moddata snapshots as indented JSON vs. the columnar format.
+#
+#   python benchmarks/bench_archive_format.py --archive-dir data_archive --repeat 20
+#   python benchmarks/bench_archive_format.py --synthetic-mods 5000 --days 30
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from archive_format import write_snapshot, read_snapshot, EXTENSION
+
+
+def synthetic_archive(directory, mods, days):
+    # Realistic-looking history: stable names and tags, slowly growing counts
+    tags = [f"tag{i}" for i in range(40)]
+    records = [{'value': f"mod_{i:05d}", 'data-tags': random.sample(tags, random.randint(0, 4)),
+                'name': f"Scenario number {i}", 'favs': random.randint(0, 500), 'play-count': random.randint(0, 50000)}
+               for i in range(mods)]
+    for day in range(days):
+        for record in records:
+            record['play-count'] += random.randint(0, 30)
+            record['favs'] += random.randint(0, 1)
+        with open(os.path.join(directory, f"moddata_2024{day // 28 + 1:02d}{day % 28 + 1:02d}.json"), 'w') as json_file:
+            json.dump(records, json_file, indent=4)
+
+
+def timed(function, paths, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            function(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_json(path):
+    with open(path, 'r') as json_file:
+        return json.load(json_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and columnar moddata archives.")
+    parser.add_argument('--archive-dir', default='data_archive')
+    parser.add_argument('--synthetic-mods', type=int, default=0, help="Benchmark generated files instead")
+    parser.add_argument('--days', type=int, default=30, help="Days of generated history")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_archive_')
+    try:
+        if args.synthetic_mods:
+            synthetic_archive(work_dir, args.synthetic_mods, args.days)
+        else:
+            for path in glob.glob(os.path.join(args.archive_dir, 'moddata_*.json')):
+                shutil.copy(path, work_dir)
+        json_paths = sorted(glob.glob(os.path.join(work_dir, 'moddata_*.json')))
+        if not json_paths:
+            sys.exit("No moddata_*.json files to benchmark")
+
+        columnar_paths = []
+        for json_path in json_paths:
+            columnar_path = os.path.splitext(json_path)[0] + EXTENSION
+            write_snapshot(columnar_path, load_json(json_path))
+            assert read_snapshot(columnar_path).records() == load_json(json_path), "round trip mismatch"
+            columnar_paths.append(columnar_path)
+
+        json_size = sum(os.path.getsize(path) for path in json_paths)
+        columnar_size = sum(os.path.getsize(path) for path in columnar_paths)
+        rows = sum(len(read_snapshot(path)) for path in columnar_paths)
+        print(f"{len(json_paths)} snapshots, {rows} rows")
+        print(f"{'':>24} {'bytes':>12} {'load all':>10}")
+        print(f"{'json (indent=4)':>24} {json_size:>12} {timed(load_json, json_paths, args.repeat) * 1000:>8.1f}ms")
+        print(f"{'columnar':>24} {columnar_size:>12} {timed(read_snapshot, columnar_paths, args.repeat) * 1000:>8.1f}ms")
+        print(f"{'columnar -> records':>24} {'':>12} "
+              f"{timed(lambda path: read_snapshot(path).records(), columnar_paths, args.repeat) * 1000:>8.1f}ms")
+        print(f"{'columnar -> play_counts':>24} {'':>12} "
+              f"{timed(lambda path: read_snapshot(path).play_counts(), columnar_paths, args.repeat) * 1000:>8.1f}ms")
+        print(f"size ratio {json_size / columnar_size:.1f}x")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
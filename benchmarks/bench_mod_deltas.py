@@ -0,0 +1,71 @@
+# bench_mod_deltas.py
+# Compares the old nested next() scan with the dict join in mod_deltas.
+#
+#   python benchmarks/bench_mod_deltas.py --sizes 10000 50000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mod_deltas import play_count_deltas
+
+
+def make_snapshots(mod_count, seed=0):
+    rng = random.Random(seed)
+    previous_data = []
+    current_data = []
+    for i in range(mod_count):
+        value = f"mod_{i:06d}"
+        plays = rng.randint(0, 50000)
+        # Roughly 1% of the current mods are new and missing from the previous day
+        if rng.random() > 0.01:
+            previous_data.append({'value': value, 'name': f"Mod {i}", 'play_count': plays})
+        current_data.append({'value': value, 'name': f"Mod {i}", 'play_count': plays + rng.randint(0, 200)})
+    rng.shuffle(previous_data)
+    rng.shuffle(current_data)
+    return current_data, previous_data
+
+
+def nested_scan(current_data, previous_data):
+    # The lookup get_top_mods and mod_plays_by_period used before mod_deltas
+    deltas = []
+    for mod in current_data:
+        start_mod = next((m for m in previous_data if m['value'] == mod['value']), None)
+        start_plays = start_mod['play_count'] if start_mod else 0
+        deltas.append({'name': mod['name'], 'play_count_change': mod['play_count'] - start_plays})
+    return deltas
+
+
+def time_call(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark snapshot delta computation.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--naive-limit', type=int, default=10000,
+                        help="Skip the nested scan above this many mods (it is quadratic)")
+    args = parser.parse_args()
+
+    print(f"{'mods':>8} {'dict join':>12} {'nested scan':>14}")
+    for size in args.sizes:
+        current_data, previous_data = make_snapshots(size)
+        joined = time_call(play_count_deltas, current_data, previous_data)
+        if size <= args.naive_limit:
+            nested = f"{time_call(nested_scan, current_data, previous_data, repeat=1) * 1000:.1f} ms"
+        else:
+            nested = "skipped"
+        print(f"{size:>8} {joined * 1000:>9.1f} ms {nested:>14}")
+
+
+if __name__ == '__main__':
+    main()
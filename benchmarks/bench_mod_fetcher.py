@@ -0,0 +1,51 @@
+# bench_mod_fetcher.py
+# Wall-clock time of the per-mod stats fetch against a local stub with injected latency.
+#
+#   python benchmarks/bench_mod_fetcher.py --mods 200 --latency 0.05 --concurrency 1 4 16 32
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mod_fetcher import fetch_all_mod_stats
+from stub_backend import start_stub_backend
+
+
+def make_mods(count):
+    return [{'value': f"mod_{i:05d}", 'data-tags': [], 'name': f"Mod {i}", 'favs': i, 'play-count': i * 10}
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent mod stats fetching.")
+    parser.add_argument('--mods', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds of latency per stub response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of 503s to exercise retries")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    mods = make_mods(args.mods)
+    server = start_stub_backend(mods, latency=args.latency, error_rate=args.error_rate)
+    api_url = f"{server.base_url}/api/get_mod"
+    expected = [{'favs': mod['favs'], 'playCount': mod['play-count']} for mod in mods]
+
+    print(f"{args.mods} mods, {args.latency * 1000:.0f} ms latency per request")
+    print(f"{'concurrency':>12} {'wall':>10} {'mods/s':>10} {'speedup':>9}")
+    baseline = None
+    try:
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            results = fetch_all_mod_stats([mod['value'] for mod in mods], concurrency=concurrency,
+                                          timeout=10, retries=5, backoff=0.05, api_url=api_url)
+            elapsed = time.perf_counter() - start
+            assert results == expected, "results out of order or incomplete"
+            baseline = baseline or elapsed
+            print(f"{concurrency:>12} {elapsed:>9.2f}s {args.mods / elapsed:>10.1f} {baseline / elapsed:>8.1f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# bench_mod_matrix.py
+# Query latency and memory of the mod x date matrix at dashboard scale.
+#
+#   python benchmarks/bench_mod_matrix.py                          # 10,000 mods x 3 years, generated
+#   python benchmarks/bench_mod_matrix.py --mods 2000 --days 365
+#   python benchmarks/bench_mod_matrix.py --db /tmp/bench_stats.db  # load a seeded database instead
+#
+# Generated histories follow seed_local.py's model (heavy-tailed plays, launches and
+# delistings) but go straight into the matrix, so no database has to be seeded first.
+# Every query the routes make is timed on its own, without rendering.
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db_handler
+from mod_matrix import ModMatrix, load
+from period_stats import compute_daily_stats
+from seed_local import generate_mods
+
+
+def generated_matrix(mods, days):
+    matrix = ModMatrix()
+    population = generate_mods(mods, days)
+    start_date = date.today() - timedelta(days=days - 1)
+    for offset in range(days):
+        rows = []
+        for mod in population:
+            if offset < mod['launch'] or (mod['delisted'] is not None and offset >= mod['delisted']):
+                continue
+            plays = int(random.expovariate(1 / mod['rate']))
+            mod['play-count'] += plays
+            mod['favs'] += int(plays * 0.01 + random.random())
+            rows.append((mod['value'], mod['name'], mod['favs'], mod['play-count']))
+        matrix.add_snapshot(start_date + timedelta(days=offset), rows)
+    return matrix
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mod x date matrix queries and memory.")
+    parser.add_argument('--mods', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=3 * 365)
+    parser.add_argument('--db', help="Load this SQLite database instead of generating a history")
+    parser.add_argument('--repeat', type=int, default=200, help="Timed runs per query")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.db:
+        db_handler.configure(backend='sqlite', sqlite_path=args.db)
+        matrix = load()
+        source = args.db
+    else:
+        matrix = generated_matrix(args.mods, args.days)
+        source = "generated"
+    print(f"Loaded {source} in {time.perf_counter() - start:.1f}s")
+    for key, value in matrix.stats().items():
+        print(f"  {key:<16} {value}")
+
+    latest = matrix.latest()
+    dates = matrix.state.dates
+    top_mod = matrix.top_movers(dates[0], latest, 1)[0][0]
+    bounds = [latest] + [latest - timedelta(days=days) for days in (1, 3, 7, 30)]
+    queries = [
+        ('latest snapshot rows (/)', lambda: matrix.snapshot(latest)),
+        ('mod history, 5 lookbacks (/mod)', lambda: [matrix.latest_row(top_mod, bound) for bound in bounds]),
+        ('top 10 over 1 day', lambda: matrix.top_movers(latest - timedelta(days=1), latest, 10)),
+        ('top 10 over 30 days', lambda: matrix.top_movers(latest - timedelta(days=30), latest, 10)),
+        ('top 10 over the whole history', lambda: matrix.top_movers(dates[0], latest, 10)),
+        ('period plays, day (/mod_plays)', lambda: matrix.period_plays(latest, latest - timedelta(days=1))),
+        ('period plays, month (/mod_plays)', lambda: matrix.period_plays(latest, latest - timedelta(days=30))),
+        ('total plays', lambda: matrix.total_plays(latest)),
+        ('period totals, year', lambda: matrix.period_totals(date(latest.year - 1, 12, 31), latest)),
+        ('daily rollups (compute_daily_stats)', lambda: compute_daily_stats(matrix, latest)),
+    ]
+    print(f"{'query':<40} {'p50':>10} {'max':>10}")
+    for name, query in queries:
+        median, worst = timed(query, args.repeat)
+        print(f"{name:<40} {median * 1e6:>8.0f}us {worst * 1e6:>8.0f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# bench_routes.py
+# Latency of every dashboard route, served by the real app from a local SQLite dataset.
+#
+#   python benchmarks/bench_routes.py --db /tmp/bench_stats.db --mods 1500 --days 400
+#   python benchmarks/bench_routes.py --db /tmp/bench_stats.db --requests 50 --cold
+#
+# The database is seeded with seed_local.py on first use. --cold clears the query cache
+# before every request so each one pays for its queries; otherwise only the first does.
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db_handler
+from seed_local import seed
+
+
+def route_urls(snapshot_dates, get_snapshot):
+    latest = snapshot_dates.latest()
+    mods = sorted(get_snapshot(latest), key=lambda mod: mod['play_count'], reverse=True)
+    week_ago = (latest - timedelta(days=7)).strftime('%Y-%m-%d')
+    return [
+        '/',
+        '/?sort_by=play_count',
+        '/recent',
+        '/by_day',
+        '/by_week',
+        '/by_month',
+        '/get_top_mods/1',
+        '/get_top_mods/30',
+        f"/mod/{mods[0]['value']}",
+        f"/mod/{mods[-1]['value']}",
+        f"/mod_plays/day/{latest:%Y-%m-%d}",
+        f"/mod_plays/week/{week_ago}",
+        f"/mod_plays/month/{latest:%Y-%m-%d}",
+        '/api/scenarios?limit=1000',
+        '/api/play_statistics?limit=1000',
+    ]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard route latency on a local SQLite dataset.")
+    parser.add_argument('--db', default='bench_stats.db')
+    parser.add_argument('--mods', type=int, default=1000, help="Mods to seed if the database doesn't exist")
+    parser.add_argument('--days', type=int, default=365, help="Days to seed if the database doesn't exist")
+    parser.add_argument('--requests', type=int, default=20, help="Timed requests per route")
+    parser.add_argument('--cold', action='store_true', help="Clear the query cache before every request")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Seeding {args.db} with {args.mods} mods x {args.days} days...")
+        seed(args.db, args.mods, args.days)
+    db_handler.configure(backend='sqlite', sqlite_path=args.db)
+
+    # Imported after configure() so the app's pool points at the benchmark database
+    from flask_app import app
+    from stats_db import snapshot_dates, get_snapshot, query_cache
+
+    client = app.test_client()
+    urls = route_urls(snapshot_dates, get_snapshot)
+    print(f"{'route':<40} {'status':>6} {'first':>9} {'p50':>9} {'p95':>9} {'bytes':>9}")
+    for url in urls:
+        query_cache.clear()
+        start = time.perf_counter()
+        response = client.get(url, buffered=True)
+        first = time.perf_counter() - start
+
+        samples = []
+        for _ in range(args.requests):
+            if args.cold:
+                query_cache.clear()
+            start = time.perf_counter()
+            client.get(url, buffered=True).close()
+            samples.append(time.perf_counter() - start)
+        print(f"{url[:40]:<40} {response.status_code:>6} {first * 1000:>7.1f}ms "
+              f"{statistics.median(samples) * 1000:>7.1f}ms {percentile(samples, 0.95) * 1000:>7.1f}ms "
+              f"{len(response.data):>9}")
+
+
+if __name__ == '__main__':
+    main()
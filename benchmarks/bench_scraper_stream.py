@@ -0,0 +1,89 @@
+# bench_scraper_stream.py
+# Wall-clock time of a scrape with fetching and DB writes run back to back vs. overlapped.
+#
+#   python benchmarks/bench_scraper_stream.py --mods 1000 --latency 0.02 --write-latency 0.0005
+#
+# Runs against the stub backend and a throwaway SQLite file whose writes are slowed down
+# per row, so both the network and the database take a measurable share of the run.
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db_handler
+import scraper
+from storage import SQLiteConnection, SQLiteCursor
+from stub_backend import start_stub_backend
+
+
+def make_mods(count):
+    return [{'value': f"mod_{i:05d}", 'data-tags': ['tag'], 'name': f"Mod {i}", 'favs': i, 'play-count': i * 10}
+            for i in range(count)]
+
+
+class SlowCursor(SQLiteCursor):
+    write_latency = 0.0
+
+    def executemany(self, query, seq_params):
+        seq_params = list(seq_params)
+        time.sleep(self.write_latency * len(seq_params))
+        super().executemany(query, seq_params)
+
+
+class SlowSQLiteConnection(SQLiteConnection):
+    def cursor(self, dictionary=False, **kwargs):
+        return SlowCursor(self._connection.cursor(), dictionary=dictionary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper with and without streaming writes.")
+    parser.add_argument('--mods', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds of latency per stub response")
+    parser.add_argument('--write-latency', type=float, default=0.0005, help="Seconds added per written row")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=2)
+    args = parser.parse_args()
+
+    SlowCursor.write_latency = args.write_latency
+    work_dir = tempfile.mkdtemp(prefix='bench_scraper_')
+    db_path = os.path.join(work_dir, 'stats.db')
+    db_handler.register_backend('slow_sqlite', lambda: SlowSQLiteConnection(db_path), dialect='sqlite')
+    db_handler.configure(backend='slow_sqlite')
+    server = start_stub_backend(make_mods(args.mods), latency=args.latency)
+
+    print(f"{args.mods} mods, {args.latency * 1000:.0f} ms per request, "
+          f"{args.write_latency * 1000:.2f} ms per written row, concurrency {args.concurrency}")
+    print(f"{'mode':>10} {'wall':>9} {'fetch+write stages':>20}")
+    try:
+        for _ in range(args.repeat):
+            for stream in (False, True):
+                # Fresh archive and run log per run; the database keeps the rows, as a daily run would
+                run_dir = tempfile.mkdtemp(dir=work_dir)
+                start = time.perf_counter()
+                log = scraper.run(catalog_url=f"{server.base_url}/MODLOADERFILE.html",
+                                  api_url=f"{server.base_url}/api/get_mod",
+                                  archive_dir=run_dir,
+                                  run_log=os.path.join(run_dir, 'runs.jsonl'),
+                                  catalog_cache=None,
+                                  static_site_dir=None,
+                                  concurrency=args.concurrency,
+                                  stream=stream,
+                                  dry_run=True)
+                elapsed = time.perf_counter() - start
+                stages = {stage['stage']: stage['seconds'] for stage in log.stages}
+                if stream:
+                    detail = f"fetch_write {stages['fetch_write']:.2f}s"
+                else:
+                    detail = f"fetch {stages['stats_fetch']:.2f}s + db {stages['db_upsert']:.2f}s"
+                print(f"{'stream' if stream else 'serial':>10} {elapsed:>8.2f}s {detail:>20}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
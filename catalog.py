@@ -0,0 +1,161 @@
+# catalog.py
+# Fetches the MODLOADERFILE catalog, reusing the cached parse when it hasn't changed.
+#
+# A run first asks with If-None-Match / If-Modified-Since; a 304 returns the cached
+# catalog without downloading anything. Otherwise each chunk is hashed and fed to a
+# parser that only pulls out the <option> elements as it arrives, so the body is never
+# held in memory. If the body hashes the same as last time the parse is thrown away
+# and the cached catalog returned; if not, the result is diffed against the cached
+# catalog so callers see which mods were added or removed.
+import codecs
+import hashlib
+import json
+import os
+from html.parser import HTMLParser
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+
+
+class OptionParser(HTMLParser):
+    """Collects {'value', 'data-tags', 'name'} for every <option>, ignoring everything else."""
+
+    def __init__(self, encoding='utf-8'):
+        super().__init__(convert_charrefs=True)
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.options = []
+        self.current = None
+        self.text = []
+
+    def feed_bytes(self, chunk):
+        # The decoder keeps back a multi-byte character split across two chunks
+        self.feed(self.decoder.decode(chunk))
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'option':
+            self.finish_option()  # An unclosed <option> ends where the next one starts
+            attrs = dict(attrs)
+            self.current = {
+                'value': attrs.get('value') or '',
+                'data-tags': (attrs.get('data-tags') or '').split()
+            }
+            self.text = []
+
+    def handle_data(self, data):
+        if self.current is not None:
+            self.text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag in ('option', 'select'):
+            self.finish_option()
+
+    def finish_option(self):
+        if self.current is not None:
+            self.current['name'] = ''.join(self.text)
+            self.options.append(self.current)
+            self.current = None
+
+    def close(self):
+        self.feed(self.decoder.decode(b'', final=True))
+        super().close()
+        self.finish_option()
+
+
+def parse_options(chunks, encoding='utf-8'):
+    parser = OptionParser(encoding)
+    for chunk in chunks:
+        parser.feed_bytes(chunk)
+    parser.close()
+    return parser.options
+
+
+def catalog_diff(previous, current):
+    # Mod values that appeared in or disappeared from the catalog since the cached version
+    previous_values = {mod['value'] for mod in previous}
+    current_values = {mod['value'] for mod in current}
+    return ([mod['value'] for mod in current if mod['value'] not in previous_values],
+            sorted(previous_values - current_values))
+
+
+class CatalogResult:
+    def __init__(self, catalog, source, size, added, removed):
+        self.catalog = catalog
+        self.source = source  # 'not_modified', 'unchanged' or 'parsed'
+        self.bytes = size
+        self.added = added
+        self.removed = removed
+
+    @property
+    def changed(self):
+        return bool(self.added or self.removed)
+
+
+def load_cache(path):
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r') as cache_file:
+                return json.load(cache_file)
+        except ValueError:
+            pass  # A corrupt cache just means a full fetch
+    return None
+
+
+def save_cache(path, cache):
+    # Write then rename so an interrupted run never leaves a truncated cache
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(temp_path, path)
+
+
+def fetch_catalog(url, cache_path=None, session=None, timeout=30):
+    """Fetch the catalog at url; cache_path=None always downloads and parses."""
+    cache = load_cache(cache_path)
+    previous = cache['catalog'] if cache else []
+
+    headers = {}
+    if cache and cache.get('etag'):
+        headers['If-None-Match'] = cache['etag']
+    if cache and cache.get('last_modified'):
+        headers['If-Modified-Since'] = cache['last_modified']
+
+    http = session or requests
+    with http.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304 and cache:
+            return CatalogResult(previous, 'not_modified', 0, [], [])
+        response.raise_for_status()  # Raise an error for HTTP errors
+
+        # Hash and parse each chunk as it arrives; whether the parse is needed is only
+        # known once the whole body has been hashed
+        digest = hashlib.sha256()
+        parser = OptionParser(response.encoding or 'utf-8')
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            digest.update(chunk)
+            parser.feed_bytes(chunk)
+            size += len(chunk)
+        parser.close()
+        content_hash = digest.hexdigest()
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+    if cache and cache.get('sha256') == content_hash:
+        catalog, source = previous, 'unchanged'  # The parse is thrown away
+    else:
+        catalog, source = parser.options, 'parsed'
+
+    if cache_path:
+        save_cache(cache_path, {
+            'etag': etag,
+            'last_modified': last_modified,
+            'sha256': content_hash,
+            'catalog': catalog
+        })
+
+    # Without a cache every mod counts as new
+    added, removed = catalog_diff(previous, catalog) if source == 'parsed' else ([], [])
+    return CatalogResult(catalog, source, size, added, removed)
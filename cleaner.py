@@ -1,23 +1,300 @@
+# cleaner.py
+# Tiered retention for data_archive: recent days stay as daily files, older days are
+# rolled into compressed weekly bundles and those into monthly bundles.
+#
+#   python cleaner.py                      # apply the retention policy
+#   python cleaner.py --dry-run            # only report what would be bundled
+#   python cleaner.py --restore data_archive/bundle_2023-11.jsonl.gz --output restored/
+#
+# Tiers, by file date:
+#   newer than --daily-days (7)            moddata_/dailyStats_ files as written by the scraper
+#   older, month newer than --weekly-days  bundle_YYYY-MM-wN.jsonl.gz (days 1-7, 8-14, 15-21, 22-end)
+#   whole month older than --weekly-days   bundle_YYYY-MM.jsonl.gz
+#
+# A bundle is gzipped JSON lines, one line per archived file in date order. The first
+# moddata day of a bundle is stored in full; every later day only as its differences
+# from the day before: play count and fav deltas, added and removed mods, renamed or
+# retagged mods. Bundles are read and written one day at a time, restore to
+# byte-identical files, and a run that is interrupted or repeated picks up where it
+# left off. Tracker files and anything else without a date in its name are left alone.
+import argparse
+import calendar
+import glob
+import gzip
+import heapq
+import json
 import os
-import time
-
-# Define the directory and the age threshold
-data_archive_dir = 'data_archive'
-age_threshold_in_seconds = 7 * 24 * 60 * 60  # 1 week
-
-# Get the current time
-current_time = time.time()
-
-# Iterate over files in the directory
-for filename in os.listdir(data_archive_dir):
-    file_path = os.path.join(data_archive_dir, filename)
-
-    # Check if the file is older than the threshold
-    file_age = current_time - os.path.getmtime(file_path)
-    if file_age > age_threshold_in_seconds:
-        try:
-            # Delete the file
-            os.remove(file_path)
-            print(f"Deleted old file: {file_path}")
-        except Exception as e:
-            print(f"Failed to delete {file_path}: {str(e)}")
+import re
+from datetime import date, datetime, timedelta
+
+from archive_format import load_moddata, write_snapshot, EXTENSION
+
+# Define the directory and the age thresholds
+ARCHIVE_DIR = 'data_archive'
+DAILY_DAYS = 7  # Days kept as individual files
+WEEKLY_DAYS = 35  # Months that ended longer ago than this are merged into one bundle
+
+DAILY_FILE = re.compile(r'^(moddata|dailyStats)_(\d{8})(\.json|' + re.escape(EXTENSION) + r')$')
+BUNDLE_FILE = re.compile(r'^bundle_(\d{4})-(\d{2})(?:-w([1-4]))?\.jsonl\.gz$')
+NUMERIC_FIELDS = ('play-count', 'favs')
+
+
+# --- Delta encoding of one day's moddata against the day before ---
+
+def encode_delta(previous, current):
+    previous_by_value = {record['value']: record for record in previous}
+    current_values = [record['value'] for record in current]
+    delta = {'added': [], 'removed': [], 'changed': {}}
+    for field in NUMERIC_FIELDS:
+        delta[field] = {}
+
+    for record in current:
+        value = record['value']
+        old = previous_by_value.get(value)
+        if old is None or list(old) != list(record):
+            delta['added'].append(record)  # New mod, or one whose fields changed shape: store it whole
+            continue
+        changed = {}
+        for field, new_value in record.items():
+            old_value = old[field]
+            if new_value == old_value and type(new_value) is type(old_value):
+                continue
+            if field in NUMERIC_FIELDS and type(new_value) is int and type(old_value) is int:
+                delta[field][value] = new_value - old_value
+            else:
+                changed[field] = new_value
+        if changed:
+            delta['changed'][value] = changed
+
+    # Mods re-added whole are dropped from the carried-over list first
+    added_values = {record['value'] for record in delta['added']}
+    current_set = set(current_values)
+    delta['removed'] = [value for value in previous_by_value if value not in current_set or value in added_values]
+    removed = set(delta['removed'])
+    expected_order = [record['value'] for record in previous if record['value'] not in removed] + \
+                     [record['value'] for record in delta['added']]
+    if expected_order != current_values:
+        delta['order'] = current_values
+    return {key: part for key, part in delta.items() if part}
+
+
+def apply_delta(previous, delta):
+    removed = set(delta.get('removed', []))
+    records = {}
+    order = []
+    for record in previous:
+        value = record['value']
+        if value in removed:
+            continue
+        record = dict(record)
+        for field in NUMERIC_FIELDS:
+            if value in delta.get(field, {}):
+                record[field] += delta[field][value]
+        record.update(delta.get('changed', {}).get(value, {}))
+        records[value] = record
+        order.append(value)
+    for record in delta.get('added', []):
+        records[record['value']] = record
+        order.append(record['value'])
+    return [records[value] for value in delta.get('order', order)]
+
+
+# --- Reading archived days ---
+
+def file_date(name):
+    return datetime.strptime(name, '%Y%m%d').date()
+
+
+def read_daily_file(path):
+    """(date, kind, entry) for one moddata_/dailyStats_ file, entry being what a bundle line stores."""
+    kind, day, extension = DAILY_FILE.match(os.path.basename(path)).groups()
+    entry = {'date': day, 'kind': kind, 'format': 'columnar' if extension == EXTENSION else 'json'}
+    if entry['format'] == 'columnar':
+        entry['data'] = load_moddata(path)
+    else:
+        # Read bytes, so CRLF line endings and the encoding survive the round trip untouched
+        with open(path, 'rb') as json_file:
+            raw = json_file.read()
+        text = raw.decode('utf-8')
+        entry['data'] = json.loads(text)
+        if json.dumps(entry['data'], indent=4).encode('utf-8') != raw:
+            entry['raw'] = text  # Not in the scraper's layout; keep the exact text as well
+    return file_date(day), kind, entry
+
+
+def read_bundle(path):
+    """Yield (date, kind, entry) for every day in a bundle, rebuilding full moddata as it goes."""
+    previous = None
+    with gzip.open(path, 'rt', encoding='utf-8') as bundle_file:
+        for line in bundle_file:
+            entry = json.loads(line)
+            if entry['kind'] == 'moddata':
+                if 'delta' in entry:
+                    entry['data'] = apply_delta(previous, entry.pop('delta'))
+                previous = entry['data']
+            yield file_date(entry['date']), entry['kind'], entry
+
+
+def iter_source(path):
+    if BUNDLE_FILE.match(os.path.basename(path)):
+        return read_bundle(path)
+    return iter([read_daily_file(path)])
+
+
+# --- Writing bundles ---
+
+def write_bundle(path, sources):
+    """Merge the sources (daily files and finer bundles) into one bundle at path.
+
+    Each source is read lazily and only one moddata day per source is held at a time.
+    """
+    temp_path = path + '.tmp'
+    previous = None
+    written = set()
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as bundle_file:
+        merged = heapq.merge(*[iter_source(source) for source in sources], key=lambda item: (item[0], item[1]))
+        for day, kind, entry in merged:
+            if (day, kind) in written:
+                continue  # Already bundled by an earlier, interrupted run
+            written.add((day, kind))
+            line = dict(entry)
+            if kind == 'moddata':
+                data = entry['data']
+                if previous is not None:
+                    delta = encode_delta(previous, data)
+                    # Check the delta before trusting it with the only copy
+                    if apply_delta(previous, delta) != data:
+                        raise ValueError(f"Delta for {entry['date']} does not reproduce the snapshot")
+                    del line['data']
+                    line['delta'] = delta
+                previous = data
+            bundle_file.write(json.dumps(line, separators=(',', ':')) + '\n')
+    os.replace(temp_path, path)
+    return len(written)
+
+
+def restore_bundle(path, output_dir):
+    """Write every day in a bundle back out as the original daily files."""
+    os.makedirs(output_dir, exist_ok=True)
+    restored = []
+    for _, kind, entry in read_bundle(path):
+        if entry['format'] == 'columnar':
+            target = os.path.join(output_dir, f"{kind}_{entry['date']}{EXTENSION}")
+            write_snapshot(target, entry['data'])
+        else:
+            target = os.path.join(output_dir, f"{kind}_{entry['date']}.json")
+            text = entry['raw'] if 'raw' in entry else json.dumps(entry['data'], indent=4)
+            with open(target, 'wb') as json_file:
+                json_file.write(text.encode('utf-8'))
+        restored.append(target)
+    return restored
+
+
+# --- Retention policy ---
+
+def month_end(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def week_of_month(day):
+    # Month-aligned weeks, so weekly bundles always nest inside their month's bundle
+    return min((day.day - 1) // 7, 3) + 1
+
+
+def week_end(year, month, week):
+    if week == 4:
+        return month_end(year, month)
+    return date(year, month, week * 7)
+
+
+def bundle_name(year, month, week=None):
+    if week is None:
+        return f"bundle_{year:04d}-{month:02d}.jsonl.gz"
+    return f"bundle_{year:04d}-{month:02d}-w{week}.jsonl.gz"
+
+
+def plan(archive_dir, today, daily_days=DAILY_DAYS, weekly_days=WEEKLY_DAYS):
+    """[(bundle path, [source paths])] for every bundle the policy wants (re)written."""
+    daily_cutoff = today - timedelta(days=daily_days)
+    weekly_cutoff = today - timedelta(days=weekly_days)
+
+    # Group every dated file and bundle by month, and by week within the month
+    months = {}
+    for path in sorted(glob.glob(os.path.join(archive_dir, '*'))):
+        name = os.path.basename(path)
+        daily = DAILY_FILE.match(name)
+        bundle = BUNDLE_FILE.match(name)
+        if daily:
+            day = file_date(daily.group(2))
+            key = (day.year, day.month)
+            week = week_of_month(day)
+        elif bundle:
+            key = (int(bundle.group(1)), int(bundle.group(2)))
+            week = int(bundle.group(3)) if bundle.group(3) else None
+        else:
+            continue
+        months.setdefault(key, {}).setdefault(week, []).append(path)
+
+    bundles = []
+    for (year, month), weeks in sorted(months.items()):
+        if month_end(year, month) < weekly_cutoff:
+            target = os.path.join(archive_dir, bundle_name(year, month))
+            sources = [path for paths in weeks.values() for path in paths]
+            if sources != [target]:
+                bundles.append((target, sorted(sources)))
+            continue
+        for week, paths in sorted((week, paths) for week, paths in weeks.items() if week is not None):
+            if week_end(year, month, week) >= daily_cutoff:
+                continue
+            target = os.path.join(archive_dir, bundle_name(year, month, week))
+            if paths != [target]:
+                bundles.append((target, sorted(paths)))
+    return bundles
+
+
+def apply_retention(archive_dir=ARCHIVE_DIR, today=None, daily_days=DAILY_DAYS, weekly_days=WEEKLY_DAYS,
+                    dry_run=False):
+    today = today or datetime.now().date()
+    reclaimed = 0
+    for target, sources in plan(archive_dir, today, daily_days, weekly_days):
+        before = sum(os.path.getsize(source) for source in sources)
+        if dry_run:
+            print(f"Would bundle {len(sources)} files ({before} bytes) into {target}")
+            continue
+
+        # The target may itself be a source (a bundle being extended); it is replaced atomically
+        days = write_bundle(target, sources)
+        for source in sources:
+            if source != target:
+                os.remove(source)
+        after = os.path.getsize(target)
+        reclaimed += before - after
+        print(f"Bundled {len(sources)} files ({days} days, {before} bytes) into {target} ({after} bytes)")
+
+    if not dry_run:
+        print(f"Reclaimed {reclaimed} bytes")
+    return reclaimed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll old data_archive files into weekly and monthly bundles.")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--daily-days', type=int, default=DAILY_DAYS, help="Days kept as individual files")
+    parser.add_argument('--weekly-days', type=int, default=WEEKLY_DAYS,
+                        help="Age after which a finished month is merged into one bundle")
+    parser.add_argument('--today', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="Apply the policy as of this date (default: today)")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would be bundled without writing")
+    parser.add_argument('--restore', metavar='BUNDLE', help="Write a bundle's days back out as daily files")
+    parser.add_argument('--output', default='restored', help="Directory for --restore")
+    args = parser.parse_args()
+
+    if args.restore:
+        restored = restore_bundle(args.restore, args.output)
+        print(f"Restored {len(restored)} files to {args.output}")
+        return
+    apply_retention(args.archive_dir, args.today, args.daily_days, args.weekly_days, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
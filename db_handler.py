@@ -1,5 +1,9 @@
-import mysql.connector
-from mysql.connector import pooling
+import os
+import sys
+import threading
+import time
+
+from storage import SQLiteConnection, DIALECTS
 
 dbconfig = {
         "host":'campaigntrailmojo.mysql.eu.pythonanywhere-services.com',
@@ -8,9 +12,279 @@ dbconfig = {
         "database":'campaigntrailmoj$default'
     }
 
-conn_pool = mysql.connector.pooling.MySQLConnectionPool(pool_name="mypool",
-                                                        pool_size=5,
-                                                        **dbconfig)
+# Which backend get_connection() hands out: 'mysql' in production, 'sqlite' for local runs
+DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql')
+SQLITE_PATH = os.environ.get('DB_SQLITE_PATH', 'local_stats.db')
+
+# How Scenarios snapshots are stored: 'full' writes every mod every day, 'changes' only
+# the mods whose counters changed (see scenario_changes.py)
+SCENARIO_STORAGE = os.environ.get('SCENARIO_STORAGE', 'full')
+SCENARIO_STORAGES = ('full', 'changes')
+
+# Pool tuning, overridable from the environment of the web worker
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))  # Seconds to wait for a free connection
+POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'  # Check connections before handing them out
+POOL_WARMUP = int(os.environ.get('DB_POOL_WARMUP', 0))  # Connections to open at startup
+
+
+class PoolError(Exception):
+    pass
+
+
+class PooledConnection:
+    """Connection checked out from an InstrumentedPool; close() hands it back."""
+
+    def __init__(self, pool, connection, caller):
+        self._pool = pool
+        self._connection = connection
+        self._caller = caller
+        self._checked_out_at = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection, self._caller, time.perf_counter() - self._checked_out_at)
+
+    def discard(self):
+        # For connections left in an unknown state, e.g. an abandoned unbuffered result
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.discard(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class InstrumentedPool:
+    """Fixed-size connection pool that records wait, hold and failure metrics."""
+
+    def __init__(self, connect, size=5, timeout=5, pre_ping=True):
+        self.connect = connect  # Callable that opens a new raw connection
+        self.size = size
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.idle = []
+        self.open_count = 0  # Idle, checked out and currently connecting
+        self.condition = threading.Condition()
+
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exhausted = 0
+        self.failed_connects = 0
+        self.failed_pings = 0
+        self.hold_by_caller = {}
+
+    def get_connection(self, caller='unknown'):
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        with self.condition:
+            while not self.idle and self.open_count >= self.size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.exhausted += 1
+                    raise PoolError(f"No connection available within {self.timeout}s (pool size {self.size})")
+                self.condition.wait(remaining)
+            if self.idle:
+                connection = self.idle.pop()
+            else:
+                connection = None
+                self.open_count += 1
+
+        if connection is not None and self.pre_ping and not self.ping(connection):
+            # Keep the slot and replace the dead connection with a fresh one
+            try:
+                connection.close()
+            except Exception:
+                pass
+            connection = None
+            with self.condition:
+                self.failed_pings += 1
+
+        if connection is None:
+            try:
+                connection = self.connect()
+            except Exception as e:
+                with self.condition:
+                    self.failed_connects += 1
+                    self.open_count -= 1
+                    self.condition.notify()
+                # Callers can tell "database unreachable" apart from a failing query
+                raise PoolError(f"Could not open a database connection: {e}") from e
+
+        waited = time.perf_counter() - start
+        with self.condition:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return PooledConnection(self, connection, caller)
+
+    def release(self, connection, caller, held):
+        try:
+            # Don't let an abandoned transaction leak into the next checkout
+            if getattr(connection, 'in_transaction', False):
+                connection.rollback()
+        except Exception:
+            self.discard(connection)
+            connection = None
+
+        with self.condition:
+            stats = self.hold_by_caller.setdefault(caller, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['total'] += held
+            stats['max'] = max(stats['max'], held)
+            if connection is not None:
+                self.idle.append(connection)
+            self.condition.notify()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.open_count -= 1
+            self.condition.notify()
+
+    def ping(self, connection):
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def warm_up(self, count):
+        # Open connections up front so the first requests don't pay for the handshake
+        connections = [self.get_connection(caller='warm_up') for _ in range(min(count, self.size))]
+        for connection in connections:
+            connection.close()
+
+    def stats(self):
+        with self.condition:
+            idle = len(self.idle)
+            return {
+                'size': self.size,
+                'timeout': self.timeout,
+                'pre_ping': self.pre_ping,
+                'open': self.open_count,
+                'idle': idle,
+                'in_use': self.open_count - idle,
+                'checkouts': self.checkouts,
+                'wait_avg': self.wait_total / self.checkouts if self.checkouts else 0.0,
+                'wait_max': self.wait_max,
+                'exhausted': self.exhausted,
+                'failed_connects': self.failed_connects,
+                'failed_pings': self.failed_pings,
+                'hold_by_caller': {
+                    caller: {
+                        'count': stats['count'],
+                        'avg': stats['total'] / stats['count'],
+                        'max': stats['max']
+                    }
+                    for caller, stats in self.hold_by_caller.items()
+                }
+            }
+
+
+def connect_mysql():
+    # Imported here so that importing this module never touches the MySQL driver or network
+    import mysql.connector
+    return mysql.connector.connect(**dbconfig)
+
+
+def connect_sqlite():
+    return SQLiteConnection(SQLITE_PATH)
+
+
+# Backends by name; each entry opens one raw connection
+BACKENDS = {
+    'mysql': connect_mysql,
+    'sqlite': connect_sqlite
+}
+
+# SQL dialect of each backend, for code that has to generate engine-specific statements
+BACKEND_DIALECTS = {
+    'mysql': 'mysql',
+    'sqlite': 'sqlite'
+}
+
+def register_backend(name, connect, dialect='mysql'):
+    BACKENDS[name] = connect
+    BACKEND_DIALECTS[name] = dialect
+
+def get_dialect():
+    return DIALECTS[BACKEND_DIALECTS[DB_BACKEND]]
+
+def change_only():
+    return SCENARIO_STORAGE == 'changes'
+
+
+# The pool is created on first use in each process, never at import time
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _reset_after_fork():
+    # The child must not share the parent's sockets, and the lock may have been held at fork time
+    global _pool, _pool_pid, _pool_lock
+    _pool = None
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def configure(backend=None, sqlite_path=None, scenario_storage=None, **pool_options):
+    """Switch backend, Scenarios storage and/or pool settings; the pool is rebuilt on next use."""
+    global DB_BACKEND, SQLITE_PATH, SCENARIO_STORAGE, POOL_SIZE, POOL_TIMEOUT, POOL_PRE_PING, POOL_WARMUP
+    global _pool, _pool_pid
+    with _pool_lock:
+        if scenario_storage is not None:
+            if scenario_storage not in SCENARIO_STORAGES:
+                raise ValueError(f"Unknown Scenarios storage: {scenario_storage}")
+            SCENARIO_STORAGE = scenario_storage
+        if backend is not None:
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown database backend: {backend}")
+            DB_BACKEND = backend
+        if sqlite_path is not None:
+            SQLITE_PATH = sqlite_path
+        POOL_SIZE = pool_options.get('size', POOL_SIZE)
+        POOL_TIMEOUT = pool_options.get('timeout', POOL_TIMEOUT)
+        POOL_PRE_PING = pool_options.get('pre_ping', POOL_PRE_PING)
+        POOL_WARMUP = pool_options.get('warmup', POOL_WARMUP)
+        _pool = None
+        _pool_pid = None
+
+def get_pool():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                pool = InstrumentedPool(BACKENDS[DB_BACKEND],
+                                        size=POOL_SIZE,
+                                        timeout=POOL_TIMEOUT,
+                                        pre_ping=POOL_PRE_PING)
+                if POOL_WARMUP:
+                    pool.warm_up(POOL_WARMUP)
+                _pool, _pool_pid = pool, pid
+    return _pool
+
+def get_connection(caller=None):
+    # Hold times are reported per caller; default to the calling function's name
+    if caller is None:
+        frame = sys._getframe(1)
+        caller = f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+    return get_pool().get_connection(caller)
 
-def get_connection():
-    return conn_pool.get_connection()
\ No newline at end of file
+def pool_stats():
+    stats = get_pool().stats()
+    stats['backend'] = DB_BACKEND
+    return stats
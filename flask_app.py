@@ -1,25 +1,32 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, stream_template, request, jsonify
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import calendar
+import itertools
 from cardgame.card_app import card_app # Import the Blueprint
-from db_handler import get_connection
+from api import api
+from archived_stats import statistics_rows, statistics_history, tracker_rows
+from db_handler import pool_stats, PoolError
+from mod_deltas import play_count_deltas
+from snapshot_dates import to_date
+from stats_db import get_data_from_db, stream_from_db, get_snapshot, snapshot_dates, query_cache, conditional_get
+from stats_db import get_history_store, get_mod_matrix, with_history_fallback, with_archive_fallback, HISTORY_ANALYTICS
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = "2687313dbbbee0d2266518971aba5f1e"
 app.register_blueprint(card_app, url_prefix='/games')
+app.register_blueprint(api, url_prefix='/api')
 
 clients = {}
 
 def get_latest_data():
-    # Define a query to get all entries with the newest date from the Scenarios table
-    query = """
-        SELECT * FROM Scenarios
-        WHERE entry_date = (SELECT MAX(entry_date) FROM Scenarios);
-    """
+    # Look up the newest snapshot date in the index instead of a MAX() subquery
+    latest_date = snapshot_dates.latest()
+    if latest_date is None:
+        return []
 
-    # Use the get_data_from_db function to execute the query and get the data
-    latest_data = get_data_from_db(query)
+    # Fetch the snapshot (from the history store if the database is unreachable)
+    latest_data = get_snapshot(latest_date)
 
     # Format the data for compatibility with existing code
     formatted_data = []
@@ -35,44 +42,114 @@ def get_latest_data():
     return formatted_data
 
 
+def peek(rows):
+    # Templates test the list for emptiness, which a generator can't answer on its own
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return []
+    return itertools.chain([first], rows)
+
 def last_day_of_month(year, month):
     _, last_day = calendar.monthrange(year, month)
     return f"{year}-{month:02d}-{last_day:02d}"
 
-def get_data_from_db(query):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(query)
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return data
+# Current row plus the newest row at or before each lookback bound, in one round trip.
+# Lookback 0 is the current row; the bounds are computed from the snapshot index.
+MOD_HISTORY_SQL = """
+    SELECT * FROM (
+        SELECT bounds.lookback, s.*,
+               ROW_NUMBER() OVER (PARTITION BY bounds.lookback ORDER BY s.entry_date DESC) AS row_num
+        FROM (SELECT 0 AS lookback, %s AS bound UNION ALL SELECT 1, %s UNION ALL SELECT 3, %s
+              UNION ALL SELECT 7, %s UNION ALL SELECT 30, %s) bounds
+        JOIN Scenarios s
+          ON s.value = %s
+         AND s.entry_date <= bounds.bound{date_range}
+    ) ranked
+    WHERE row_num = 1;
+"""
+MOD_HISTORY_QUERY = MOD_HISTORY_SQL.format(date_range='')
+# The same within constant dates: MySQL prunes partitions on those, never on bounds.bound
+MOD_HISTORY_RANGE_QUERY = MOD_HISTORY_SQL.format(date_range="\n         AND s.entry_date BETWEEN %s AND %s")
+
+# One day of PlayStatistics, for /recent
+RECENT_QUERY = """
+    SELECT * FROM PlayStatistics
+    WHERE date = %s;
+"""
+
+BY_DAY_QUERY = """
+    SELECT date, play_change, most_played_mod, play_count FROM PlayStatistics
+    WHERE time_period = 'last_day' ORDER BY date DESC;
+"""
+
+BY_WEEK_QUERY = """
+    SELECT period_value, total_plays, most_played_mod, play_count FROM PlayTracker
+    WHERE period_type = 'week' ORDER BY period_value DESC;
+"""
+
+BY_MONTH_QUERY = "SELECT * FROM PlayTracker WHERE period_type = 'month' ORDER BY period_value DESC;"
+
+def get_mod_history(mod_name, current_date, time_periods, fallback_date):
+    # Set each target date to the max of the calculated date and the fallback date
+    bounds = [current_date] + [max(current_date - timedelta(days=int(days)), fallback_date) for days in time_periods]
+
+    def from_history(store):
+        rows = []
+        for lookback, bound in zip([0] + [int(days) for days in time_periods], bounds):
+            row = store.latest_row(mod_name, bound)
+            if row is not None:
+                rows.append(dict(row, lookback=lookback))
+        return rows
+
+    def from_db():
+        # Every row normally lies between the oldest bound and the current date, one or two
+        # monthly partitions; the whole history is only searched when a lookback has no row there
+        params = tuple(bounds) + (mod_name,)
+        rows = get_data_from_db(MOD_HISTORY_RANGE_QUERY, params + (min(bounds), current_date))
+        if len(rows) < len(bounds):
+            rows = get_data_from_db(MOD_HISTORY_QUERY, params)
+        return rows
+
+    matrix = get_mod_matrix()
+    if matrix is not None:
+        rows = from_history(matrix)  # Same lookups, straight from memory
+    else:
+        rows = with_history_fallback(from_db, from_history)
+    history = {}
+    for row in rows:
+        history[str(row['lookback'])] = {key: value for key, value in row.items() if key not in ('lookback', 'row_num')}
+    return history
 
 def get_mod_data(mod_name):
     # Initialize mod data and time periods
     mod_data = {}
     time_periods = ['1', '3', '7', '30']
-    fallback_date = datetime(2023, 11, 1).strftime('%Y-%m-%d')
+    fallback_date = datetime(2023, 11, 1).date()
+
+    # Fetch the current row and every historical baseline together
+    latest_date = snapshot_dates.latest()
+    if latest_date is None:
+        return mod_data
+    history = get_mod_history(mod_name, latest_date, time_periods, fallback_date)
 
     # Extract current data
-    query = f"SELECT * FROM Scenarios WHERE value = '{mod_name}' ORDER BY entry_date DESC LIMIT 1;"
-    current_data = get_data_from_db(query)
-    if current_data:
-        mod_data['current'] = current_data[0]
-        current_date = mod_data['current']['entry_date']
+    if '0' not in history:
+        return mod_data
+    current_date = to_date(history['0']['entry_date'])
+    if current_date != latest_date:
+        # The mod is missing from the newest snapshot, so measure from its own last entry
+        history = get_mod_history(mod_name, current_date, time_periods, fallback_date)
+    mod_data['current'] = history['0']
 
     # Extract historical data
     for days in time_periods:
-        # Set target date to the max of the calculated date and the fallback date
-        target_date = max((current_date - timedelta(days=int(days))).strftime('%Y-%m-%d'), fallback_date)
-
-        query = f"SELECT * FROM Scenarios WHERE value = '{mod_name}' AND entry_date <= '{target_date}' ORDER BY entry_date DESC LIMIT 1;"
-        historical_data = get_data_from_db(query)
+        historical_data = history.get(days)
 
         if historical_data:
             mod_data[str(days)] = {
-                'play_count_change': mod_data['current']['play_count'] - historical_data[0]['play_count'],
-                'favs_change': mod_data['current']['favs'] - historical_data[0]['favs']
+                'play_count_change': mod_data['current']['play_count'] - historical_data['play_count'],
+                'favs_change': mod_data['current']['favs'] - historical_data['favs']
             }
         else:
             # If no historical data found, assume both favs and play_count were 0 at the historical date
@@ -84,6 +161,7 @@ def get_mod_data(mod_name):
 
 
 @app.route('/')
+@conditional_get
 def index():
     data = get_latest_data()
     sort_by = request.args.get('sort_by', 'value')
@@ -94,32 +172,26 @@ def index():
     return render_template('index.html', data=data)
 
 @app.route('/mod/<mod_name>')
+@conditional_get
 def mod_detail(mod_name):
     mod_data = get_mod_data(mod_name)
     return render_template('mod_detail.html', mod_data=mod_data, mod_name=mod_name)
 
 @app.route('/recent')
+@conditional_get
 def recent():
     # Get current date and previous day in the format YYYY-MM-DD
     current_date = datetime.now().strftime('%Y-%m-%d')
     previous_day = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
 
-    # Define a query to get data from today
-    query_today = f"""
-        SELECT * FROM PlayStatistics
-        WHERE date = '{current_date}';
-    """
+    def load(day):
+        return with_archive_fallback(lambda: get_data_from_db(RECENT_QUERY, (day,)),
+                                     lambda archive_dir: statistics_rows(archive_dir, to_date(day)))
 
-    # Define a query to get data from yesterday
-    query_yesterday = f"""
-        SELECT * FROM PlayStatistics
-        WHERE date = '{previous_day}';
-    """
-
-    # Get data from the database
-    data_db = get_data_from_db(query_today)
+    # Get data from the database, falling back to yesterday
+    data_db = load(current_date)
     if not data_db:
-        data_db = get_data_from_db(query_yesterday)
+        data_db = load(previous_day)
         current_date = previous_day
 
     # Reformat data to match the desired JSON structure
@@ -142,39 +214,34 @@ def recent():
 
 
 @app.route('/get_top_mods/<int:days>')
+@conditional_get
 def get_top_mods(days):
-    # Initialize end_date and start_date
-    end_date = datetime.now()
+    # Find the newest snapshot on or before today
+    end_date = snapshot_dates.latest_on_or_before(datetime.now().date())
+    if end_date is None:
+        return {'error': "Sorry, data doesn't reach back far enough!"}
     start_date = end_date - timedelta(days=days)
 
-    # Define query templates
-    query_template = """
-        SELECT * FROM Scenarios
-        WHERE entry_date = '{}';
-    """
+    # Heavy lifting can go to the mod matrix or the memory-mapped history when it covers both dates
+    store = get_mod_matrix()
+    if store is None and HISTORY_ANALYTICS:
+        store = get_history_store()
+    if store is not None and end_date in store and start_date in store:
+        top_mods = [{'mod_name': name, 'play_count_change': change}
+                    for _, name, change in store.top_movers(start_date, end_date, 10)]
+        return jsonify({'top_mods': top_mods})
 
-    # Loop until data is found for end_date
-    while True:
-        end_data = get_data_from_db(query_template.format(end_date.strftime('%Y-%m-%d')))
-        if end_data:
-            break
-        end_date -= timedelta(days=1)
-        start_date -= timedelta(days=1)
-
-    # Fetch data for start_date
-    start_data = get_data_from_db(query_template.format(start_date.strftime('%Y-%m-%d')))
+    # Fetch data for end_date and start_date
+    end_data = get_snapshot(end_date)
+    start_data = get_snapshot(start_date)
 
     # Handle missing data files
     if not start_data:
         return {'error': "Sorry, data doesn't reach back far enough!"}
 
     # Calculate play count changes
-    mod_changes = []
-    for mod in end_data:
-        start_mod = next((m for m in start_data if m['value'] == mod['value']), None)
-        start_plays = start_mod['play_count'] if start_mod else 0
-        play_count_change = mod['play_count'] - start_plays
-        mod_changes.append({'mod_name': mod['name'], 'play_count_change': play_count_change})
+    mod_changes = [{'mod_name': delta['name'], 'play_count_change': delta['play_count_change']}
+                   for delta in play_count_deltas(end_data, start_data)]
 
     # Sort mods by play count change and get top 10
     top_mods = sorted(mod_changes, key=lambda x: x['play_count_change'], reverse=True)[:10]
@@ -182,45 +249,47 @@ def get_top_mods(days):
     return jsonify({'top_mods': top_mods})
 
 @app.route('/by_day')
+@conditional_get
 def by_day():
-    # Query to fetch data for 'last_day' time period
-    query = "SELECT * FROM PlayStatistics WHERE time_period = 'last_day' ORDER BY date DESC;"
-    result = get_data_from_db(query)
-
-    # Initialize daily stats list
-    daily_stats = []
+    # Fetch data for 'last_day' time period; the history grows daily, so stream it
+    result = with_archive_fallback(lambda: peek(stream_from_db(BY_DAY_QUERY)),
+                                   lambda archive_dir: statistics_history(archive_dir, 'last_day'))
 
-    # Loop through the results and format data
-    for row in result:
-        formatted_date = row['date'].strftime('%Y-%m-%d')
-        last_day_plays = row['play_change']
-        most_played_mod = {'name': row['most_played_mod'], 'play_count': row['play_count']}
-        daily_stats.append({'date': formatted_date, 'last_day': last_day_plays, 'most_played_mod': most_played_mod})
+    # Format rows lazily as the template consumes them
+    daily_stats = ({
+        'date': row_date.strftime('%Y-%m-%d'),
+        'last_day': play_change,
+        'most_played_mod': {'name': most_played_mod, 'play_count': play_count}
+    } for row_date, play_change, most_played_mod, play_count in result)
 
-    # Render the by_day.html template and pass the data
-    return render_template('by_day.html', daily_stats=daily_stats)
+    # Render the by_day.html template chunk by chunk
+    return stream_template('by_day.html', daily_stats=peek(daily_stats))
 
 @app.route('/by_week')
+@conditional_get
 def by_week():
-    # Query to fetch weekly data
-    query = "SELECT * FROM PlayTracker WHERE period_type = 'week' ORDER BY period_value DESC;"
-    result = get_data_from_db(query)
-
-    # Format and sort weekly stats
-    weekly_stats = [{
-        'week': row['period_value'],
-        'total_plays': row['total_plays'],
-        'most_played_mod': {'name': row['most_played_mod'], 'play_count': row['play_count']}
-    } for row in result]
-
-    # Render the by_week.html template and pass the data
-    return render_template('by_week.html', weekly_stats=weekly_stats, datetime=datetime, timedelta=timedelta)
+    # Fetch weekly data, streamed like by_day
+    result = with_archive_fallback(lambda: peek(stream_from_db(BY_WEEK_QUERY)),
+                                   lambda archive_dir: [(row['period_value'], row['total_plays'],
+                                                         row['most_played_mod'], row['play_count'])
+                                                        for row in tracker_rows(archive_dir, 'week')])
+
+    # Format weekly stats lazily
+    weekly_stats = ({
+        'week': period_value,
+        'total_plays': total_plays,
+        'most_played_mod': {'name': most_played_mod, 'play_count': play_count}
+    } for period_value, total_plays, most_played_mod, play_count in result)
+
+    # Render the by_week.html template chunk by chunk
+    return stream_template('by_week.html', weekly_stats=peek(weekly_stats), datetime=datetime, timedelta=timedelta)
 
 @app.route('/by_month')
+@conditional_get
 def by_month():
-    # Query to fetch monthly data
-    query = "SELECT * FROM PlayTracker WHERE period_type = 'month' ORDER BY period_value DESC;"
-    result = get_data_from_db(query)
+    # Fetch monthly data
+    result = with_archive_fallback(lambda: get_data_from_db(BY_MONTH_QUERY),
+                                   lambda archive_dir: tracker_rows(archive_dir, 'month'))
 
     # Format and sort monthly stats
     monthly_stats = [{
@@ -235,7 +304,27 @@ def by_month():
 
 
 
+def period_mod_plays(current_day, previous_day):
+    # Play count change of every mod listed on current_day since previous_day, most played first
+    matrix = get_mod_matrix()
+    if matrix is not None and current_day in matrix and previous_day in matrix:
+        return [{'name': name, 'play_count_change': change}
+                for name, change in matrix.period_plays(current_day, previous_day)]
+
+    mod_plays = []
+    for delta in play_count_deltas(get_snapshot(current_day), get_snapshot(previous_day)):
+        play_count_change = delta['play_count_change']
+        if not delta['has_previous']:
+            play_count_change = max(0, play_count_change)  # Fallback to 0 if no previous data
+
+        mod_plays.append({'name': delta['name'], 'play_count_change': play_count_change})
+
+    # Sort by plays descending
+    mod_plays.sort(key=lambda x: x['play_count_change'], reverse=True)
+    return mod_plays
+
 @app.route('/mod_plays/<period>/<date>')
+@conditional_get
 def mod_plays_by_period(period, date):
     # Validate period
     if period not in ['day', 'week', 'month']:
@@ -254,48 +343,45 @@ def mod_plays_by_period(period, date):
     previous_date = current_date - delta
     next_date = current_date + delta
 
-    # Load current data
-    current_query = f"SELECT * FROM Scenarios WHERE entry_date='{current_date.strftime('%Y-%m-%d')}'"
-    current_data = get_data_from_db(current_query)
-
-    # Load previous data
-    previous_query = f"SELECT * FROM Scenarios WHERE entry_date='{previous_date.strftime('%Y-%m-%d')}'"
-    previous_data = get_data_from_db(previous_query)
+    # Check the snapshot index for current and previous data
+    current_day = current_date.date()
+    previous_day = previous_date.date()
 
-    if not current_data:
-        if not previous_data:
+    if current_day not in snapshot_dates:
+        if previous_day not in snapshot_dates:
             return render_template('mod_plays_by_period.html', date=date, error="Sorry, no data available", period=period)
         else:
             return render_template('mod_plays_by_period.html', date=date, error="Sorry, no data available", previous_date=previous_date.strftime('%Y-%m-%d'), period=period)
 
     # Fallback to the earliest available data for week and month
-    if not previous_data and period != 'day':
-        earliest_date_query = "SELECT MIN(entry_date) as earliest_date FROM Scenarios"
-        earliest_date_result = get_data_from_db(earliest_date_query)
-        earliest_date = earliest_date_result[0]['earliest_date']
-        earliest_data_query = f"SELECT * FROM Scenarios WHERE entry_date='{earliest_date}'"
-        previous_data = get_data_from_db(earliest_data_query)
+    if previous_day not in snapshot_dates and period != 'day':
+        previous_day = snapshot_dates.earliest()
 
 
-    if not previous_data:
+    if previous_day not in snapshot_dates:
         return render_template('mod_plays_by_period.html', date=date, error="Sorry, no data available", period=period, current_date=next_date.strftime('%Y-%m-%d'))
 
-    mod_plays = []
-    for mod in current_data:
-        # Calculate play count change
-        play_count_change = mod['play_count']
-        prev_mod = next((item for item in previous_data if item['value'] == mod['value']), None)
-        if prev_mod:
-            play_count_change -= prev_mod['play_count']
-        else:
-            play_count_change = max(0, play_count_change)  # Fallback to 0 if no previous data
+    mod_plays = period_mod_plays(current_day, previous_day)
 
-        mod_plays.append({'name': mod['name'], 'play_count_change': play_count_change})
+    return render_template('mod_plays_by_period.html', date=date, mod_plays=mod_plays, previous_date=previous_date.strftime('%Y-%m-%d'), current_date=next_date.strftime('%Y-%m-%d'), period=period)
 
-    # Sort by plays descending
-    mod_plays.sort(key=lambda x: x['play_count_change'], reverse=True)
+@app.errorhandler(PoolError)
+def database_unavailable(error):
+    # Pages that couldn't fall back to the history store or the archive
+    return "The stats database is unreachable right now; please try again shortly.", 503
 
-    return render_template('mod_plays_by_period.html', date=date, mod_plays=mod_plays, previous_date=previous_date.strftime('%Y-%m-%d'), current_date=next_date.strftime('%Y-%m-%d'), period=period)
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(query_cache.stats())
+
+@app.route('/pool_stats')
+def db_pool_stats():
+    return jsonify(pool_stats())
+
+@app.route('/matrix_stats')
+def matrix_stats():
+    matrix = get_mod_matrix()
+    return jsonify(matrix.stats() if matrix is not None else {'enabled': False})
 
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
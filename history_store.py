@@ -0,0 +1,287 @@
+# history_store.py
+# Read-only, memory-mapped date x mod history of play counts and favs built from data_archive.
+#
+#   python history_store.py build                       # data_archive -> data_archive/history.bin
+#   python history_store.py mod 0036AD --start 2023-11-01
+#   python history_store.py top --start 2023-11-01 --end 2023-11-08 -k 10
+#
+# Layout: MAGIC, a little-endian uint32 header length, a JSON header (dates, mod values
+# sorted, mod names), zero padding to 8 bytes, then three row-major [date][mod] matrices:
+#
+#   plays    int64    play_count
+#   favs     int64
+#   name_id  int32    index into header['names'], -1 where the mod wasn't listed that day
+#
+# Queries read cells straight out of the mapping; nothing is parsed per request.
+import argparse
+import bisect
+import glob
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date, datetime
+
+from archive_format import load_moddata
+from cleaner import DAILY_FILE, read_bundle
+from snapshot_dates import to_date
+
+MAGIC = b'MODHIST1'
+MISSING = -1
+DEFAULT_PATH = os.path.join('data_archive', 'history.bin')
+
+
+class HistoryStore:
+    """Point, range and top-K queries over the consolidated archive."""
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise ValueError("history stores are little-endian and are mapped without conversion")
+        self.path = path
+        with open(path, 'rb') as history_file:
+            self.map = mmap.mmap(history_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a history store")
+
+        header_length, = struct.unpack_from('<I', self.map, len(MAGIC))
+        offset = len(MAGIC) + 4
+        header = json.loads(self.map[offset:offset + header_length].decode('utf-8'))
+        offset += header_length
+        offset += -offset % 8
+
+        self.dates = [date.fromisoformat(day) for day in header['dates']]
+        self.values = header['values']
+        self.names = header['names']
+        self.date_rows = {day: row for row, day in enumerate(self.dates)}
+        self.mod_columns = {value: column for column, value in enumerate(self.values)}
+
+        cells = len(self.dates) * len(self.values)
+        view = memoryview(self.map)
+        self.plays = view[offset:offset + cells * 8].cast('q')
+        offset += cells * 8
+        self.favs = view[offset:offset + cells * 8].cast('q')
+        offset += cells * 8
+        self.name_id = view[offset:offset + cells * 4].cast('i')
+
+    def close(self):
+        for view in (self.plays, self.favs, self.name_id):
+            view.release()
+        self.map.close()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def latest(self):
+        return self.dates[-1] if self.dates else None
+
+    def earliest(self):
+        return self.dates[0] if self.dates else None
+
+    def latest_on_or_before(self, day):
+        position = bisect.bisect_right(self.dates, to_date(day))
+        return self.dates[position - 1] if position else None
+
+    def __contains__(self, day):
+        return to_date(day) in self.date_rows
+
+    def _cell(self, value, day):
+        # Flat index of (day, mod), or None if either is unknown
+        row = self.date_rows.get(to_date(day))
+        column = self.mod_columns.get(value)
+        if row is None or column is None:
+            return None
+        return row * len(self.values) + column
+
+    def _row(self, cell, day):
+        # One Scenarios-shaped row, as the dashboard's queries return them
+        return {
+            'value': self.values[cell % len(self.values)],
+            'name': self.names[self.name_id[cell]],
+            'favs': self.favs[cell],
+            'play_count': self.plays[cell],
+            'entry_date': day
+        }
+
+    # --- Point queries ---
+
+    def play_count(self, value, day):
+        """The mod's play count in the snapshot for day, or None if it wasn't listed."""
+        cell = self._cell(value, day)
+        if cell is None or self.name_id[cell] == MISSING:
+            return None
+        return self.plays[cell]
+
+    def favs_on(self, value, day):
+        cell = self._cell(value, day)
+        if cell is None or self.name_id[cell] == MISSING:
+            return None
+        return self.favs[cell]
+
+    def latest_row(self, value, bound):
+        """The mod's newest row on or before bound, or None."""
+        column = self.mod_columns.get(value)
+        if column is None:
+            return None
+        width = len(self.values)
+        for row in range(bisect.bisect_right(self.dates, to_date(bound)) - 1, -1, -1):
+            cell = row * width + column
+            if self.name_id[cell] != MISSING:
+                return self._row(cell, self.dates[row])
+        return None
+
+    # --- Range queries ---
+
+    def series(self, value, start=None, end=None):
+        """[(date, play_count, favs)] for every snapshot in [start, end] that lists the mod."""
+        column = self.mod_columns.get(value)
+        if column is None:
+            return []
+        first = bisect.bisect_left(self.dates, to_date(start)) if start else 0
+        last = bisect.bisect_right(self.dates, to_date(end)) if end else len(self.dates)
+        width = len(self.values)
+        result = []
+        for row in range(first, last):
+            cell = row * width + column
+            if self.name_id[cell] != MISSING:
+                result.append((self.dates[row], self.plays[cell], self.favs[cell]))
+        return result
+
+    def snapshot(self, day):
+        """Every mod listed on day, shaped like `SELECT * FROM Scenarios WHERE entry_date = day`."""
+        day = to_date(day)
+        row = self.date_rows.get(day)
+        if row is None:
+            return []
+        width = len(self.values)
+        return [self._row(cell, day) for cell in range(row * width, (row + 1) * width)
+                if self.name_id[cell] != MISSING]
+
+    # --- Top-K ---
+
+    def top_movers(self, start, end, k=10):
+        """The k mods with the largest play count gain between two snapshots.
+
+        Like mod_deltas.play_count_deltas, a mod missing from the start snapshot counts
+        from zero. Returns [(value, name, play_count_change)], largest first.
+        """
+        end_row = self.date_rows.get(to_date(end))
+        if end_row is None:
+            return []
+        start_row = self.date_rows.get(to_date(start))
+        width = len(self.values)
+        end_offset = end_row * width
+        start_offset = start_row * width if start_row is not None else None
+
+        def changes():
+            for column in range(width):
+                end_cell = end_offset + column
+                if self.name_id[end_cell] == MISSING:
+                    continue
+                change = self.plays[end_cell]
+                if start_offset is not None and self.name_id[start_offset + column] != MISSING:
+                    change -= self.plays[start_offset + column]
+                yield change, -column  # Ties go to the lower column, i.e. primary key order
+
+        result = []
+        for change, negative_column in heapq.nlargest(k, changes()):
+            column = -negative_column
+            result.append((self.values[column], self.names[self.name_id[end_offset + column]], change))
+        return result
+
+
+# --- Building the store ---
+
+def archive_days(archive_dir):
+    """Yield (date, moddata list) for every archived day, from daily files and cleaner bundles."""
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'moddata_*'))):
+        match = DAILY_FILE.match(os.path.basename(path))
+        if match:
+            seen.add(match.group(2))
+            yield datetime.strptime(match.group(2), '%Y%m%d').date(), load_moddata(path)
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'bundle_*.jsonl.gz'))):
+        for day, kind, entry in read_bundle(path):
+            if kind == 'moddata' and entry['date'] not in seen:
+                seen.add(entry['date'])
+                yield day, entry['data']
+
+
+def build_history(archive_dir, path=None):
+    """Consolidate every archived snapshot into one history store; returns (days, mods)."""
+    path = path or os.path.join(archive_dir, 'history.bin')
+    columns = {}  # value -> provisional column, in order of first appearance
+    names = {}
+    days = {}
+    for day, records in archive_days(archive_dir):
+        ids, plays, favs, name_ids = array('i'), array('q'), array('q'), array('i')
+        for record in records:
+            ids.append(columns.setdefault(record['value'], len(columns)))
+            plays.append(record['play-count'])
+            favs.append(record['favs'])
+            name_ids.append(names.setdefault(record['name'], len(names)))
+        days[day] = (ids, plays, favs, name_ids)
+
+    # Columns sorted by value, so snapshots come out in primary key order
+    values = sorted(columns)
+    final_column = [0] * len(columns)
+    for column, value in enumerate(values):
+        final_column[columns[value]] = column
+
+    header = json.dumps({
+        'dates': [day.isoformat() for day in sorted(days)],
+        'values': values,
+        'names': list(names)
+    }, separators=(',', ':')).encode('utf-8')
+    width = len(values)
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as history_file:
+        history_file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        history_file.write(b'\0' * (-history_file.tell() % 8))
+        for part, typecode, empty in ((1, 'q', 0), (2, 'q', 0), (3, 'i', MISSING)):
+            for day in sorted(days):
+                row = array(typecode, [empty]) * width
+                day_columns = days[day][0]
+                day_values = days[day][part]
+                for position, column in enumerate(day_columns):
+                    row[final_column[column]] = day_values[position]
+                history_file.write(row.tobytes())
+    os.replace(temp_path, path)
+    return len(days), width
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the memory-mapped archive history.")
+    parser.add_argument('--store', default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="Consolidate data_archive into the store")
+    build.add_argument('--archive-dir', default='data_archive')
+    mod = commands.add_parser('mod', help="Play count and favs history of one mod")
+    mod.add_argument('value')
+    mod.add_argument('--start')
+    mod.add_argument('--end')
+    top = commands.add_parser('top', help="Top movers between two snapshots")
+    top.add_argument('--start', required=True)
+    top.add_argument('--end', required=True)
+    top.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        days, mods = build_history(args.archive_dir, args.store)
+        print(f"Wrote {days} days x {mods} mods to {args.store} ({os.path.getsize(args.store)} bytes)")
+        return
+
+    store = HistoryStore(args.store)
+    if args.command == 'mod':
+        for day, play_count, favs in store.series(args.value, args.start, args.end):
+            print(f"{day}  {play_count:>10}  {favs:>6}")
+    else:
+        for value, name, change in store.top_movers(args.start, args.end, args.k):
+            print(f"{change:>10}  {value}  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+# migrations.py
+# Versioned schema changes, applied in order and recorded in schema_migrations.
+#
+#   python migrations.py status
+#   python migrations.py migrate
+#   python migrations.py migrate --backend sqlite --db local_stats.db
+#
+# Each migration is a function of (cursor, dialect) and must be safe to rerun: indexes
+# are only created when no index with the same columns exists yet, so databases where
+# one was added by hand are left as they are. MySQL commits every DDL statement on its
+# own, so a migration is recorded right after it succeeds; a failed one is retried from
+# the top on the next run. Secondary indexes are built online by InnoDB, so the dashboard
+# and scraper keep running during a migration.
+import argparse
+from datetime import datetime
+
+import db_handler
+from partitions import partition_by_month
+from storage import SCENARIO_HISTORY_VIEW
+
+MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at DATETIME NOT NULL
+    );
+"""
+
+# The tables as production has them; the SQLite backend creates its own on connect
+MYSQL_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS Scenarios (
+        value VARCHAR(255) NOT NULL,
+        name VARCHAR(255),
+        favs INT,
+        play_count INT,
+        entry_date DATE NOT NULL,
+        PRIMARY KEY (value, entry_date)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS PlayStatistics (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        date DATE,
+        time_period VARCHAR(50),
+        play_change INT,
+        most_played_mod VARCHAR(255),
+        play_count INT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS PlayTracker (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        period_type VARCHAR(10),
+        period_value VARCHAR(10),
+        total_plays INT,
+        most_played_mod VARCHAR(255),
+        play_count INT
+    );
+    """
+]
+
+
+# Change-only storage of Scenarios (scenario_changes.py)
+MYSQL_CHANGE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS ScenarioChanges (
+        value VARCHAR(255) NOT NULL,
+        entry_date DATE NOT NULL,
+        valid_until DATE NOT NULL,
+        name VARCHAR(255),
+        favs INT,
+        play_count INT,
+        PRIMARY KEY (value, entry_date)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ScenarioDates (
+        entry_date DATE NOT NULL PRIMARY KEY
+    );
+    """,
+    "CREATE OR REPLACE VIEW ScenarioHistory AS " + SCENARIO_HISTORY_VIEW + ";"
+]
+
+
+def create_index(cursor, dialect, table, name, columns, unique=False):
+    """Create an index unless the table already has one on exactly these columns."""
+    for existing_unique, existing_columns in dialect.indexes(cursor, table).values():
+        if existing_columns == columns and (existing_unique or not unique):
+            return False
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    cursor.execute(f"CREATE {kind} {name} ON {table} ({', '.join(columns)});")
+    return True
+
+
+def create_tables(cursor, dialect):
+    if dialect.name == 'mysql':
+        for statement in MYSQL_TABLES:
+            cursor.execute(statement)
+
+
+def play_tracker_unique_period(cursor, dialect):
+    # With this key upsert_trackers writes every tracker in one statement; without it, it
+    # falls back to a SELECT then UPDATE or INSERT, so two overlapping runs could leave
+    # duplicates: keep the newest.
+    for unique, columns in dialect.indexes(cursor, 'PlayTracker').values():
+        if unique and columns == ['period_type', 'period_value']:
+            return
+    cursor.execute("""
+        DELETE FROM PlayTracker WHERE id NOT IN (
+            SELECT id FROM (SELECT MAX(id) AS id FROM PlayTracker GROUP BY period_type, period_value) newest
+        );
+    """)
+    create_index(cursor, dialect, 'PlayTracker', 'uq_play_tracker_period', ['period_type', 'period_value'],
+                 unique=True)
+
+
+def covering_indexes(cursor, dialect):
+    # Snapshot reads (entry_date = ...), the date index (DISTINCT / MIN / MAX entry_date) and
+    # the backfill's range scan; lookups by value + entry_date already use the primary key
+    create_index(cursor, dialect, 'Scenarios', 'idx_scenarios_entry_date',
+                 ['entry_date', 'value', 'name', 'favs', 'play_count'])
+    # /by_day and the API's time_period filter
+    create_index(cursor, dialect, 'PlayStatistics', 'idx_play_statistics_period_date',
+                 ['time_period', 'date', 'play_change', 'most_played_mod', 'play_count'])
+    # /recent, the API's date sort and the backfill's delete of a date range
+    create_index(cursor, dialect, 'PlayStatistics', 'idx_play_statistics_date',
+                 ['date', 'time_period', 'play_change', 'most_played_mod', 'play_count'])
+    # /by_week and /by_month
+    create_index(cursor, dialect, 'PlayTracker', 'idx_play_tracker_period',
+                 ['period_type', 'period_value', 'total_plays', 'most_played_mod', 'play_count'])
+    # The API's period_value sort
+    create_index(cursor, dialect, 'PlayTracker', 'idx_play_tracker_value', ['period_value', 'period_type'])
+
+
+def scenario_changes(cursor, dialect):
+    # The SQLite backend creates the tables and the view itself
+    if dialect.name == 'mysql':
+        for statement in MYSQL_CHANGE_TABLES:
+            cursor.execute(statement)
+    # Snapshots read the rows still valid on their date: for the newest one, only the current rows
+    create_index(cursor, dialect, 'ScenarioChanges', 'idx_scenario_changes_valid_until',
+                 ['valid_until', 'entry_date', 'value', 'name', 'favs', 'play_count'])
+
+
+def partition_scenarios(cursor, dialect):
+    # Unlike the index migrations this copies the table and blocks writes to it while it
+    # runs (reads carry on), so apply it outside the scraper's window. SQLite is left as is.
+    partition_by_month(cursor, dialect)
+
+
+# (version, name, function), in the order they are applied. Never renumber or edit an
+# applied migration; add a new one instead.
+MIGRATIONS = [
+    (1, 'create tables', create_tables),
+    (2, 'unique PlayTracker period', play_tracker_unique_period),
+    (3, 'covering indexes for the dashboard queries', covering_indexes),
+    (4, 'change-only Scenarios storage', scenario_changes),
+    (5, 'partition Scenarios by month', partition_scenarios),
+]
+
+
+def applied_versions(cursor):
+    cursor.execute(MIGRATIONS_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(target=None, dry_run=False):
+    """Apply every pending migration up to target; returns the versions applied."""
+    dialect = db_handler.get_dialect()
+    connection = db_handler.get_connection(caller='migrations')
+    cursor = connection.cursor()
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        connection.commit()
+        for version, name, function in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            print(f"{'Would apply' if dry_run else 'Applying'} {version:03d} {name}")
+            if dry_run:
+                continue
+            connection.start_transaction()
+            try:
+                function(cursor, dialect)
+                cursor.execute("INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s);",
+                               (version, name, datetime.now()))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            applied.append(version)
+    finally:
+        cursor.close()
+        connection.close()
+    return applied
+
+
+def status():
+    connection = db_handler.get_connection(caller='migrations')
+    cursor = connection.cursor()
+    try:
+        done = applied_versions(cursor)
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations.")
+    parser.add_argument('command', choices=['migrate', 'status'])
+    parser.add_argument('--target', type=int, help="Stop after this version")
+    parser.add_argument('--dry-run', action='store_true', help="List pending migrations without applying them")
+    parser.add_argument('--backend', choices=sorted(db_handler.BACKENDS), help="Database backend (default: DB_BACKEND)")
+    parser.add_argument('--db', help="SQLite file for --backend sqlite")
+    args = parser.parse_args()
+    db_handler.configure(backend=args.backend, sqlite_path=args.db)
+
+    if args.command == 'status':
+        for version, name, applied in status():
+            print(f"{version:03d}  {'applied' if applied else 'pending':<8} {name}")
+        return
+    applied = migrate(args.target, args.dry_run)
+    if not args.dry_run:
+        print(f"Applied {len(applied)} migration(s)")
+
+
+if __name__ == '__main__':
+    main()
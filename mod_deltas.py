@@ -0,0 +1,24 @@
+# mod_deltas.py
+# Helpers for comparing two Scenarios snapshots (all rows of one entry_date each).
+
+
+def index_by_value(rows):
+    # Key snapshot rows by their Scenarios.value so lookups are O(1)
+    return {row['value']: row for row in rows}
+
+
+def play_count_deltas(current_data, previous_data):
+    """Join two snapshots on value and return the play count change of every current mod."""
+    previous_by_value = index_by_value(previous_data)
+
+    deltas = []
+    for mod in current_data:
+        previous_mod = previous_by_value.get(mod['value'])
+        previous_plays = previous_mod['play_count'] if previous_mod else 0
+        deltas.append({
+            'value': mod['value'],
+            'name': mod['name'],
+            'play_count_change': mod['play_count'] - previous_plays,
+            'has_previous': previous_mod is not None
+        })
+    return deltas
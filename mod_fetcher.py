@@ -0,0 +1,83 @@
+# mod_fetcher.py
+# Fetches per-mod stats from the CTS backend concurrently over one keep-alive session.
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+MOD_API_URL = "https://cts-backend-w8is.onrender.com/api/get_mod"
+
+
+def make_session(concurrency=8, retries=3, backoff=0.5):
+    """Session whose connection pool fits `concurrency` workers and retries 5xx/timeouts with backoff."""
+    retry = Retry(total=retries,
+                  connect=retries,
+                  read=retries,
+                  status=retries,
+                  backoff_factor=backoff,
+                  status_forcelist=[500, 502, 503, 504],
+                  allowed_methods=['GET'],
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_mod_stats(session, value, api_url=MOD_API_URL, timeout=30):
+    # Send a GET request to retrieve additional data for one mod
+    mod_response = session.get(f"{api_url}?modName={value}", timeout=timeout)
+    mod_response.raise_for_status()  # Still failing after the session's retries
+    return mod_response.json()
+
+
+def fetch_or_record(session, value, api_url=MOD_API_URL, timeout=30, failures=None):
+    # With a failures dict, a mod still failing after the retries is recorded there and gives None
+    try:
+        return fetch_mod_stats(session, value, api_url, timeout)
+    except (requests.RequestException, ValueError) as e:
+        if failures is None:
+            raise
+        failures[value] = str(e)
+        return None
+
+
+def fetch_all_mod_stats(values, concurrency=8, timeout=30, retries=3, backoff=0.5, api_url=MOD_API_URL,
+                        failures=None):
+    """Fetch stats for every mod value; results come back in the same order as `values`.
+
+    Pass a dict as `failures` to get None for the mods that keep failing instead of an
+    exception; it is filled with {value: error}.
+    """
+    with make_session(concurrency, retries, backoff) as session:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda value: fetch_or_record(session, value, api_url, timeout, failures),
+                                     values))
+
+
+def iter_mod_stats(values, concurrency=8, timeout=30, retries=3, backoff=0.5, api_url=MOD_API_URL,
+                   max_in_flight=None, failures=None):
+    """Yield stats in the order of `values` as they arrive, with at most max_in_flight requests outstanding.
+
+    Unlike fetch_all_mod_stats nothing piles up: a slow consumer stops new requests
+    from being issued once max_in_flight (default 2 * concurrency) are waiting.
+    `failures` works as in fetch_all_mod_stats.
+    """
+    max_in_flight = max_in_flight or 2 * concurrency
+    with make_session(concurrency, retries, backoff) as session:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = deque()
+            try:
+                for value in values:
+                    pending.append(executor.submit(fetch_or_record, session, value, api_url, timeout, failures))
+                    if len(pending) >= max_in_flight:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # Abandoned early (error or consumer gone): don't wait on requests nobody will read
+                for future in pending:
+                    future.cancel()
@@ -0,0 +1,344 @@
+# mod_matrix.py
+# In-process mod x date matrices of play counts and favs, loaded from Scenarios once and
+# extended as new snapshots land; the dashboard's slices are answered with NumPy.
+#
+#   MOD_MATRIX=1 python flask_app.py                  # routes read from the matrix (/matrix_stats)
+#   python mod_matrix.py info                         # load it and report its size
+#   python mod_matrix.py --backend sqlite --db local_stats.db stats --date 2024-03-01
+#
+# Layout: three [date][mod] arrays, one row per snapshot and one column per mod in order
+# of first appearance:
+#
+#   plays    int64    play_count
+#   favs     int32
+#   name_id  int32    index into names, -1 where the mod wasn't listed that day
+#
+# Rows and columns are allocated with headroom, so a new snapshot is written in place
+# below the rows readers can see; a refresh then publishes a new MatrixState in one
+# assignment. Readers take the state once per call and never see a half-written day.
+# Ties are broken by mod value, the order SNAPSHOT_QUERY returns a snapshot in.
+#
+# The matrix also answers period_totals() and total_plays() the way
+# period_stats.SnapshotSet does, so compute_daily_stats() runs on it unchanged.
+import argparse
+import bisect
+import threading
+import time
+from datetime import datetime
+from itertools import groupby
+
+import numpy as np
+
+import db_handler
+from period_stats import PLAYS_BEFORE_TRACKING, compute_daily_stats
+from scenario_changes import scenario_reads
+from snapshot_dates import to_date
+from storage import VALUE_ORDER
+
+MISSING = -1
+FETCH_BATCH = 5000
+ROW_HEADROOM = 31  # About a month of snapshots before the arrays are reallocated
+
+ALL_ROWS_QUERY = f"SELECT entry_date, value, name, favs, play_count FROM Scenarios ORDER BY entry_date, {VALUE_ORDER};"
+NEWER_ROWS_QUERY = f"""
+    SELECT entry_date, value, name, favs, play_count FROM Scenarios
+    WHERE entry_date > %s
+    ORDER BY entry_date, {VALUE_ORDER};
+"""
+
+
+class MatrixState:
+    """One published version of the matrix: the visible dates and mods and views of their cells."""
+
+    def __init__(self, dates, values, names, order, plays, favs, name_id):
+        self.dates = dates
+        self.date_rows = {day: row for row, day in enumerate(dates)}
+        self.values = values  # May hold newer mods past the columns of this state
+        self.columns = {value: column for column, value in zip(range(plays.shape[1]), values)}
+        self.names = names
+        self.order = order  # Columns sorted by mod value
+        self.plays = plays
+        self.favs = favs
+        self.name_id = name_id
+
+
+class ModMatrix:
+    """Latest values, N-day deltas, top-K and period totals over every Scenarios snapshot."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = []
+        self.columns = {}
+        self.names = []
+        self.name_ids = {}
+        self.plays = np.zeros((0, 0), dtype=np.int64)
+        self.favs = np.zeros((0, 0), dtype=np.int32)
+        self.name_id = np.full((0, 0), MISSING, dtype=np.int32)
+        self.order = np.zeros(0, dtype=np.int64)
+        self.load_seconds = 0.0
+        self.refreshes = 0
+        self.state = MatrixState([], self.values, self.names, self.order, self.plays, self.favs, self.name_id)
+
+    # --- Loading ---
+
+    def _reserve(self, rows, columns, used_rows, first_row=0):
+        # Reallocate with headroom when the cells don't fit, copying the used ones; the rows
+        # before first_row are dropped. Readers keep the arrays of the state they hold.
+        if first_row == 0 and rows <= self.plays.shape[0] and columns <= self.plays.shape[1]:
+            return
+        shape = (rows + ROW_HEADROOM, columns + max(64, columns // 16))
+        used_columns = min(len(self.values), self.plays.shape[1])
+        for name, dtype, empty in (('plays', np.int64, 0), ('favs', np.int32, 0), ('name_id', np.int32, MISSING)):
+            array = np.full(shape, empty, dtype=dtype)
+            array[:used_rows - first_row, :used_columns] = getattr(self, name)[first_row:used_rows, :used_columns]
+            setattr(self, name, array)
+
+    def _write(self, row, rows):
+        # One snapshot of (value, name, favs, play_count) rows into a row no reader can see yet
+        columns, name_ids = [], []
+        for value, name, _, _ in rows:
+            column = self.columns.get(value)
+            if column is None:
+                column = self.columns[value] = len(self.values)
+                self.values.append(value)
+            name_id = self.name_ids.get(name)
+            if name_id is None:
+                name_id = self.name_ids[name] = len(self.names)
+                self.names.append(name)
+            columns.append(column)
+            name_ids.append(name_id)
+        self._reserve(row + 1, len(self.values), row)
+        self.name_id[row] = MISSING  # Left over if an earlier refresh failed halfway through this row
+        self.plays[row, columns] = [play_count for _, _, _, play_count in rows]
+        self.favs[row, columns] = [favs for _, _, favs, _ in rows]
+        self.name_id[row, columns] = name_ids
+
+    def _publish(self, dates):
+        if len(self.order) != len(self.values):
+            self.order = np.array(sorted(range(len(self.values)), key=self.values.__getitem__), dtype=np.int64)
+        rows, columns = len(dates), len(self.values)
+        # values and names only ever grow, so states can share them
+        self.state = MatrixState(dates, self.values, self.names, self.order, self.plays[:rows, :columns],
+                                 self.favs[:rows, :columns], self.name_id[:rows, :columns])
+
+    def add_snapshot(self, day, rows):
+        """Append a snapshot newer than every date held, from (value, name, favs, play_count) rows."""
+        with self.lock:
+            dates = list(self.state.dates)
+            self._write(len(dates), rows)
+            dates.append(to_date(day))
+            self._publish(dates)
+
+    def refresh(self, connection, oldest=None):
+        """Load the snapshots newer than the last one held, dropping any before oldest; returns the days added."""
+        with self.lock:
+            start = time.perf_counter()
+            dates = list(self.state.dates)
+            if oldest is not None and dates and dates[0] < oldest:
+                first_row = bisect.bisect_left(dates, oldest)
+                self._reserve(len(dates) - first_row, len(self.values), len(dates), first_row)
+                dates = dates[first_row:]
+
+            cursor = connection.cursor(buffered=False)
+            try:
+                if dates:
+                    cursor.execute(scenario_reads(NEWER_ROWS_QUERY), (dates[-1],))
+                else:
+                    cursor.execute(scenario_reads(ALL_ROWS_QUERY))
+
+                def rows():
+                    while True:
+                        batch = cursor.fetchmany(FETCH_BATCH)
+                        if not batch:
+                            break
+                        yield from batch
+
+                added = 0
+                for entry_date, day_rows in groupby(rows(), key=lambda row: row[0]):
+                    self._write(len(dates), [row[1:] for row in day_rows])
+                    dates.append(to_date(entry_date))
+                    added += 1
+            finally:
+                cursor.close()
+            self._publish(dates)
+            self.load_seconds += time.perf_counter() - start
+            self.refreshes += 1
+            return added
+
+    # --- Dates ---
+
+    def __len__(self):
+        return len(self.state.dates)
+
+    def __contains__(self, day):
+        return to_date(day) in self.state.date_rows
+
+    def latest(self):
+        dates = self.state.dates
+        return dates[-1] if dates else None
+
+    def earliest(self):
+        dates = self.state.dates
+        return dates[0] if dates else None
+
+    oldest_date = property(earliest)  # As period_stats.SnapshotSet names it
+
+    # --- Rows, as the dashboard's queries return them ---
+
+    def snapshot(self, day):
+        """Every mod listed on day, shaped like `SELECT * FROM Scenarios WHERE entry_date = day`."""
+        state = self.state
+        row = state.date_rows.get(to_date(day))
+        if row is None:
+            return []
+        columns = state.order[state.name_id[row, state.order] != MISSING]
+        values, names = state.values, state.names
+        return [{'value': values[column], 'name': names[name_id], 'favs': favs, 'play_count': play_count,
+                 'entry_date': state.dates[row]}
+                for column, name_id, favs, play_count in zip(columns.tolist(), state.name_id[row, columns].tolist(),
+                                                            state.favs[row, columns].tolist(),
+                                                            state.plays[row, columns].tolist())]
+
+    def latest_row(self, value, bound):
+        """The mod's newest row on or before bound, or None."""
+        state = self.state
+        column = state.columns.get(value)
+        if column is None:
+            return None
+        end = bisect.bisect_right(state.dates, to_date(bound))
+        listed = np.flatnonzero(state.name_id[:end, column] != MISSING)
+        if not len(listed):
+            return None
+        row = int(listed[-1])
+        return {'value': value, 'name': state.names[state.name_id[row, column]], 'favs': int(state.favs[row, column]),
+                'play_count': int(state.plays[row, column]), 'entry_date': state.dates[row]}
+
+    # --- Deltas and top-K ---
+
+    def _changes(self, state, end_row, start_row):
+        # Columns listed at end_row in value order, their play count change and whether start_row lists them
+        columns = state.order[state.name_id[end_row, state.order] != MISSING]
+        changes = state.plays[end_row, columns]
+        if start_row is None:
+            return columns, changes, np.zeros(len(columns), dtype=bool)
+        listed = state.name_id[start_row, columns] != MISSING
+        return columns, changes - np.where(listed, state.plays[start_row, columns], 0), listed
+
+    def _ranked(self, columns, changes, k=None):
+        # Largest change first; a stable sort keeps ties in value order. Only the k largest are sorted.
+        if k is not None and k < len(changes):
+            threshold = np.partition(changes, len(changes) - k)[len(changes) - k]
+            keep = changes >= threshold
+            columns, changes = columns[keep], changes[keep]
+        order = np.argsort(-changes, kind='stable')[:k]
+        return columns[order], changes[order]
+
+    def top_movers(self, start, end, k=10):
+        """The k mods with the largest play count gain between two snapshots, as HistoryStore.top_movers.
+
+        A mod missing from the start snapshot counts from zero. Returns [(value, name, play_count_change)].
+        """
+        state = self.state
+        end_row = state.date_rows.get(to_date(end))
+        if end_row is None:
+            return []
+        columns, changes, _ = self._changes(state, end_row, state.date_rows.get(to_date(start)))
+        columns, changes = self._ranked(columns, changes, k)
+        return [(state.values[column], state.names[state.name_id[end_row, column]], change)
+                for column, change in zip(columns.tolist(), changes.tolist())]
+
+    def period_plays(self, current, previous):
+        """[(name, play_count_change)] of every mod listed on current, most played first.
+
+        A mod missing from previous counts from zero but never below it, as /mod_plays shows them.
+        """
+        state = self.state
+        current_row = state.date_rows.get(to_date(current))
+        if current_row is None:
+            return []
+        columns, changes, listed = self._changes(state, current_row, state.date_rows.get(to_date(previous)))
+        changes = np.where(listed, changes, np.maximum(changes, 0))
+        columns, changes = self._ranked(columns, changes)
+        return list(zip(map(state.names.__getitem__, state.name_id[current_row, columns].tolist()), changes.tolist()))
+
+    # --- Period rollups (period_stats.SnapshotSet's interface) ---
+
+    def total_plays(self, day):
+        # Sum of all play counts on that day, or the pre-tracking total if there is no data
+        state = self.state
+        row = state.date_rows.get(to_date(day))
+        if row is None:
+            return PLAYS_BEFORE_TRACKING
+        return int(state.plays[row, state.name_id[row] != MISSING].sum())
+
+    def period_totals(self, start_date, end_date):
+        """Total plays between two snapshots and the mod with the most plays in between."""
+        state = self.state
+        end_row = state.date_rows.get(to_date(end_date))
+        if end_row is None:
+            raise ValueError(f"No Scenarios data for {end_date}")
+        # If no data on start_date, fall back to the oldest data on record
+        start_row = state.date_rows.get(to_date(start_date), 0)
+        columns, changes, _ = self._changes(state, end_row, start_row)
+        best = int(np.argmax(changes))  # The first of equal ones, in value order
+        most_played = {'name': state.names[state.name_id[end_row, columns[best]]], 'play_count': int(changes[best])}
+        return int(changes.sum()), most_played
+
+    # --- Size ---
+
+    def stats(self):
+        state = self.state
+        allocated = self.plays.nbytes + self.favs.nbytes + self.name_id.nbytes
+        used = state.plays.size * (self.plays.itemsize + self.favs.itemsize + self.name_id.itemsize)
+        return {
+            'dates': len(state.dates),
+            'mods': state.plays.shape[1],
+            'names': len(state.names),
+            'first_date': str(self.earliest()),
+            'last_date': str(self.latest()),
+            'used_bytes': used,
+            'allocated_bytes': allocated,
+            'load_seconds': round(self.load_seconds, 3),
+            'refreshes': self.refreshes
+        }
+
+
+def load(connection=None):
+    """A ModMatrix holding every snapshot in the configured database."""
+    matrix = ModMatrix()
+    connection = connection or db_handler.get_connection(caller='mod_matrix')
+    try:
+        matrix.refresh(connection)
+    finally:
+        connection.close()
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the mod x date matrix and query it.")
+    parser.add_argument('--backend', choices=sorted(db_handler.BACKENDS), help="Database backend (default: DB_BACKEND)")
+    parser.add_argument('--db', help="SQLite file for --backend sqlite")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('info', help="Load every snapshot and report the matrix size")
+    stats_parser = commands.add_parser('stats', help="The PlayStatistics / PlayTracker rows of one day")
+    stats_parser.add_argument('--date', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                              help="Snapshot date (default: the newest)")
+    args = parser.parse_args()
+    db_handler.configure(backend=args.backend, sqlite_path=args.db)
+
+    matrix = load()
+    if args.command == 'info':
+        for key, value in matrix.stats().items():
+            print(f"{key:<16} {value}")
+        return
+    day = args.date or matrix.latest()
+    time_periods, trackers = compute_daily_stats(matrix, day)
+    for time_period, change, most_played_mod in time_periods:
+        print(f"{time_period:<16} {change:>10}  {most_played_mod['name']} ({most_played_mod['play_count']})")
+    for period_type, period_value, total_plays, most_played_mod in trackers:
+        print(f"{period_type} {period_value:<10} {total_plays:>10}  {most_played_mod['name']} "
+              f"({most_played_mod['play_count']})")
+
+
+if __name__ == '__main__':
+    main()
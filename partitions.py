@@ -0,0 +1,154 @@
+# partitions.py
+# Monthly partitions of Scenarios on MySQL, and retention by dropping whole months.
+#
+#   python partitions.py status
+#   python partitions.py extend                       # create next month's partition ahead of time
+#   python partitions.py retain --keep-months 24      # drop the months before the last 24
+#   python partitions.py retain --keep-months 24 --dry-run
+#
+# Migration 005 partitions Scenarios BY RANGE COLUMNS(entry_date), one partition per
+# month (p202311 holds November 2023) plus pfuture for anything past the last month.
+# Queries with a constant entry_date (=, IN, BETWEEN, >) are pruned to the months they
+# name. Run extend and retain from a monthly cron job: extend splits next month off
+# pfuture while it's still empty, so it moves no rows, and retain drops whole partitions,
+# which takes the same time however many rows they hold. Rows that land in pfuture
+# because extend didn't run are moved into their month by the next extend.
+#
+# SQLite has no partitions, so there retain deletes the rows instead. The change-only
+# tables (scenario_changes.py) are trimmed to the same cutoff with a range delete.
+# The raw snapshots stay in data_archive, and PlayStatistics / PlayTracker are kept.
+import argparse
+from datetime import date, datetime
+
+import db_handler
+from snapshot_dates import to_date
+
+FUTURE = "PARTITION pfuture VALUES LESS THAN (MAXVALUE)"
+MONTHS_AHEAD = 1
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    return date(year, month + 1, 1)
+
+
+def monthly_partitions(first_month, end):
+    """(name, upper bound) of one partition per month from first_month up to end."""
+    partitions = []
+    month = month_start(first_month)
+    while month < end:
+        partitions.append((f"p{month:%Y%m}", add_months(month, 1)))
+        month = add_months(month, 1)
+    return partitions
+
+
+def partition_clauses(partitions):
+    clauses = [f"PARTITION {name} VALUES LESS THAN ('{bound:%Y-%m-%d}')" for name, bound in partitions]
+    return ', '.join(clauses + [FUTURE])
+
+
+def partition_by_month(cursor, dialect, today=None, months_ahead=MONTHS_AHEAD):
+    """Partition Scenarios by month, from its oldest snapshot to months_ahead past today."""
+    if dialect.name != 'mysql' or dialect.partitions(cursor, 'Scenarios'):
+        return
+    today = today or date.today()
+    cursor.execute("SELECT MIN(entry_date) FROM Scenarios;")
+    oldest = cursor.fetchone()[0]
+    first_month = month_start(to_date(oldest)) if oldest is not None else month_start(today)
+    partitions = monthly_partitions(first_month, add_months(today, months_ahead + 1))
+    cursor.execute(f"ALTER TABLE Scenarios PARTITION BY RANGE COLUMNS(entry_date) ({partition_clauses(partitions)});")
+
+
+def extend(cursor, dialect, today=None, months_ahead=MONTHS_AHEAD):
+    """Split the months up to months_ahead past today off pfuture; returns the new partitions."""
+    partitions = dialect.partitions(cursor, 'Scenarios')
+    if not partitions:
+        return []
+    today = today or date.today()
+    last_bound = max(bound for _, bound, _ in partitions if bound is not None)
+    added = monthly_partitions(last_bound, add_months(today, months_ahead + 1))
+    if added:
+        cursor.execute(f"ALTER TABLE Scenarios REORGANIZE PARTITION pfuture INTO ({partition_clauses(added)});")
+    return added
+
+
+def expired_partitions(partitions, cutoff):
+    # Only months that end on or before the cutoff; pfuture is never dropped
+    return [name for name, bound, _ in partitions if bound is not None and bound <= cutoff]
+
+
+def retain(cursor, dialect, cutoff, dry_run=False):
+    """Remove the snapshots before cutoff; returns the dropped partitions (or the rows deleted on SQLite)."""
+    if dialect.name == 'mysql':
+        partitions = dialect.partitions(cursor, 'Scenarios')
+        if not partitions:
+            raise RuntimeError("Scenarios isn't partitioned yet; run migrations.py migrate first")
+        removed = expired_partitions(partitions, cutoff)
+        if removed and not dry_run:
+            cursor.execute(f"ALTER TABLE Scenarios DROP PARTITION {', '.join(removed)};")
+    else:
+        cursor.execute("SELECT COUNT(*) FROM Scenarios WHERE entry_date < %s;", (cutoff,))
+        removed = cursor.fetchone()[0]
+        if not dry_run:
+            cursor.execute("DELETE FROM Scenarios WHERE entry_date < %s;", (cutoff,))
+    if not dry_run:
+        # A change row is only needed while it's valid on a date that's kept
+        cursor.execute("DELETE FROM ScenarioChanges WHERE valid_until <= %s;", (cutoff,))
+        cursor.execute("DELETE FROM ScenarioDates WHERE entry_date < %s;", (cutoff,))
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of Scenarios.")
+    parser.add_argument('--backend', choices=sorted(db_handler.BACKENDS), help="Database backend (default: DB_BACKEND)")
+    parser.add_argument('--db', help="SQLite file for --backend sqlite")
+    parser.add_argument('--today', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="Date to plan from (default: today)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help="List the partitions and their estimated rows")
+    extend_parser = commands.add_parser('extend', help="Create the partitions for the coming months")
+    extend_parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD)
+    retain_parser = commands.add_parser('retain', help="Drop the months before the newest --keep-months")
+    retain_parser.add_argument('--keep-months', type=int, required=True,
+                               help="Full months kept before the current one")
+    retain_parser.add_argument('--dry-run', action='store_true', help="Only list what would be removed")
+    args = parser.parse_args()
+    if args.command == 'retain' and args.keep_months < 1:
+        parser.error("--keep-months must be at least 1")
+    db_handler.configure(backend=args.backend, sqlite_path=args.db)
+    today = args.today or date.today()
+
+    dialect = db_handler.get_dialect()
+    connection = db_handler.get_connection(caller='partitions')
+    cursor = connection.cursor()
+    try:
+        if args.command == 'status':
+            partitions = dialect.partitions(cursor, 'Scenarios')
+            if not partitions:
+                print("Scenarios is not partitioned")
+            for name, bound, rows in partitions:
+                print(f"{name:<10} < {str(bound or 'MAXVALUE'):<10} {rows:>12} rows")
+        elif args.command == 'extend':
+            added = extend(cursor, dialect, today, args.months_ahead)
+            print(f"Added {', '.join(name for name, _ in added) or 'no partitions'}")
+        else:
+            cutoff = add_months(today, -args.keep_months)
+            connection.start_transaction()
+            removed = retain(cursor, dialect, cutoff, args.dry_run)
+            connection.commit()
+            verb = 'Would remove' if args.dry_run else 'Removed'
+            if isinstance(removed, list):
+                print(f"{verb} snapshots before {cutoff}: {', '.join(removed) or 'no partitions'}")
+            else:
+                print(f"{verb} snapshots before {cutoff}: {removed} rows")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
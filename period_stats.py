@@ -0,0 +1,239 @@
+# period_stats.py
+# Period totals and most played mods computed from Scenarios snapshots held in memory.
+#
+# A tie for most played goes to the smallest mod value, the order mod_matrix uses too.
+# Rows written before this rule took whichever tied mod the query returned first, so a
+# backfill can name a different most played mod for a day with a tie.
+import heapq
+import operator
+from datetime import timedelta
+
+from scenario_changes import scenario_reads
+from snapshot_dates import to_date
+
+# Plays recorded before tracking started; also the stand-in total for days without data
+PLAYS_BEFORE_TRACKING = 165785
+
+# (PlayStatistics.time_period, days back)
+ROLLING_PERIODS = [
+    ('last_day', 1),
+    ('last_three_days', 3),
+    ('last_week', 7),
+    ('last_month', 30),
+]
+
+
+def tracker_periods(day):
+    """(period_type, period_value, start date) for the week, month and year containing day."""
+    start_of_week = day - timedelta(days=day.weekday()) - timedelta(days=1)
+    start_of_month = day.replace(day=1) - timedelta(days=1)
+    start_of_year = day.replace(month=1, day=1) - timedelta(days=1)
+    return [
+        ('week', day.strftime('%Y-%W'), start_of_week),
+        ('month', day.strftime('%Y-%m'), start_of_month),
+        ('year', day.strftime('%Y'), start_of_year),
+    ]
+
+
+def required_dates(day):
+    # Every snapshot the daily stats for `day` compare against
+    dates = {day}
+    dates.update(day - timedelta(days=days) for _, days in ROLLING_PERIODS)
+    dates.update(start for _, _, start in tracker_periods(day))
+    return dates
+
+
+def snapshot_total(mods):
+    return sum(play_count for _, play_count in mods.values())
+
+
+class SnapshotSet:
+    """Scenarios snapshots for a set of dates, loaded once and shared by every window."""
+
+    def __init__(self, snapshots, oldest_date, totals=None):
+        self.snapshots = snapshots  # {date: {value: (name, play_count)}}
+        self.oldest_date = oldest_date
+        if totals is None:
+            totals = {day: snapshot_total(mods) for day, mods in snapshots.items()}
+        self.totals = totals
+
+    @classmethod
+    def load(cls, connection, dates):
+        """Load the given dates plus the oldest snapshot on record with two queries."""
+        cursor = connection.cursor()
+        cursor.execute(scenario_reads("SELECT MIN(entry_date) FROM Scenarios;"))
+        oldest_date = cursor.fetchone()[0]
+        oldest_date = to_date(oldest_date) if oldest_date is not None else None
+
+        dates = sorted(set(dates) | ({oldest_date} if oldest_date else set()))
+        snapshots = {day: {} for day in dates}
+        placeholders = ', '.join(['%s'] * len(dates))
+        cursor.execute(scenario_reads(f"""
+        SELECT value, name, play_count, entry_date FROM Scenarios
+        WHERE entry_date IN ({placeholders});
+        """), tuple(dates))
+        for value, name, play_count, entry_date in cursor.fetchall():
+            snapshots[to_date(entry_date)][value] = (name, play_count)
+        cursor.close()
+        return cls(snapshots, oldest_date)
+
+    def play_counts(self, day):
+        return self.snapshots.get(day, {})
+
+    def total_plays(self, day):
+        # Sum of all play counts on that day, or the pre-tracking total if there is no data
+        if not self.snapshots.get(day):
+            return PLAYS_BEFORE_TRACKING
+        return self.totals[day]
+
+    def period_totals(self, start_date, end_date):
+        """Total plays between two snapshots and the mod with the most plays in between."""
+        end_date_play_counts = self.play_counts(end_date)
+        start_date_play_counts = self.play_counts(start_date)
+
+        # If no data on start_date, fall back to the oldest data on record
+        if not start_date_play_counts:
+            start_date_play_counts = self.play_counts(self.oldest_date)
+
+        # Calculate the difference in play counts for each mod; ties go to the smallest value
+        total_plays = 0
+        most_played = None
+        most_change = float('-inf')
+        for value, (name, play_count) in end_date_play_counts.items():
+            start_mod = start_date_play_counts.get(value)
+            difference = play_count - (start_mod[1] if start_mod else 0)
+            total_plays += difference
+            if difference >= most_change and (difference > most_change or value < most_played[1]):
+                most_change = difference
+                most_played = (name, value)
+
+        if most_played is None:
+            raise ValueError(f"No Scenarios data for {end_date}")
+        return total_plays, {'name': most_played[0], 'play_count': most_change}
+
+
+def snapshot_changes(before, after):
+    """[(value, play_count before, play_count after)] for mods whose play count differs; None where unlisted."""
+    changes = []
+    listed = 0  # Mods listed in both, to tell whether any were dropped
+    for value, (_, play_count) in after.items():
+        old = before.get(value)
+        if old is None:
+            changes.append((value, None, play_count))
+            continue
+        listed += 1
+        if old[1] != play_count:
+            changes.append((value, old[1], play_count))
+    if listed < len(before):
+        changes.extend((value, old[1], None) for value, old in before.items() if value not in after)
+    return changes
+
+
+class WindowSums:
+    """SnapshotSet.period_totals() for one window, kept up to date as its ends move.
+
+    Holds each listed mod's play count change between the start and end snapshots.
+    Moving an end applies snapshot_changes() between its old and new snapshot, so only
+    the mods whose play count changed are touched. The most played mod comes off a
+    max-heap that is brought up to date when asked: the touched mods are pushed again
+    and outdated entries are skipped when they reach the top. When most mods were
+    touched a single pass over the changes is cheaper, and the heap is rebuilt later.
+    """
+
+    def __init__(self, start, start_mods, end, end_mods):
+        self.start, self.start_mods = start, start_mods
+        self.end, self.end_mods = end, end_mods
+        self.changes = {value: play_count - self._start_plays(value) for value, (_, play_count) in end_mods.items()}
+        self.total = sum(self.changes.values())
+        self.touched = set()
+        self._rebuild_heap()
+
+    def _start_plays(self, value):
+        start_mod = self.start_mods.get(value)
+        return start_mod[1] if start_mod else 0
+
+    def _rebuild_heap(self):
+        self.heap = [(-change, value) for value, change in self.changes.items()]
+        heapq.heapify(self.heap)
+
+    def move_end(self, end, end_mods, changes):
+        # changes are snapshot_changes(self.end_mods, end_mods)
+        sums, touched, total = self.changes, self.touched, self.total
+        for value, old, new in changes:
+            if new is None:
+                total -= sums.pop(value)
+            elif old is None:
+                sums[value] = change = new - self._start_plays(value)
+                total += change
+                touched.add(value)
+            else:
+                sums[value] += new - old
+                total += new - old
+                touched.add(value)
+        self.total = total
+        self.end, self.end_mods = end, end_mods
+
+    def move_start(self, start, start_mods, changes):
+        # changes are snapshot_changes(self.start_mods, start_mods); mods not listed at the end don't count
+        sums, touched, total = self.changes, self.touched, self.total
+        for value, old, new in changes:
+            if value in sums:
+                delta = (new or 0) - (old or 0)
+                sums[value] -= delta
+                total -= delta
+                touched.add(value)
+        self.total = total
+        self.start, self.start_mods = start, start_mods
+
+    def most_played(self):
+        sums = self.changes
+        if not sums:
+            raise ValueError(f"No Scenarios data for {self.end}")
+        if 2 * len(self.touched) > len(sums):
+            # Most mods moved: one pass finds the top, and the heap is rebuilt when next needed
+            self.heap = None
+            self.touched.clear()
+            change, value = min(zip(map(operator.neg, sums.values()), sums))
+            return {'name': self.end_mods[value][0], 'play_count': -change}
+        if self.heap is None or len(self.heap) > 4 * len(sums):
+            self._rebuild_heap()
+        else:
+            for value in self.touched:
+                if value in sums:
+                    heapq.heappush(self.heap, (-sums[value], value))
+        self.touched.clear()
+        heap = self.heap
+        while sums.get(heap[0][1]) != -heap[0][0]:
+            heapq.heappop(heap)
+        change, value = heap[0]
+        return {'name': self.end_mods[value][0], 'play_count': -change}
+
+    def period_totals(self):
+        return self.total, self.most_played()
+
+
+def compute_daily_stats(snapshot_set, day, current_total_plays=None):
+    """PlayStatistics rows and PlayTracker rows for `day`.
+
+    Returns (time_periods, trackers) where time_periods holds
+    (time_period, change, most_played_mod) and trackers holds
+    (period_type, period_value, total_plays, most_played_mod).
+    """
+    if current_total_plays is None:
+        current_total_plays = snapshot_set.total_plays(day)
+
+    time_periods = []
+    for time_period, days in ROLLING_PERIODS:
+        start_date = day - timedelta(days=days)
+        change = current_total_plays - snapshot_set.total_plays(start_date)
+        _, most_played_mod = snapshot_set.period_totals(start_date, day)
+        time_periods.append((time_period, int(change), most_played_mod))
+
+    trackers = []
+    for period_type, period_value, start_date in tracker_periods(day):
+        total_plays, most_played_mod = snapshot_set.period_totals(start_date, day)
+        if period_type == 'year':
+            total_plays += PLAYS_BEFORE_TRACKING
+        trackers.append((period_type, period_value, total_plays, most_played_mod))
+
+    return time_periods, trackers
@@ -0,0 +1,66 @@
+# query_cache.py
+# Size-bounded LRU cache for query results, tied to the current snapshot version.
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Caches query results keyed by (snapshot version, query, params).
+
+    The stats tables only change when the scraper lands a new snapshot, so every
+    entry is dropped as soon as a newer version is seen.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get_or_load(self, version, query, params, loader):
+        key = (version, query, tuple(params) if params is not None else None)
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.version = version
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return list(self.entries[key])
+            self.misses += 1
+
+        # Run the query outside the lock so slow queries don't block cache hits
+        data = loader()
+
+        with self.lock:
+            if version == self.version:
+                self.entries[key] = data
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return list(data)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': str(self.version) if self.version is not None else None,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,121 @@
+# query_plans.py
+# EXPLAINs every hot query against the configured database and fails on a full table scan.
+#
+#   python query_plans.py                                   # as configured in db_handler
+#   python query_plans.py --backend sqlite --db local_stats.db
+#
+# Run it after migrations.py migrate and after changing a query: it exits with status 1
+# if any query reads a whole table, or walks a whole index where it should seek into it.
+# Queries that page through an index in order under a LIMIT, or that run once per process
+# over the whole date index, are allowed an index scan. On a partitioned Scenarios the
+# per-date lookups must also be pruned to at most two monthly partitions. The queries are
+# the ones the app runs, imported from where they are defined, with representative parameters.
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+import db_handler
+from scenario_changes import scenario_reads
+from storage import FULL_SCAN, INDEX_SCAN
+
+# A per-date lookup spans at most a month boundary (partitions.py)
+MAX_PARTITIONS = 2
+
+
+def hot_queries(day):
+    """[(name, query, params, index scan allowed, pruned)] for the dashboard, API, scraper and backfill.
+
+    Pruned queries name their dates as constants and may read at most MAX_PARTITIONS partitions.
+    """
+    # Imported here so the app's pool is only set up once configure() has run
+    from api import RESOURCES, build_query
+    from backfill import DATE_RANGE_QUERY, SNAPSHOT_RANGE_QUERY
+    from flask_app import (MOD_HISTORY_QUERY, MOD_HISTORY_RANGE_QUERY, RECENT_QUERY, BY_DAY_QUERY, BY_WEEK_QUERY,
+                           BY_MONTH_QUERY)
+    from snapshot_dates import ALL_DATES_QUERY, NEWER_DATES_QUERY, OLDEST_DATE_QUERY
+    from stats_db import SNAPSHOT_QUERY, MOD_MATRIX
+
+    week_ago = day - timedelta(days=7)
+    bounds = (day, day - timedelta(days=1), day - timedelta(days=3), week_ago, day - timedelta(days=30))
+    queries = [
+        ('snapshot', SNAPSHOT_QUERY, (day,), False, True),
+        ('snapshot dates', ALL_DATES_QUERY, None, True, False),
+        ('newer snapshot dates', NEWER_DATES_QUERY, (week_ago,), False, False),
+        ('snapshot date range', DATE_RANGE_QUERY, None, False, False),
+        ('oldest snapshot', OLDEST_DATE_QUERY, None, False, False),
+        ('mod history', MOD_HISTORY_RANGE_QUERY, bounds + ('0036AD', bounds[-1], day), False, True),
+        ('mod history (all dates)', MOD_HISTORY_QUERY, bounds + ('0036AD',), False, False),
+        ('period snapshots', "SELECT value, name, play_count, entry_date FROM Scenarios "
+                             "WHERE entry_date IN (%s, %s, %s);", (day, week_ago, bounds[-1]), False, True),
+        ('backfill range', SNAPSHOT_RANGE_QUERY, (week_ago, day), False, True),
+        ('backfill delete', "DELETE FROM PlayStatistics WHERE date BETWEEN %s AND %s;", (week_ago, day), False, False),
+        ('/recent', RECENT_QUERY, (day,), False, False),
+        ('/by_day', BY_DAY_QUERY, None, False, False),
+        ('/by_week', BY_WEEK_QUERY, None, False, False),
+        ('/by_month', BY_MONTH_QUERY, None, False, False),
+        ('tracker period', "SELECT * FROM PlayTracker WHERE period_type = %s AND period_value = %s;",
+         ('week', day.strftime('%Y-%W')), False, False),
+    ]
+    if MOD_MATRIX:
+        # The matrix reads every snapshot once per process, then only the newer ones
+        from mod_matrix import ALL_ROWS_QUERY, NEWER_ROWS_QUERY
+        queries.append(('matrix load', ALL_ROWS_QUERY, None, True, False))
+        queries.append(('matrix refresh', NEWER_ROWS_QUERY, (week_ago,), False, False))
+    # The API's default page of each resource, and the same page filtered. With change-only
+    # storage a filtered Scenarios page walks ScenarioDates (one row per day) newest first.
+    for name, resource in RESOURCES.items():
+        query, params = build_query(resource, {})[:2]
+        queries.append((f"/api/{name}", query, params, True, False))
+        first_filter = resource['filters'][0]
+        query, params = build_query(resource, {first_filter: '0'})[:2]
+        dates_walk = name == 'scenarios' and db_handler.change_only()
+        queries.append((f"/api/{name}?{first_filter}=", query, params, dates_walk, False))
+    # One snapshot's page; with change-only storage it pages through ScenarioChanges in value order
+    query, params = build_query(RESOURCES['scenarios'], {'entry_date': day.isoformat()})[:2]
+    queries.append(('/api/scenarios?entry_date=', query, params, db_handler.change_only(), True))
+    return queries
+
+
+def check(day=None, verbose=False):
+    """EXPLAIN every hot query; returns the [(name, table, access, detail)] that read too much."""
+    day = day or datetime.now().date()
+    dialect = db_handler.get_dialect()
+    connection = db_handler.get_connection(caller='query_plans')
+    cursor = connection.cursor()
+    failures = []
+    try:
+        for name, query, params, index_scan_ok, pruned in hot_queries(day):
+            for table, access, detail, partitions in dialect.explain(cursor, scenario_reads(query), params):
+                bad = access == FULL_SCAN or (access == INDEX_SCAN and not index_scan_ok)
+                if pruned and partitions is not None and len(partitions) > MAX_PARTITIONS:
+                    bad = True
+                    detail = f"partitions={','.join(partitions)} {detail}"
+                if bad:
+                    failures.append((name, table, access, detail))
+                if bad or verbose:
+                    print(f"{'FAIL' if bad else 'ok':<5} {name:<32} {table:<15} {access:<11} {detail}")
+    finally:
+        cursor.close()
+        connection.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot query's plan scans a whole table.")
+    parser.add_argument('--backend', choices=sorted(db_handler.BACKENDS), help="Database backend (default: DB_BACKEND)")
+    parser.add_argument('--db', help="SQLite file for --backend sqlite")
+    parser.add_argument('--date', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="Snapshot date used as the query parameter (default: today)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Print every plan, not only failures")
+    args = parser.parse_args()
+    db_handler.configure(backend=args.backend, sqlite_path=args.db)
+
+    failures = check(args.date, args.verbose)
+    if failures:
+        print(f"{len(failures)} failing plan(s); run migrations.py migrate, add an index or pass dates as constants")
+        sys.exit(1)
+    print("No full scans")
+
+
+if __name__ == '__main__':
+    main()
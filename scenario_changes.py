@@ -0,0 +1,220 @@
+# scenario_changes.py
+# Change-only storage of Scenarios: a row is written only when a mod appears, changes its
+# name or counters, or drops out of the catalog, and full snapshots are rebuilt on read.
+#
+#   python migrations.py migrate                      # creates the tables and the view
+#   python scenario_changes.py convert                # fill them from the full Scenarios table
+#   python scenario_changes.py verify --days 30       # compare the two for the newest days
+#   python scenario_changes.py sizes
+#   SCENARIO_STORAGE=changes python scraper.py        # from now on, only changes are written
+#
+# A ScenarioChanges row holds one mod's name and counters over [entry_date, valid_until):
+# a dormant mod keeps a single row for as long as it stays listed and unchanged.
+# ScenarioDates lists every snapshot date. The ScenarioHistory view joins the two back
+# into Scenarios' rows, so with SCENARIO_STORAGE=changes read queries are pointed at it
+# (or at ScenarioDates when they only ask for snapshot dates) and every route keeps its
+# results. The backfill replays the rows in date order instead of reading full snapshots.
+import argparse
+import heapq
+import re
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import db_handler
+from snapshot_dates import to_date
+from stats_writer import insert_scenario_changes, CURRENT
+
+FETCH_BATCH = 5000
+
+SCENARIOS_TABLE = re.compile(r'\bScenarios\b')
+# Queries about snapshot dates alone are answered by the small ScenarioDates table
+DATES_ONLY = re.compile(r'\b(DISTINCT entry_date|MIN\(entry_date\)|MAX\(entry_date\)) FROM Scenarios\b', re.I)
+
+
+@lru_cache(maxsize=512)
+def rewrite(query):
+    query = DATES_ONLY.sub(lambda match: match.group(1).replace('DISTINCT ', '') + ' FROM ScenarioDates', query)
+    return SCENARIOS_TABLE.sub('ScenarioHistory', query)
+
+
+def scenario_reads(query):
+    """The query as it has to run under the configured storage: unchanged for the full table."""
+    return rewrite(query) if db_handler.change_only() else query
+
+
+def stream_snapshots(connection, start_date, end_date):
+    """Yield (date, {value: (name, play_count)}) for every snapshot in the range, oldest first.
+
+    The rows valid at the start are loaded, then the rows starting within the range are
+    read in date order; each row's end is queued until the sweep reaches it.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT entry_date FROM ScenarioDates WHERE entry_date BETWEEN %s AND %s ORDER BY entry_date;",
+                   (start_date, end_date))
+    dates = [to_date(row[0]) for row in cursor.fetchall()]
+    state = {}  # value -> (entry_date, name, play_count)
+    ends = []  # (valid_until, value, entry_date) of rows that end within the range
+
+    def add(value, entry_date, valid_until, name, play_count):
+        state[value] = (to_date(entry_date), name, play_count)
+        if to_date(valid_until) <= end_date:
+            heapq.heappush(ends, (to_date(valid_until), value, to_date(entry_date)))
+
+    cursor.execute("""
+    SELECT value, entry_date, valid_until, name, play_count FROM ScenarioChanges
+    WHERE valid_until >= %s AND entry_date < %s;
+    """, (start_date, start_date))
+    for row in cursor.fetchall():
+        add(*row)
+    cursor.close()
+
+    cursor = connection.cursor(buffered=False)
+    cursor.execute("""
+    SELECT value, entry_date, valid_until, name, play_count FROM ScenarioChanges
+    WHERE entry_date BETWEEN %s AND %s
+    ORDER BY entry_date;
+    """, (start_date, end_date))
+
+    def rows():
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH)
+            if not batch:
+                break
+            yield from batch
+
+    starts = rows()
+    pending = next(starts, None)
+    for day in dates:
+        while ends and ends[0][0] <= day:
+            _, value, entry_date = heapq.heappop(ends)
+            if value in state and state[value][0] == entry_date:
+                del state[value]  # Not already replaced by a newer row
+        while pending is not None and to_date(pending[1]) <= day:
+            add(*pending)
+            pending = next(starts, None)
+        yield day, {value: (name, play_count) for value, (_, name, play_count) in state.items()}
+    cursor.close()
+
+
+# --- Converting and checking an existing Scenarios table ---
+
+def convert(start_date=None):
+    """Rebuild ScenarioChanges and ScenarioDates from Scenarios, from start_date on; one transaction.
+
+    Returns (snapshots, Scenarios rows read, change rows written).
+    """
+    connection = db_handler.get_connection(caller='scenario_changes')
+    cursor = connection.cursor()
+    connection.start_transaction()
+    try:
+        current = {}  # value -> (entry_date, (name, favs, play_count)) of the rows still open
+        if start_date is None:
+            cursor.execute("DELETE FROM ScenarioChanges;")
+            cursor.execute("DELETE FROM ScenarioDates;")
+        else:
+            # Rows valid at start_date are rewritten with their new end, later ones from scratch
+            cursor.execute("""
+            SELECT value, entry_date, name, favs, play_count FROM ScenarioChanges
+            WHERE valid_until >= %s AND entry_date < %s;
+            """, (start_date, start_date))
+            for value, entry_date, name, favs, play_count in cursor.fetchall():
+                current[value] = (to_date(entry_date), (name, favs, play_count))
+            cursor.execute("DELETE FROM ScenarioChanges WHERE valid_until >= %s;", (start_date,))
+            cursor.execute("DELETE FROM ScenarioDates WHERE entry_date >= %s;", (start_date,))
+
+        # One snapshot at a time: MySQL can't write on a connection while a streamed read is open
+        cursor.execute("SELECT DISTINCT entry_date FROM Scenarios ORDER BY entry_date;")
+        dates = [to_date(row[0]) for row in cursor.fetchall() if start_date is None or to_date(row[0]) >= start_date]
+        snapshots = scenarios = written = 0
+        for day in dates:
+            cursor.execute("SELECT value, name, favs, play_count FROM Scenarios WHERE entry_date = %s;", (day,))
+            snapshot = {value: (name, favs, play_count) for value, name, favs, play_count in cursor.fetchall()}
+            # Close the rows of mods that changed or went missing, open rows for the new values
+            ended = [(value, started, day) + fields for value, (started, fields) in current.items()
+                     if snapshot.get(value) != fields]
+            insert_scenario_changes(cursor, ended)
+            for value, started, *_ in ended:
+                del current[value]
+            for value, fields in snapshot.items():
+                if value not in current:
+                    current[value] = (day, fields)
+            cursor.execute("INSERT INTO ScenarioDates (entry_date) VALUES (%s);", (day,))
+            snapshots += 1
+            scenarios += len(snapshot)
+            written += len(ended)
+        insert_scenario_changes(cursor, [(value, started, CURRENT) + fields for value, (started, fields) in current.items()])
+        written += len(current)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+    return snapshots, scenarios, written
+
+
+def verify(days=30):
+    """Compare the newest days of Scenarios with ScenarioHistory; returns the dates that differ."""
+    connection = db_handler.get_connection(caller='scenario_changes')
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT DISTINCT entry_date FROM Scenarios ORDER BY entry_date DESC LIMIT %s;", (days,))
+        dates = [to_date(row[0]) for row in cursor.fetchall()]
+        mismatches = []
+        for day in sorted(dates):
+            snapshots = []
+            for table in ('Scenarios', 'ScenarioHistory'):
+                cursor.execute(f"SELECT value, name, favs, play_count FROM {table} WHERE entry_date = %s "
+                               f"ORDER BY value;", (day,))
+                snapshots.append(cursor.fetchall())
+            if snapshots[0] != snapshots[1]:
+                mismatches.append(day)
+    finally:
+        cursor.close()
+        connection.close()
+    return dates, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Scenarios to change-only storage and check the result.")
+    parser.add_argument('--backend', choices=sorted(db_handler.BACKENDS), help="Database backend (default: DB_BACKEND)")
+    parser.add_argument('--db', help="SQLite file for --backend sqlite")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help="Fill the change-only tables from Scenarios")
+    convert_parser.add_argument('--start', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                                help="Only redo snapshots from this date on (default: all)")
+    verify_parser = commands.add_parser('verify', help="Compare recent snapshots in both storages")
+    verify_parser.add_argument('--days', type=int, default=30)
+    commands.add_parser('sizes', help="Rows and bytes of both storages")
+    args = parser.parse_args()
+    db_handler.configure(backend=args.backend, sqlite_path=args.db)
+
+    if args.command == 'convert':
+        start = time.perf_counter()
+        snapshots, scenarios, written = convert(args.start)
+        print(f"Converted {snapshots} snapshots: {scenarios} Scenarios rows -> {written} change rows "
+              f"in {time.perf_counter() - start:.1f}s")
+    elif args.command == 'verify':
+        dates, mismatches = verify(args.days)
+        for day in mismatches:
+            print(f"{day}: ScenarioHistory differs from Scenarios")
+        print(f"Checked {len(dates)} snapshots, {len(mismatches)} differ")
+        if mismatches:
+            raise SystemExit(1)
+    else:
+        connection = db_handler.get_connection(caller='scenario_changes')
+        cursor = connection.cursor()
+        tables = ['Scenarios', 'ScenarioChanges', 'ScenarioDates']
+        sizes = db_handler.get_dialect().table_sizes(cursor, tables)
+        cursor.close()
+        connection.close()
+        print(f"{'table':<16} {'rows':>12} {'data bytes':>14} {'index bytes':>14}")
+        for table in tables:
+            rows, data, index = sizes.get(table, (0, 0, 0))
+            print(f"{table:<16} {rows:>12} {data:>14} {index:>14}")
+
+
+if __name__ == '__main__':
+    main()
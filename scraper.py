@@ -1,290 +1,457 @@
-import requests
-from bs4 import BeautifulSoup
+# scraper.py
+# Daily scrape of the mod catalog and stats backend into the archive and the database.
+#
+#   python scraper.py              # production run
+#   python scraper.py --dry-run    # local stub backend + SQLite, written under dry_run/
+#   python scraper.py --stream     # overlap the stats fetch with the archive and DB writes
+#
+# Stages: catalog fetch -> stats fetch -> archive write -> DB upsert -> aggregation
+# -> tracker update (-> static export). Each stage is timed and its counts and bytes
+# are appended, one JSON line per run, to the run log. In streaming mode the middle
+# three run as one stage: each mod is written to the archive and queued for the DB
+# writer as soon as its stats arrive. Archives are written to a .tmp file and renamed
+# into place when complete, so a failed run keeps the day's previous archive.
+#
+# A mod whose stats still fail after the retries doesn't fail the run: it keeps the
+# counters of the last snapshot (or is left out if it has none) and is listed under
+# 'failures' in its stage's run log entry. Only when more than SCRAPER_MAX_FAILURES
+# (a fraction of the catalog) fail is the run aborted, before anything is committed.
+import argparse
 import json
 import os
-from datetime import datetime, timedelta
-import mysql.connector
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import db_handler
+from archive_format import SnapshotWriter, write_snapshot, EXTENSION
+from archived_stats import TRACKER_FILES
+from catalog import fetch_catalog
+from mod_fetcher import fetch_all_mod_stats, iter_mod_stats, MOD_API_URL
+from period_stats import SnapshotSet, required_dates, compute_daily_stats
+from stats_writer import upsert_scenarios, finish_scenarios, insert_play_statistics, upsert_trackers, ScenarioWriter
+from stats_writer import STREAM_BATCH_SIZE
+from scenario_changes import scenario_reads
+
+# Parallel requests to the stats backend, per-request timeout (seconds) and retries on 5xx/timeouts
+FETCH_CONCURRENCY = int(os.environ.get('SCRAPER_CONCURRENCY', 8))
+FETCH_TIMEOUT = float(os.environ.get('SCRAPER_TIMEOUT', 30))
+FETCH_RETRIES = int(os.environ.get('SCRAPER_RETRIES', 3))
+STREAM = os.environ.get('SCRAPER_STREAM', '0') == '1'  # Overlap fetching with the archive and DB writes
+FETCH_MAX_FAILURES = float(os.environ.get('SCRAPER_MAX_FAILURES', 0.05))  # Failing mods tolerated, as a fraction
+ARCHIVE_FORMAT = os.environ.get('SCRAPER_ARCHIVE_FORMAT', 'json')  # 'json' or 'columnar' (see archive_format.py)
 
 # URL of the webpage
-url = "https://raw.githubusercontent.com/campaign-trail-showcase/campaign-trail-showcase.github.io/main/static/mods/MODLOADERFILE.html"
-
-# Send a request to fetch the content of the webpage
-response = requests.get(url)
-response.raise_for_status()  # Raise an error for HTTP errors
-
-# Parse the HTML content using BeautifulSoup
-soup = BeautifulSoup(response.text, 'html.parser')
-
-# Find all <option> tags
-options = soup.find_all('option')
-
-# List to store the data
-data = []
-
-# Extract data from each <option> tag and store it in the list
-for option in options:
-    value = option['value']
-    data_tags = option['data-tags'].split()  # Split data-tags into a list of strings
-    name = option.text
-
-    # Send a GET request to retrieve additional data for each mod
-    mod_url = f"https://cts-backend-w8is.onrender.com/api/get_mod?modName={value}"
-    mod_response = requests.get(mod_url)
-    mod_data = mod_response.json()
-
-    favs = mod_data.get('favs', 0)  # Default to 0 if 'favs' is not present
-    play_count = mod_data.get('playCount', 0)  # Default to 0 if 'playCount' is not present
-
-    data.append({
-        'value': value,
-        'data-tags': data_tags,
-        'name': name,
-        'favs': favs,
-        'play-count': play_count
-    })
-
-# Ensure the data directory exists
-os.makedirs('data', exist_ok=True)
-
-# Get the current date
-current_date = datetime.now().strftime('%Y%m%d')
-
-# Save the data to a JSON file with the current date in the filename
-with open(f'data_archive/moddata_{current_date}.json', 'w') as json_file:
-    json.dump(data, json_file, indent=4)
-
-print(f"Data saved to data_archive/moddata_{current_date}.json")
-
-connection = mysql.connector.connect(
-    host='campaigntrailmojo.mysql.eu.pythonanywhere-services.com',
-    user='campaigntrailmoj',
-    password='PWD4MYSQL!',
-    database='campaigntrailmoj$default'
-)
-cursor = connection.cursor()
-
-# Get the current date
-current_date_db = datetime.now().strftime('%Y-%m-%d')
-
-for entry in data:
-    # Insert data into Scenarios table
-    scenario_query = """
-    INSERT INTO Scenarios (value, name, favs, play_count, entry_date)
-    VALUES (%s, %s, %s, %s, %s)
-    ON DUPLICATE KEY UPDATE
-        name = VALUES(name),
-        favs = VALUES(favs),
-        play_count = VALUES(play_count),
-        entry_date = VALUES(entry_date);
-    """
-    scenario_values = (entry['value'], entry['name'], entry['favs'], entry['play-count'], current_date_db)
-    cursor.execute(scenario_query, scenario_values)
+CATALOG_URL = "https://raw.githubusercontent.com/campaign-trail-showcase/campaign-trail-showcase.github.io/main/static/mods/MODLOADERFILE.html"
 
-# Commit the transaction
-connection.commit()
+ARCHIVE_DIR = 'data_archive'
+RUN_LOG = os.path.join(ARCHIVE_DIR, 'scrape_runs.jsonl')
+CATALOG_CACHE = os.path.join(ARCHIVE_DIR, 'catalog_cache.json')  # Last parsed catalog with its ETag and hash
+STATIC_SITE_DIR = 'static_site'
 
-def calculate_total_plays(delta_days):
-    # Calculate the past date
-    past_date = (datetime.now() - timedelta(days=delta_days)).date()
+DRY_RUN_DIR = 'dry_run'
+DRY_RUN_SNAPSHOT = os.path.join(ARCHIVE_DIR, 'moddata_20231108.json')
 
-    # Create a cursor to execute queries
-    cursor = connection.cursor()
 
-    # Query the database to sum up play counts for all mods on the specific date
-    query = """
-    SELECT SUM(play_count) FROM Scenarios
-    WHERE entry_date = %s;
-    """
-    cursor.execute(query, (past_date,))
-    result = cursor.fetchone()
+PREVIOUS_STATS_QUERY = """
+SELECT value, favs, play_count FROM Scenarios
+WHERE entry_date = (SELECT MAX(entry_date) FROM Scenarios WHERE entry_date < %s);
+"""
+
+
+class TooManyFailures(Exception):
+    pass
+
 
-    # Close the cursor
-    cursor.close()
+class RunLog:
+    """Durations, counts and byte sizes of each pipeline stage for one run."""
 
-    # Extract and return the total play counts, or 165785 if no data is found
-    total_plays = result[0] if result[0] is not None else 165785
-    return total_plays
+    def __init__(self, path, **details):
+        self.path = path
+        self.started = datetime.now()
+        self.details = details
+        self.stages = []
 
+    @contextmanager
+    def stage(self, name):
+        # The body fills in counts and bytes on the yielded dict
+        record = {'stage': name}
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            self.stages.append(record)
 
-def get_most_played_mod(data):
-    if not data:
-        return None
-    most_played_mod = max(data, key=lambda x: x.get('play-count', 0))
+    def summary(self):
+        return dict(self.details,
+                    started=self.started.isoformat(timespec='seconds'),
+                    seconds=round(sum(stage['seconds'] for stage in self.stages), 4),
+                    stages=self.stages)
+
+    def write(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as log_file:
+            log_file.write(json.dumps(self.summary()) + '\n')
+
+    def report(self):
+        for stage in self.stages:
+            extra = ', '.join(f"{key}={value}" for key, value in stage.items() if key not in ('stage', 'seconds'))
+            print(f"{stage['stage']:>15} {stage['seconds']:>9.3f}s  {extra}")
+
+
+def build_record(mod, mod_data):
+    # Combine a catalog entry with its stats
     return {
-        'name': most_played_mod['name'],
-        'play_count': most_played_mod['play-count']
+        'value': mod['value'],
+        'data-tags': mod['data-tags'],
+        'name': mod['name'],
+        'favs': mod_data.get('favs', 0),  # Default to 0 if 'favs' is not present
+        'play-count': mod_data.get('playCount', 0)  # Default to 0 if 'playCount' is not present
     }
 
 
-def calculate_total_plays_for_period(start_date, end_date):
-    start_date = start_date.date()
-    end_date = end_date.date()
-    # Create a cursor to execute queries
+def build_records(catalog, mod_stats, previous=None):
+    # Mods whose fetch failed (None) keep their previous stats, or are left out without any
+    records = []
+    for mod, mod_data in zip(catalog, mod_stats):
+        if mod_data is None:
+            mod_data = (previous or {}).get(mod['value'])
+            if mod_data is None:
+                continue
+        records.append(build_record(mod, mod_data))
+    return records
+
+
+def previous_stats(connection, day):
+    """{value: stats} of the last snapshot before `day`, shaped like the backend's answers."""
     cursor = connection.cursor()
-    # Helper function to get play counts for a specific date
-    def get_play_counts(date):
-        query = """
-        SELECT value, name, play_count FROM Scenarios
-        WHERE entry_date = %s;
-        """
-        cursor.execute(query, (date,))
-        return {value: {'name': name, 'play_count': play_count} for value, name, play_count in cursor.fetchall()}
-
-    # Get play counts for end_date and start_date
-    end_date_play_counts = get_play_counts(end_date)
-    start_date_play_counts = get_play_counts(start_date)
-
-    # If no data on start_date, find the oldest data on record
-    if not start_date_play_counts:
-        query_oldest_date = """
-        SELECT MIN(entry_date) FROM Scenarios;
-        """
-        cursor.execute(query_oldest_date)
-        oldest_date = cursor.fetchone()[0]
-        start_date_play_counts = get_play_counts(oldest_date)
-
-    # Calculate the difference in play counts for each mod
-    final_data = []
-    for value, end_data in end_date_play_counts.items():
-        start_play_count = start_date_play_counts.get(value, {'play_count': 0})['play_count']
-        difference = end_data['play_count'] - start_play_count
-        final_data.append({'value': value, 'name': end_data['name'], 'play_count': difference})
-
-    total_plays = sum(item['play_count'] for item in final_data)
-
-    most_played_mod_data = max(final_data, key=lambda x: x['play_count'])
-    most_played_mod = {
-        "name": most_played_mod_data['name'],
-        "play_count": most_played_mod_data['play_count']
-    }
+    try:
+        cursor.execute(scenario_reads(PREVIOUS_STATS_QUERY), (day,))
+        return {value: {'favs': favs, 'playCount': play_count} for value, favs, play_count in cursor.fetchall()}
+    finally:
+        cursor.close()
 
-    # Close the cursor
-    cursor.close()
 
-    return total_plays, most_played_mod
+def check_failures(failures, mods, max_failures):
+    if failures and len(failures) > max_failures * mods:
+        raise TooManyFailures(f"{len(failures)} of {mods} mods failed to fetch (limit {max_failures:.0%})")
 
 
-def update_tracker(file_path, period_key, total_plays, most_played_mod):
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as json_file_tracker:
-            tracker_data = json.load(json_file_tracker)
-    else:
-        tracker_data = {}
-    tracker_data[period_key] = {
-        'total_plays': total_plays,
-        'most_played_mod': most_played_mod
-    }
-    with open(file_path, 'w') as json_file_tracker:
-        json.dump(tracker_data, json_file_tracker, indent=4)
-
-# Calculate total plays for specific periods
-total_plays_1d = calculate_total_plays(1)
-total_plays_3d = calculate_total_plays(3)
-total_plays_7d = calculate_total_plays(7)
-total_plays_30d = calculate_total_plays(30)
-
-# Get the current total plays across all mods
-current_total_plays = sum(mod.get('play-count', 0) for mod in data)
-
-# Calculate changes
-change_1d = current_total_plays - total_plays_1d
-change_3d = current_total_plays - total_plays_3d
-change_7d = current_total_plays - total_plays_7d
-change_30d = current_total_plays - total_plays_30d
-
-_, most_played_mod_1d = calculate_total_plays_for_period(datetime.now() - timedelta(days=1), datetime.now())
-_, most_played_mod_3d = calculate_total_plays_for_period(datetime.now() - timedelta(days=3), datetime.now())
-_, most_played_mod_7d = calculate_total_plays_for_period(datetime.now() - timedelta(days=7), datetime.now())
-_, most_played_mod_30d = calculate_total_plays_for_period(datetime.now() - timedelta(days=30), datetime.now())
-
-# Update daily stats
-daily_stats = {
-    'date': current_date,
-    'total_plays': {
-        'last_day': {'change': int(change_1d), 'most_played_mod': most_played_mod_1d},
-        'last_three_days': {'change': int(change_3d), 'most_played_mod': most_played_mod_3d},
-        'last_week': {'change': int(change_7d), 'most_played_mod': most_played_mod_7d},
-        'last_month': {'change': int(change_30d), 'most_played_mod': most_played_mod_30d},
-    }
-}
-# Save the daily stats to a JSON file
-with open(f'data_archive/dailyStats_{current_date}.json', 'w') as json_file:
-    json.dump(daily_stats, json_file, indent=4)
-
-print(f"Daily stats saved to data_archive/dailyStats_{current_date}.json")
-
-time_periods = [
-    ('last_day', change_1d, most_played_mod_1d),
-    ('last_three_days', change_3d, most_played_mod_3d),
-    ('last_week', change_7d, most_played_mod_7d),
-    ('last_month', change_30d, most_played_mod_30d),
-]
-
-# Insert data into PlayStatistics table
-for period, change, most_played_mod in time_periods:
-    play_stats_query = """
-    INSERT INTO PlayStatistics (date, time_period, play_change, most_played_mod, play_count)
-    VALUES (%s, %s, %s, %s, %s);
+def record_failures(stage, failures, previous):
+    if failures:
+        stage['failed'] = len(failures)
+        stage['carried_forward'] = sum(1 for value in failures if value in previous)
+        stage['failures'] = failures
+
+
+def write_json(path, data):
+    # Write then rename, so a failed write never replaces a good file with a partial one
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as json_file:
+        json.dump(data, json_file, indent=4)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+
+class JsonListWriter:
+    """Writes a JSON list item by item, byte for byte what json.dump(items, indent=4) produces.
+
+    Items go to path + '.tmp', which close() renames over the path; a run that fails
+    calls abort() instead, leaving whatever archive was there before untouched.
     """
-    play_stats_values = (current_date_db, period, change, most_played_mod['name'], most_played_mod['play_count'])
-    cursor.execute(play_stats_query, play_stats_values)
 
-# Commit the transaction
-connection.commit()
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = path + '.tmp'
+        self.json_file = open(self.temp_path, 'w')
+        self.count = 0
 
-# Get the current date and time
-now = datetime.now()
+    def write(self, item):
+        self.json_file.write(',\n' if self.count else '[\n')
+        self.json_file.write('\n'.join('    ' + line for line in json.dumps(item, indent=4).split('\n')))
+        self.count += 1
 
-# Calculate the start of the current week, month, and year
-start_of_week = now - timedelta(days=now.weekday()) - timedelta(days=1)
-start_of_month = now.replace(day=1) - timedelta(days=1)
-start_of_year = now.replace(month=1, day=1) - timedelta(days=1)
+    def close(self):
+        self.json_file.write('\n]' if self.count else '[]')
+        self.json_file.close()
+        os.replace(self.temp_path, self.path)
+        return os.path.getsize(self.path)
 
+    def abort(self):
+        self.json_file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
 
-# After calculating total plays for week, month, and year:
-total_plays_week, most_played_mod_week = calculate_total_plays_for_period(start_of_week, now)
-total_plays_month, most_played_mod_month = calculate_total_plays_for_period(start_of_month, now)
-total_plays_year, most_played_mod_year = calculate_total_plays_for_period(start_of_year, now)
-total_plays_year += 165785
 
-# Update trackers
-update_tracker('data_archive/weekTracker.json', now.strftime('%Y-%W'), total_plays_week, most_played_mod_week)
-update_tracker('data_archive/monthTracker.json', now.strftime('%Y-%m'), total_plays_month, most_played_mod_month)
-update_tracker('data_archive/yearTracker.json', now.strftime('%Y'), total_plays_year, most_played_mod_year)
+def archive_path(archive_dir, current_date, archive_format):
+    extension = EXTENSION if archive_format == 'columnar' else '.json'
+    return os.path.join(archive_dir, f'moddata_{current_date}{extension}')
 
-def update_tracker_db(connection, period_type, period_value, total_plays, most_played_mod):
-    cursor = connection.cursor()
 
-    # Check if a record for the period already exists
-    check_query = """
-    SELECT * FROM PlayTracker
-    WHERE period_type = %s AND period_value = %s;
-    """
-    cursor.execute(check_query, (period_type, period_value))
-    existing_record = cursor.fetchone()
-
-    # If record exists, update it; otherwise, insert a new record
-    if existing_record:
-        update_query = """
-        UPDATE PlayTracker
-        SET total_plays = %s, most_played_mod = %s, play_count = %s
-        WHERE period_type = %s AND period_value = %s;
-        """
-        cursor.execute(update_query, (total_plays, most_played_mod['name'], most_played_mod['play_count'], period_type, period_value))
-    else:
-        insert_query = """
-        INSERT INTO PlayTracker (period_type, period_value, total_plays, most_played_mod, play_count)
-        VALUES (%s, %s, %s, %s, %s);
-        """
-        cursor.execute(insert_query, (period_type, period_value, total_plays, most_played_mod['name'], most_played_mod['play_count']))
+def write_archive(path, data, archive_format):
+    if archive_format == 'columnar':
+        return write_snapshot(path, data)
+    return write_json(path, data)
+
 
-    connection.commit()
-    cursor.close()
+def aggregate(connection, cursor, day, current_total_plays, log):
+    # The aggregation reads run on the same connection and see today's uncommitted rows
+    with log.stage('aggregation') as stage:
+        snapshot_set = SnapshotSet.load(connection, required_dates(day))
+        time_periods, trackers = compute_daily_stats(snapshot_set, day, current_total_plays)
+        insert_play_statistics(cursor, [(day,) + period for period in time_periods])
+        upsert_trackers(cursor, trackers)
+        stage['snapshots'] = len(snapshot_set.snapshots)
+        stage['play_statistics'] = len(time_periods)
+        stage['trackers'] = len(trackers)
+    return time_periods, trackers
 
 
-update_tracker_db(connection, 'week', now.strftime('%Y-%W'), total_plays_week, most_played_mod_week)
-update_tracker_db(connection, 'month', now.strftime('%Y-%m'), total_plays_month, most_played_mod_month)
-update_tracker_db(connection, 'year', now.strftime('%Y'), total_plays_year, most_played_mod_year)
+def store_snapshot(connection, data, day, log):
+    """Upsert the snapshot and its derived rows; every write of the run is one transaction."""
+    cursor = connection.cursor()
+    connection.start_transaction()
+    try:
+        with log.stage('db_upsert') as stage:
+            upsert_scenarios(cursor, data, day)
+            finish_scenarios(cursor, [mod['value'] for mod in data], day)
+            stage['rows'] = len(data)
+
+        current_total_plays = sum(mod.get('play-count', 0) for mod in data)
+        time_periods, trackers = aggregate(connection, cursor, day, current_total_plays, log)
+
+        # Commit the whole run at once
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return time_periods, trackers
+
+
+def stream_snapshot(connection, catalog, path, archive_format, day, log, batch_size=STREAM_BATCH_SIZE,
+                    max_failures=FETCH_MAX_FAILURES, **fetch_options):
+    """Fetch, archive and upsert each mod as its stats arrive, then aggregate; one transaction.
+
+    Only the requests in flight and the writer's bounded queue are held in memory, plus the
+    integer columns when the archive is columnar and the previous snapshot's counters,
+    which stand in for mods that fail to fetch.
+    """
+    # Read before the writer thread takes over the cursor
+    previous = previous_stats(connection, day)
+    cursor = connection.cursor()
+    connection.start_transaction()
+    try:
+        with log.stage('fetch_write') as stage:
+            archive = SnapshotWriter(path) if archive_format == 'columnar' else JsonListWriter(path)
+            current_total_plays = 0
+            failures = {}
+            try:
+                writer = ScenarioWriter(cursor, day, batch_size)
+                writer.start()
+                try:
+                    mod_stats = iter_mod_stats([mod['value'] for mod in catalog], failures=failures, **fetch_options)
+                    for index, mod_data in enumerate(mod_stats):
+                        if mod_data is None:
+                            check_failures(failures, len(catalog), max_failures)
+                            mod_data = previous.get(catalog[index]['value'])
+                            if mod_data is None:
+                                continue
+                        record = build_record(catalog[index], mod_data)
+                        archive.write(record)
+                        writer.put(record)
+                        current_total_plays += record['play-count']
+                finally:
+                    writer.close()
+                    record_failures(stage, failures, previous)
+                # Only a complete fetch replaces the day's archive
+                archive_bytes = archive.close()
+            except Exception:
+                # Drop the partial archive; the one already there for the day, if any, stays
+                archive.abort()
+                raise
+            finish_scenarios(cursor, writer.values, day)
+            stage.update(mods=archive.count, bytes=archive_bytes, rows=writer.rows,
+                         batches=writer.batches, write_seconds=round(writer.busy, 4))
+
+        time_periods, trackers = aggregate(connection, cursor, day, current_total_plays, log)
+
+        # Commit the whole run at once
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return time_periods, trackers
 
-if connection.is_connected():
-    connection.close()
+
+def update_tracker(file_path, period_key, total_plays, most_played_mod):
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as json_file_tracker:
+            tracker_data = json.load(json_file_tracker)
+    else:
+        tracker_data = {}
+    tracker_data[period_key] = {
+        'total_plays': total_plays,
+        'most_played_mod': most_played_mod
+    }
+    return write_json(file_path, tracker_data)
+
+
+def run(catalog_url=CATALOG_URL, api_url=MOD_API_URL, archive_dir=ARCHIVE_DIR, run_log=RUN_LOG,
+        catalog_cache=CATALOG_CACHE, static_site_dir=STATIC_SITE_DIR, concurrency=FETCH_CONCURRENCY,
+        timeout=FETCH_TIMEOUT, retries=FETCH_RETRIES, max_failures=FETCH_MAX_FAILURES, stream=STREAM,
+        archive_format=ARCHIVE_FORMAT, dry_run=False):
+    """One full scrape. Uses whatever database backend db_handler is configured for."""
+    log = RunLog(run_log, dry_run=dry_run, backend=db_handler.DB_BACKEND, concurrency=concurrency, stream=stream)
+    now = datetime.now()
+    current_date = now.strftime('%Y%m%d')
+    today = now.date()
+    os.makedirs(archive_dir, exist_ok=True)
+
+    try:
+        # Reuses the cached catalog when the page hasn't changed since the last run
+        with log.stage('catalog_fetch') as stage:
+            result = fetch_catalog(catalog_url, catalog_cache, timeout=timeout)
+            catalog = result.catalog
+            stage.update(source=result.source, bytes=result.bytes, mods=len(catalog),
+                         added=len(result.added), removed=len(result.removed))
+        if result.changed:
+            print(f"Catalog changed: {len(result.added)} mods added, {len(result.removed)} removed")
+
+        path = archive_path(archive_dir, current_date, archive_format)
+        if stream:
+            connection = db_handler.get_connection(caller='scraper')
+            try:
+                time_periods, trackers = stream_snapshot(connection, catalog, path, archive_format, today, log,
+                                                         max_failures=max_failures,
+                                                         concurrency=concurrency,
+                                                         timeout=timeout,
+                                                         retries=retries,
+                                                         api_url=api_url)
+            finally:
+                connection.close()
+        else:
+            # Fetch the stats of every mod concurrently; results keep the catalog order
+            with log.stage('stats_fetch') as stage:
+                failures = {}
+                mod_stats = fetch_all_mod_stats([mod['value'] for mod in catalog],
+                                                concurrency=concurrency,
+                                                timeout=timeout,
+                                                retries=retries,
+                                                api_url=api_url,
+                                                failures=failures)
+                previous = {}
+                try:
+                    check_failures(failures, len(catalog), max_failures)
+                    if failures:
+                        connection = db_handler.get_connection(caller='scraper')
+                        try:
+                            previous = previous_stats(connection, today)
+                        finally:
+                            connection.close()
+                finally:
+                    record_failures(stage, failures, previous)
+                data = build_records(catalog, mod_stats, previous)
+                stage['mods'] = len(data)
+
+            # Save the data to a JSON file with the current date in the filename
+            with log.stage('archive_write') as stage:
+                stage['bytes'] = write_archive(path, data, archive_format)
+                stage['files'] = 1
+
+            connection = db_handler.get_connection(caller='scraper')
+            try:
+                time_periods, trackers = store_snapshot(connection, data, today, log)
+            finally:
+                connection.close()
+
+        with log.stage('tracker_update') as stage:
+            daily_stats = {
+                'date': current_date,
+                'total_plays': {
+                    period: {'change': change, 'most_played_mod': most_played_mod}
+                    for period, change, most_played_mod in time_periods
+                }
+            }
+            stage['bytes'] = write_json(os.path.join(archive_dir, f'dailyStats_{current_date}.json'), daily_stats)
+            for period_type, period_value, total_plays, most_played_mod in trackers:
+                stage['bytes'] += update_tracker(os.path.join(archive_dir, TRACKER_FILES[period_type]),
+                                                 period_value, total_plays, most_played_mod)
+            stage['files'] = 1 + len(trackers)
+
+        # Export the dashboard as static pages now that the new snapshot is in
+        if static_site_dir:
+            try:
+                with log.stage('static_export') as stage:
+                    from static_export import export_site
+                    stage['pages'] = len(export_site(static_site_dir))
+            except Exception as e:
+                print(f"Static export failed: {str(e)}")
+    finally:
+        log.write()
+    return log
+
+
+def dry_run_setup(output_dir, snapshot_path, latency, error_rate=0.0):
+    """Point the run at a stub backend serving an archived snapshot and a local SQLite file."""
+    from stub_backend import load_snapshot, start_stub_backend
+
+    os.makedirs(output_dir, exist_ok=True)
+    db_handler.configure(backend='sqlite', sqlite_path=os.path.join(output_dir, 'stats.db'))
+    server = start_stub_backend(load_snapshot(snapshot_path), latency=latency, error_rate=error_rate)
+    return server, f"{server.base_url}/MODLOADERFILE.html", f"{server.base_url}/api/get_mod"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the mod catalog and stats into the archive and database.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Scrape a local stub backend into SQLite, writing only under --output")
+    parser.add_argument('--output', default=DRY_RUN_DIR, help="Dry run: directory for the archive, database and log")
+    parser.add_argument('--snapshot', default=DRY_RUN_SNAPSHOT, help="Dry run: archived moddata file the stub serves")
+    parser.add_argument('--latency', type=float, default=0.0, help="Dry run: seconds added to every stub response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Dry run: fraction of stub responses that fail")
+    parser.add_argument('--concurrency', type=int, default=FETCH_CONCURRENCY)
+    parser.add_argument('--retries', type=int, default=FETCH_RETRIES)
+    parser.add_argument('--max-failures', type=float, default=FETCH_MAX_FAILURES,
+                        help="Fraction of mods whose stats may fail to fetch before the run is aborted")
+    parser.add_argument('--archive-format', choices=['json', 'columnar'], default=ARCHIVE_FORMAT)
+    parser.add_argument('--stream', action='store_true', default=STREAM,
+                        help="Write each mod to the archive and database as soon as its stats arrive")
+    parser.add_argument('--run-log', help=f"JSON lines file for stage timings (default: {RUN_LOG})")
+    parser.add_argument('--no-export', action='store_true', help="Skip the static site export")
+    args = parser.parse_args()
+
+    options = {'concurrency': args.concurrency, 'retries': args.retries, 'max_failures': args.max_failures,
+               'stream': args.stream, 'archive_format': args.archive_format,
+               'dry_run': args.dry_run}
+    server = None
+    if args.dry_run:
+        server, options['catalog_url'], options['api_url'] = dry_run_setup(args.output, args.snapshot,
+                                                                           args.latency, args.error_rate)
+        options['archive_dir'] = os.path.join(args.output, 'data_archive')
+        options['run_log'] = os.path.join(args.output, 'scrape_runs.jsonl')
+        options['catalog_cache'] = os.path.join(args.output, 'catalog_cache.json')
+        options['static_site_dir'] = os.path.join(args.output, 'static_site')
+    if args.run_log:
+        options['run_log'] = args.run_log
+    if args.no_export:
+        options['static_site_dir'] = None
+
+    try:
+        log = run(**options)
+    finally:
+        if server is not None:
+            server.shutdown()
+    log.report()
+    print(f"Run logged to {log.path}")
+
+
+if __name__ == '__main__':
+    main()
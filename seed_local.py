@@ -0,0 +1,110 @@
+# seed_local.py
+# Fills a local SQLite database with a realistic synthetic history for load tests and profiling.
+#
+#   python seed_local.py --db local_stats.db --mods 1500 --days 400
+#   DB_BACKEND=sqlite DB_SQLITE_PATH=local_stats.db python flask_app.py
+#
+# The real mods from the newest archived snapshot are padded out with generated ones.
+# Popularity is heavy-tailed, mods launch and get delisted along the way, and the
+# history ends today so every dashboard route has data. PlayStatistics and PlayTracker
+# are then derived by the backfill, exactly as the scraper would have written them, and
+# the schema migrations are applied so the database is indexed like production.
+import argparse
+import glob
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import db_handler
+from archive_format import load_moddata
+from backfill import backfill
+from migrations import migrate
+from stats_writer import upsert_scenarios, finish_scenarios
+
+ARCHIVE_DIR = 'data_archive'
+
+
+def base_mods(archive_dir):
+    paths = sorted(glob.glob(os.path.join(archive_dir, 'moddata_*')))
+    return load_moddata(paths[-1]) if paths else []
+
+
+def generate_mods(count, days, archive_dir=ARCHIVE_DIR, seed=1):
+    random.seed(seed)
+    mods = [{'value': mod['value'], 'name': mod['name'], 'play-count': mod['play-count'], 'favs': mod['favs']}
+            for mod in base_mods(archive_dir)][:count]
+    while len(mods) < count:
+        number = len(mods)
+        mods.append({'value': f"Generated{number:05d}", 'name': f"Generated Scenario {number}",
+                     'play-count': 0, 'favs': 0})
+    for mod in mods:
+        # Daily plays follow a Pareto tail: a few hits, a long list of rarely played mods
+        mod['rate'] = min(random.paretovariate(1.2), 400)
+        mod['launch'] = 0 if mod['play-count'] or random.random() < 0.6 else random.randrange(days)
+        mod['delisted'] = random.randrange(days) if random.random() < 0.02 else None
+    return mods
+
+
+def seed(db_path, mods=1000, days=365, workers=4, archive_dir=ARCHIVE_DIR, storage='full'):
+    """Write `days` daily snapshots of `mods` mods ending today, then derive the stats tables."""
+    db_handler.configure(backend='sqlite', sqlite_path=db_path, scenario_storage=storage)
+    population = generate_mods(mods, days, archive_dir)
+    start_date = datetime.now().date() - timedelta(days=days - 1)
+
+    connection = db_handler.get_connection()
+    cursor = connection.cursor()
+    connection.start_transaction()
+    try:
+        rows = 0
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            listed = []
+            for mod in population:
+                if offset < mod['launch'] or (mod['delisted'] is not None and offset >= mod['delisted']):
+                    continue
+                plays = int(random.expovariate(1 / mod['rate']))
+                mod['play-count'] += plays
+                mod['favs'] += int(plays * 0.01 + random.random())  # About one fav per hundred plays
+                listed.append(mod)
+            upsert_scenarios(cursor, listed, day)
+            finish_scenarios(cursor, [mod['value'] for mod in listed], day)
+            rows += len(listed)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+    _, _, statistics, trackers = backfill(start_date, workers=workers)
+    migrate()  # Indexes last, after the bulk load
+    return rows, len(statistics), len(trackers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a local SQLite database with synthetic stats history.")
+    parser.add_argument('--db', default=db_handler.SQLITE_PATH)
+    parser.add_argument('--mods', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--workers', type=int, default=4, help="Backfill processes")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help="Real mods to start from")
+    parser.add_argument('--storage', choices=db_handler.SCENARIO_STORAGES, default='full',
+                        help="Scenarios storage to write (serve with the same SCENARIO_STORAGE)")
+    parser.add_argument('--force', action='store_true', help="Replace an existing database file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} already exists; pass --force to replace it")
+        os.remove(args.db)
+
+    start = time.perf_counter()
+    rows, statistics, trackers = seed(args.db, args.mods, args.days, args.workers, args.archive_dir, args.storage)
+    print(f"Seeded {args.db}: {rows} Scenarios rows, {statistics} PlayStatistics rows, "
+          f"{trackers} PlayTracker rows in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
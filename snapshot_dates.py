@@ -0,0 +1,73 @@
+# snapshot_dates.py
+# In-process index of which Scenarios.entry_date snapshots exist.
+import bisect
+import threading
+import time
+from datetime import date, datetime
+
+ALL_DATES_QUERY = "SELECT DISTINCT entry_date FROM Scenarios ORDER BY entry_date;"
+NEWER_DATES_QUERY = "SELECT DISTINCT entry_date FROM Scenarios WHERE entry_date > %s ORDER BY entry_date;"
+OLDEST_DATE_QUERY = "SELECT MIN(entry_date) FROM Scenarios;"
+
+
+def to_date(value):
+    # Normalise DATE column values, which some drivers hand back as strings
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+class SnapshotDates:
+    """Sorted list of snapshot dates, loaded once and extended when new snapshots land."""
+
+    def __init__(self, fetch_rows, check_interval=300):
+        self.fetch_rows = fetch_rows  # Callable taking (query, params) and returning dict rows
+        self.check_interval = check_interval
+        self.dates = []
+        self.last_check = None
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Pick up snapshots newer than the last known date, at most once per check_interval."""
+        now = time.monotonic()
+        if not force and self.last_check is not None and now - self.last_check < self.check_interval:
+            return
+        with self.lock:
+            if not force and self.last_check is not None and now - self.last_check < self.check_interval:
+                return
+            dates = self.dates
+            if dates:
+                rows = self.fetch_rows(NEWER_DATES_QUERY, (dates[-1],))
+                # Retention (partitions.py) drops the oldest snapshots while the app runs
+                oldest = [to_date(value) for row in self.fetch_rows(OLDEST_DATE_QUERY, None)
+                          for value in row.values() if value is not None]
+                dates = dates[bisect.bisect_left(dates, min(oldest)):] if oldest else []
+            else:
+                rows = self.fetch_rows(ALL_DATES_QUERY, None)
+            # Replace rather than append so readers never see a half-updated list
+            self.dates = dates + [to_date(row['entry_date']) for row in rows]
+            self.last_check = now
+
+    def latest(self):
+        self.refresh()
+        return self.dates[-1] if self.dates else None
+
+    def earliest(self):
+        self.refresh()
+        return self.dates[0] if self.dates else None
+
+    def latest_on_or_before(self, day):
+        """Return the newest snapshot date that is <= day, or None."""
+        self.refresh()
+        dates = self.dates
+        position = bisect.bisect_right(dates, to_date(day))
+        return dates[position - 1] if position else None
+
+    def __contains__(self, day):
+        self.refresh()
+        dates = self.dates
+        day = to_date(day)
+        position = bisect.bisect_left(dates, day)
+        return position < len(dates) and dates[position] == day
@@ -0,0 +1,122 @@
+# static_export.py
+# Renders the stats dashboard into a directory of static files after each scrape.
+#
+# Every page is written to <url path>/index.html (JSON endpoints to index.json),
+# query string variants such as /?sort_by=favs to index__sort_by-favs.html.
+# A static server only needs try_files along the lines of
+#   $uri/index__sort_by-$arg_sort_by.html $uri/index.html $uri/index.json
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import unquote, urlsplit
+
+from flask import url_for
+
+from flask_app import app, get_data_from_db, snapshot_dates, last_day_of_month
+
+SORT_ORDERS = ['value', 'play_count', 'favs']
+TOP_MODS_DAYS = [1, 3, 7, 30]
+
+
+def week_ending(period_value):
+    # Same link target as templates/by_week.html
+    year, week_number = period_value.split('-')
+    return (datetime.strptime(year + '-W' + week_number + '-0', "%Y-W%U-%w") + timedelta(days=7)).strftime('%Y-%m-%d')
+
+
+def list_pages(days=30):
+    latest_date = snapshot_dates.latest()
+    if latest_date is None:
+        return []
+
+    latest_mods = get_data_from_db("SELECT value FROM Scenarios WHERE entry_date = %s;", (latest_date,))
+    weeks = get_data_from_db("SELECT period_value FROM PlayTracker WHERE period_type = 'week';")
+    months = get_data_from_db("SELECT period_value FROM PlayTracker WHERE period_type = 'month';")
+
+    with app.test_request_context():
+        pages = [url_for('index'), url_for('recent'), url_for('by_day'), url_for('by_week'), url_for('by_month')]
+        pages += [url_for('index', sort_by=sort_by) for sort_by in SORT_ORDERS]
+        pages += [url_for('get_top_mods', days=days_back) for days_back in TOP_MODS_DAYS]
+        pages += [url_for('mod_detail', mod_name=mod['value']) for mod in latest_mods]
+        for offset in range(days):
+            day = (latest_date - timedelta(days=offset)).strftime('%Y-%m-%d')
+            pages.append(url_for('mod_plays_by_period', period='day', date=day))
+        for week in weeks:
+            pages.append(url_for('mod_plays_by_period', period='week', date=week_ending(week['period_value'])))
+        for month in months:
+            year, month_number = map(int, month['period_value'].split('-'))
+            pages.append(url_for('mod_plays_by_period', period='month', date=last_day_of_month(year, month_number)))
+    return pages
+
+
+def output_path(url, mimetype):
+    parts = urlsplit(url)
+    directory = unquote(parts.path).strip('/')
+    if parts.query:
+        variant = parts.query.replace('=', '-').replace('&', '__')
+        filename = f"index__{variant}.html"
+    elif mimetype == 'application/json':
+        filename = 'index.json'
+    else:
+        filename = 'index.html'
+    return os.path.join(directory, filename)
+
+
+def render_page(output_dir, url):
+    response = app.test_client().get(url)
+    if response.status_code != 200:
+        return url, None, response.status_code
+    path = os.path.join(output_dir, output_path(url, response.mimetype))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as page_file:
+        page_file.write(response.data)
+    return url, len(response.data), response.status_code
+
+
+def export_site(output_dir, days=30, workers=8):
+    """Render every dashboard page into output_dir, replacing its previous contents."""
+    start = time.perf_counter()
+    pages = list_pages(days)
+
+    # Build next to the target and swap it in at the end so the site is never half written
+    parent_dir = os.path.dirname(os.path.abspath(output_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix='.static_export-', dir=parent_dir)
+    os.chmod(build_dir, 0o755)
+    shutil.copytree(app.static_folder, os.path.join(build_dir, 'static'))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda url: render_page(build_dir, url), pages))
+
+    if os.path.exists(output_dir):
+        old_dir = build_dir + '-old'
+        os.rename(output_dir, old_dir)
+        os.rename(build_dir, output_dir)
+        shutil.rmtree(old_dir)
+    else:
+        os.rename(build_dir, output_dir)
+
+    written = [result for result in results if result[1] is not None]
+    skipped = [result for result in results if result[1] is None]
+    print(f"Exported {len(written)} pages ({sum(size for _, size, _ in written)} bytes) "
+          f"to {output_dir} in {time.perf_counter() - start:.1f}s")
+    for url, _, status in skipped:
+        print(f"Skipped {url} (HTTP {status})")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the stats dashboard as static pages.")
+    parser.add_argument('--output', default='static_site', help="Directory to write the site to")
+    parser.add_argument('--days', type=int, default=30, help="How many recent days of mod_plays pages to render")
+    parser.add_argument('--workers', type=int, default=8, help="Pages rendered in parallel")
+    args = parser.parse_args()
+    export_site(args.output, days=args.days, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
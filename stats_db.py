@@ -0,0 +1,194 @@
+# stats_db.py
+# Cached data access shared by the dashboard routes and the JSON API.
+#
+# While the database is unreachable (PoolError), snapshot reads are answered from the
+# history store, and the /recent, /by_day, /by_week and /by_month rows from the JSON
+# files in the archive (archived_stats.py). What has nothing to fall back on answers
+# 503: every /api route, and the snapshot pages (/, /mod, /get_top_mods, /mod_plays)
+# when no history store has been built.
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, request, make_response, has_request_context
+
+from db_handler import get_connection, PoolError
+from history_store import HistoryStore
+from query_cache import QueryCache
+from scenario_changes import scenario_reads
+from snapshot_dates import SnapshotDates
+from storage import VALUE_ORDER
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Offline history built by `python history_store.py build`; answers snapshot queries when
+# the database is unreachable, and top-mover queries outright with HISTORY_ANALYTICS=1
+HISTORY_PATH = os.environ.get('HISTORY_STORE', os.path.join(APP_DIR, 'data_archive', 'history.bin'))
+HISTORY_ANALYTICS = os.environ.get('HISTORY_ANALYTICS', '0') == '1'
+# The scraper's archive; its dailyStats_ and tracker files stand in for PlayStatistics and PlayTracker
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(APP_DIR, 'data_archive'))
+# In-process mod x date matrix (mod_matrix.py) answering the snapshot, delta and top-K routes
+MOD_MATRIX = os.environ.get('MOD_MATRIX', '0') == '1'
+
+
+def query_db(query, params=None):
+    # Attribute pool hold times to the route that ran the query
+    conn = get_connection(caller=request.endpoint if has_request_context() else None)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(scenario_reads(query), params)
+    data = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return data
+
+def stream_from_db(query, params=None, batch_size=1000):
+    """Yield result rows as plain tuples, fetching batch_size rows at a time.
+
+    Uses an unbuffered cursor, so memory stays flat however many rows match.
+    The connection is held until the generator is exhausted or closed.
+    """
+    conn = get_connection(caller=request.endpoint if has_request_context() else None)
+    cursor = conn.cursor(buffered=False)
+    finished = False
+    try:
+        cursor.execute(scenario_reads(query), params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        finished = True
+    finally:
+        if finished:
+            cursor.close()
+            conn.close()
+        else:
+            # Unread rows are still pending on the wire, so don't hand the connection back
+            conn.discard()
+
+_history = None
+_matrix = None
+
+def get_history_store():
+    # Opened on first use and reopened when a rebuild replaces the file; None if never built
+    global _history
+    try:
+        mtime = os.path.getmtime(HISTORY_PATH)
+    except OSError:
+        return None
+    if _history is None or _history[0] != mtime:
+        _history = (mtime, HistoryStore(HISTORY_PATH))
+    return _history[1]
+
+def get_mod_matrix():
+    # Loaded on first use and extended whenever the snapshot index moves; None unless MOD_MATRIX=1
+    global _matrix
+    if not MOD_MATRIX:
+        return None
+    if _matrix is None:
+        from mod_matrix import ModMatrix  # NumPy is only needed with the matrix enabled
+        _matrix = ModMatrix()
+    latest, earliest = snapshot_dates.latest(), snapshot_dates.earliest()
+    if latest is not None and (_matrix.latest() != latest or _matrix.earliest() != earliest):
+        try:
+            conn = get_connection(caller='mod_matrix')
+        except PoolError:
+            conn = None  # Keep answering from what's loaded
+        if conn is not None:
+            try:
+                _matrix.refresh(conn, oldest=earliest)
+            finally:
+                conn.close()
+    return _matrix if len(_matrix) else None
+
+def with_history_fallback(load, load_from_history):
+    # Answer from the history store when no database connection can be had
+    try:
+        return load()
+    except PoolError:
+        store = get_history_store()
+        if store is None:
+            raise
+        return load_from_history(store)
+
+def with_archive_fallback(load, load_from_archive):
+    # Answer from the scraper's archived JSON when no database connection can be had
+    try:
+        return load()
+    except PoolError:
+        return load_from_archive(ARCHIVE_DIR)
+def query_snapshot_dates(query, params=None):
+    def from_history(store):
+        after = params[0] if params else None
+        return [{'entry_date': day} for day in store.dates if after is None or day > after]
+    return with_history_fallback(lambda: query_db(query, params), from_history)
+
+# Index of the entry_date values present in Scenarios, shared by all routes
+snapshot_dates = SnapshotDates(query_snapshot_dates)
+
+# Query results only change when a new snapshot lands, so cache them per snapshot
+query_cache = QueryCache(max_entries=512)
+
+def get_data_from_db(query, params=None):
+    # Rows are shared between requests through the cache and must not be modified
+    version = snapshot_dates.latest()
+    return query_cache.get_or_load(version, query, params, lambda: query_db(query, params))
+
+def code_fingerprint():
+    # Changes whenever the app or its templates are redeployed, so old ETags stop matching
+    paths = [os.path.join(APP_DIR, name) for name in os.listdir(APP_DIR) if name.endswith('.py')]
+    for root, _, files in os.walk(os.path.join(APP_DIR, 'templates')):
+        paths.extend(os.path.join(root, name) for name in files)
+    return ''.join(f"{path}:{os.path.getmtime(path)}" for path in sorted(paths))
+
+ETAG_SALT = code_fingerprint()
+
+def conditional_get(view):
+    # Validate ETag / Last-Modified before doing any work; pages only change with a new snapshot
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            version = snapshot_dates.latest()
+        except PoolError:
+            version = None  # Nothing to validate against; the view falls back or answers 503
+        if version is None:
+            return view(*args, **kwargs)
+
+        request_key = f"{ETAG_SALT}|{version}|{request.path}|{sorted(request.args.items(multi=True))}"
+        etag = hashlib.sha1(request_key.encode('utf-8')).hexdigest()
+        last_modified = datetime(version.year, version.month, version.day, tzinfo=timezone.utc)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = request.if_modified_since is not None and request.if_modified_since >= last_modified
+
+        if not_modified:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+# Ordered, so rows tied on a sorted column come out the same in either storage mode and from the matrix
+SNAPSHOT_QUERY = f"SELECT * FROM Scenarios WHERE entry_date = %s ORDER BY {VALUE_ORDER};"
+
+def get_snapshot(day):
+    # Skip the query entirely when no snapshot exists for that day
+    if day is None or day not in snapshot_dates:
+        return []
+    matrix = get_mod_matrix()
+    if matrix is not None and day in matrix:
+        # Rows are built once per snapshot version, like query results
+        return query_cache.get_or_load(snapshot_dates.latest(), 'mod_matrix.snapshot', (day,),
+                                       lambda: matrix.snapshot(day))
+    return with_history_fallback(lambda: get_data_from_db(SNAPSHOT_QUERY, (day,)),
+                                 lambda store: store.snapshot(day))
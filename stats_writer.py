@@ -0,0 +1,239 @@
+# stats_writer.py
+# Batched writes of Scenarios snapshots and the derived PlayStatistics / PlayTracker rows.
+# Callers own the transaction; nothing here commits.
+import queue
+import threading
+import time
+from datetime import date
+
+from db_handler import change_only, get_dialect
+from snapshot_dates import to_date
+
+BATCH_SIZE = 1000  # Rows per multi-row INSERT
+STREAM_BATCH_SIZE = 100  # Rows per flush when writes overlap the fetch
+
+def upsert_scenarios(cursor, entries, entry_date):
+    if change_only():
+        write_scenario_changes(cursor, entries, entry_date)
+        return
+    # Insert data into Scenarios table, batched into multi-row statements
+    scenario_query = """
+    INSERT INTO Scenarios (value, name, favs, play_count, entry_date)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name = VALUES(name),
+        favs = VALUES(favs),
+        play_count = VALUES(play_count),
+        entry_date = VALUES(entry_date);
+    """
+    scenario_values = [(entry['value'], entry['name'], entry['favs'], entry['play-count'], entry_date)
+                       for entry in entries]
+    for start in range(0, len(scenario_values), BATCH_SIZE):
+        cursor.executemany(scenario_query, scenario_values[start:start + BATCH_SIZE])
+
+
+def finish_scenarios(cursor, values, entry_date):
+    # Close a snapshot once all its mods are written; only change-only storage has work left
+    if change_only():
+        write_scenario_removals(cursor, values, entry_date)
+
+
+# --- Change-only storage (SCENARIO_STORAGE=changes) ---
+# Each ScenarioChanges row holds a mod's name and counters from entry_date up to, not
+# including, valid_until; CURRENT while they still hold. Days must be written in date
+# order; rewriting the newest day is fine.
+
+CURRENT = date(9999, 12, 31)
+
+
+def scenario_states(cursor, before, values=None):
+    """{value: (name, favs, play_count)} for every mod listed in the last snapshot before a date."""
+    query = "SELECT value, name, favs, play_count FROM ScenarioChanges WHERE valid_until >= %s AND entry_date < %s"
+    params = (before, before)
+    if values is not None:
+        query += f" AND value IN ({', '.join(['%s'] * len(values))})"
+        params += tuple(values)
+    cursor.execute(query + ";", params)
+    return {value: (name, favs, play_count) for value, name, favs, play_count in cursor.fetchall()}
+
+
+def insert_scenario_changes(cursor, rows):
+    # Each row is (value, entry_date, valid_until, name, favs, play_count)
+    change_query = """
+    INSERT INTO ScenarioChanges (value, entry_date, valid_until, name, favs, play_count)
+    VALUES (%s, %s, %s, %s, %s, %s);
+    """
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(change_query, rows[start:start + BATCH_SIZE])
+
+
+def close_scenario_changes(cursor, values, entry_date):
+    # End the current row of each mod on entry_date
+    cursor.executemany("UPDATE ScenarioChanges SET valid_until = %s WHERE value = %s AND valid_until = %s;",
+                       [(entry_date, value, CURRENT) for value in values])
+
+
+def write_scenario_changes(cursor, entries, entry_date):
+    # Write a row only for mods that are new, relisted, or whose name or counters changed
+    entries = list(entries)
+    for start in range(0, len(entries), BATCH_SIZE):
+        batch = entries[start:start + BATCH_SIZE]
+        values = [entry['value'] for entry in batch]
+        placeholders = ', '.join(['%s'] * len(values))
+        # A rerun of the day undoes its earlier writes first, as the full table's upsert would
+        cursor.execute(f"DELETE FROM ScenarioChanges WHERE entry_date = %s AND value IN ({placeholders});",
+                       (entry_date,) + tuple(values))
+        cursor.execute(f"UPDATE ScenarioChanges SET valid_until = %s WHERE valid_until = %s AND value IN ({placeholders});",
+                       (CURRENT, entry_date) + tuple(values))
+
+        states = scenario_states(cursor, entry_date, values)
+        changed = [entry for entry in batch
+                   if states.get(entry['value']) != (entry['name'], entry['favs'], entry['play-count'])]
+        close_scenario_changes(cursor, [entry['value'] for entry in changed if entry['value'] in states], entry_date)
+        insert_scenario_changes(cursor, [(entry['value'], entry_date, CURRENT, entry['name'], entry['favs'],
+                                          entry['play-count']) for entry in changed])
+    if entries:
+        cursor.execute("INSERT IGNORE INTO ScenarioDates (entry_date) VALUES (%s);", (entry_date,))
+
+
+def write_scenario_removals(cursor, values, entry_date):
+    # Mods listed before but missing from this snapshot stop being current on entry_date
+    seen = set(values)
+    cursor.execute("SELECT value, entry_date FROM ScenarioChanges WHERE valid_until = %s;", (CURRENT,))
+    missing = [(value, to_date(started)) for value, started in cursor.fetchall() if value not in seen]
+    # Rows an earlier run of the same day opened are dropped rather than closed
+    cursor.executemany("DELETE FROM ScenarioChanges WHERE value = %s AND entry_date = %s;",
+                       [(value, started) for value, started in missing if started == entry_date])
+    close_scenario_changes(cursor, [value for value, started in missing if started != entry_date], entry_date)
+
+
+def insert_play_statistics(cursor, rows):
+    # Insert data into PlayStatistics table, one statement for all rows
+    # Each row is (date, time_period, change, most_played_mod)
+    play_stats_query = """
+    INSERT INTO PlayStatistics (date, time_period, play_change, most_played_mod, play_count)
+    VALUES (%s, %s, %s, %s, %s);
+    """
+    play_stats_values = [(entry_date, period, change, most_played_mod['name'], most_played_mod['play_count'])
+                         for entry_date, period, change, most_played_mod in rows]
+    for start in range(0, len(play_stats_values), BATCH_SIZE):
+        cursor.executemany(play_stats_query, play_stats_values[start:start + BATCH_SIZE])
+
+
+def delete_play_statistics(cursor, start_date, end_date):
+    # Clear a date range before it is rebuilt
+    cursor.execute("DELETE FROM PlayStatistics WHERE date BETWEEN %s AND %s;", (start_date, end_date))
+
+
+def has_unique_tracker_period(cursor):
+    # Migration 002 adds the unique key; databases that haven't run it only have the id
+    for unique, columns in get_dialect().indexes(cursor, 'PlayTracker').values():
+        if unique and columns == ['period_type', 'period_value']:
+            return True
+    return False
+
+
+def upsert_trackers(cursor, trackers):
+    # Insert or update every PlayTracker row. With the unique key on (period_type,
+    # period_value) that's one statement; without it an upsert would only insert
+    # duplicates, so the existing periods are looked up and updated, the rest inserted.
+    # Each tracker is (period_type, period_value, total_plays, most_played_mod)
+    tracker_values = [(period_type, period_value, total_plays, most_played_mod['name'], most_played_mod['play_count'])
+                      for period_type, period_value, total_plays, most_played_mod in trackers]
+    if not tracker_values:
+        return
+    if has_unique_tracker_period(cursor):
+        tracker_query = """
+        INSERT INTO PlayTracker (period_type, period_value, total_plays, most_played_mod, play_count)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            total_plays = VALUES(total_plays),
+            most_played_mod = VALUES(most_played_mod),
+            play_count = VALUES(play_count);
+        """
+        cursor.executemany(tracker_query, tracker_values)
+        return
+
+    # One row per week, month and year, so reading the keys of the period types written is cheap
+    period_types = sorted({row[0] for row in tracker_values})
+    cursor.execute(f"SELECT period_type, period_value FROM PlayTracker WHERE period_type IN "
+                   f"({', '.join(['%s'] * len(period_types))});", tuple(period_types))
+    existing = set(cursor.fetchall())
+    update_query = """
+    UPDATE PlayTracker
+    SET total_plays = %s, most_played_mod = %s, play_count = %s
+    WHERE period_type = %s AND period_value = %s;
+    """
+    insert_query = """
+    INSERT INTO PlayTracker (period_type, period_value, total_plays, most_played_mod, play_count)
+    VALUES (%s, %s, %s, %s, %s);
+    """
+    updates = [row[2:] + row[:2] for row in tracker_values if row[:2] in existing]
+    inserts = [row for row in tracker_values if row[:2] not in existing]
+    if updates:
+        cursor.executemany(update_query, updates)
+    if inserts:
+        cursor.executemany(insert_query, inserts)
+
+
+class ScenarioWriter(threading.Thread):
+    """Upserts Scenarios entries handed over through a bounded queue, flushing each full batch.
+
+    The producer blocks on put() once queue_size entries are waiting, so memory stays
+    flat however far the fetch runs ahead of the database.
+    """
+
+    _DONE = object()
+
+    def __init__(self, cursor, entry_date, batch_size=STREAM_BATCH_SIZE, queue_size=None):
+        super().__init__(name='ScenarioWriter', daemon=True)
+        self.cursor = cursor
+        self.entry_date = entry_date
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size or 2 * batch_size)
+        self.values = set()  # Every mod written, for finish_scenarios()
+        self.rows = 0
+        self.batches = 0
+        self.busy = 0.0  # Seconds spent inside the database
+        self.error = None
+
+    def put(self, entry):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(entry)
+
+    def flush(self, batch):
+        start = time.perf_counter()
+        upsert_scenarios(self.cursor, batch, self.entry_date)
+        self.values.update(entry['value'] for entry in batch)
+        self.busy += time.perf_counter() - start
+        self.rows += len(batch)
+        self.batches += 1
+
+    def run(self):
+        batch = []
+        while True:
+            entry = self.queue.get()
+            if entry is self._DONE:
+                break
+            if self.error is not None:
+                continue  # Keep draining so the producer never blocks on a dead writer
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                try:
+                    self.flush(batch)
+                except Exception as e:
+                    self.error = e
+                batch = []
+        if batch and self.error is None:
+            try:
+                self.flush(batch)
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        """Flush what's left and wait for the writer; re-raises a failed write."""
+        self.queue.put(self._DONE)
+        self.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,301 @@
+# storage.py
+# SQL dialects of the supported backends and the embedded SQLite implementation.
+#
+# Every query in the app is written once, in MySQL syntax with %s placeholders. The
+# MySQL backend runs it as is; the SQLite backend translates the few MySQL-only
+# constructs (placeholders, INSERT IGNORE, ON DUPLICATE KEY UPDATE, CAST AS BINARY)
+# before executing, so the dashboard, API, scraper and backfill run unchanged on a
+# local file.
+import re
+import sqlite3
+from datetime import date, datetime
+from functools import lru_cache
+
+# Scenarios rebuilt from the change-only tables (scenario_changes.py): every snapshot date
+# joined with the rows valid on it. Same columns and rows as the full Scenarios table.
+# CROSS JOIN keeps SQLite from reordering the join: walking the dates first lets the
+# API's newest-first page stop after its LIMIT instead of sorting every row. MySQL
+# reads it as a plain inner join.
+SCENARIO_HISTORY_VIEW = """
+    SELECT c.value, c.name, c.favs, c.play_count, d.entry_date
+    FROM ScenarioDates d
+    CROSS JOIN ScenarioChanges c ON c.entry_date <= d.entry_date AND c.valid_until > d.entry_date
+"""
+
+SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Scenarios (
+        value VARCHAR(255) NOT NULL,
+        name VARCHAR(255),
+        favs INT,
+        play_count INT,
+        entry_date DATE NOT NULL,
+        PRIMARY KEY (value, entry_date)
+    );
+    CREATE TABLE IF NOT EXISTS PlayStatistics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATE,
+        time_period VARCHAR(50),
+        play_change INT,
+        most_played_mod VARCHAR(255),
+        play_count INT
+    );
+    CREATE TABLE IF NOT EXISTS PlayTracker (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        period_type VARCHAR(10),
+        period_value VARCHAR(10),
+        total_plays INT,
+        most_played_mod VARCHAR(255),
+        play_count INT,
+        UNIQUE (period_type, period_value)
+    );
+    CREATE TABLE IF NOT EXISTS ScenarioChanges (
+        value VARCHAR(255) NOT NULL,
+        entry_date DATE NOT NULL,
+        valid_until DATE NOT NULL,
+        name VARCHAR(255),
+        favs INT,
+        play_count INT,
+        PRIMARY KEY (value, entry_date)
+    );
+    CREATE TABLE IF NOT EXISTS ScenarioDates (
+        entry_date DATE NOT NULL PRIMARY KEY
+    );
+    CREATE VIEW IF NOT EXISTS ScenarioHistory AS
+""" + SCENARIO_HISTORY_VIEW + ";"
+
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()[:10]))
+
+
+ON_DUPLICATE_KEY = re.compile(r'ON DUPLICATE KEY UPDATE(.*?)(;?\s*)$', re.S | re.I)
+INSERT_IGNORE = re.compile(r'^(\s*)INSERT\s+IGNORE\b', re.I)
+CAST_BINARY = re.compile(r'CAST\((\w+) AS BINARY\)', re.I)
+
+# Snapshot rows are ordered by the bytes of the mod value, which is code point order: the
+# order Python sorts values in, so the mod matrix and history store list them the same way.
+# MySQL's default collations ignore case. SQLite already compares text bytewise; there the
+# cast becomes +value, which sorts the day's rows instead of letting the planner walk
+# ScenarioChanges' primary key in value order through the whole table.
+VALUE_ORDER = 'CAST(value AS BINARY)'
+
+
+@lru_cache(maxsize=512)
+def sqlite_query(query):
+    # %s placeholders and MySQL's upsert clauses, spelled the SQLite way
+    query = query.replace('%s', '?').replace('%%', '%')
+    query = INSERT_IGNORE.sub(r'\1INSERT OR IGNORE', query)
+    query = CAST_BINARY.sub(r'+\1', query)
+    match = ON_DUPLICATE_KEY.search(query)
+    if match:
+        assignments = re.sub(r'VALUES\((\w+)\)', r'excluded.\1', match.group(1))
+        query = query[:match.start()] + 'ON CONFLICT DO UPDATE SET' + assignments + match.group(2)
+    return query
+
+
+# How a query plan reads a table: every row, every entry of an index, or only matching keys
+FULL_SCAN = 'full scan'
+INDEX_SCAN = 'index scan'
+LOOKUP = 'lookup'
+
+SQLITE_PLAN_LINE = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?(\S+)(?: AS (\S+))?(.*)$')
+SQLITE_DERIVED = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\S+)')
+
+
+class MySQLDialect:
+    name = 'mysql'
+
+    def translate(self, query):
+        return query  # Queries are written for MySQL to begin with
+
+    def indexes(self, cursor, table):
+        """{index name: (unique, [columns])} for a table, the primary key included."""
+        cursor.execute("""
+            SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX;
+        """, (table,))
+        indexes = {}
+        for name, non_unique, column in cursor.fetchall():
+            indexes.setdefault(name, (not int(non_unique), []))[1].append(column)
+        return indexes
+
+    def table_sizes(self, cursor, tables):
+        """{table: (rows, data bytes, index bytes)}; MySQL's row counts are estimates."""
+        placeholders = ', '.join(['%s'] * len(tables))
+        cursor.execute(f"""
+            SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders});
+        """, tuple(tables))
+        return {name: (rows, data, index) for name, rows, data, index in cursor.fetchall()}
+
+    def partitions(self, cursor, table):
+        """[(name, upper bound or None for MAXVALUE, estimated rows)]; empty if not partitioned."""
+        cursor.execute("""
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION;
+        """, (table,))
+        partitions = []
+        for name, description, rows in cursor.fetchall():
+            # RANGE COLUMNS bounds come back quoted: '2023-12-01'
+            bound = None if description == 'MAXVALUE' else datetime.strptime(description.strip("'"), '%Y-%m-%d').date()
+            partitions.append((name, bound, rows))
+        return partitions
+
+    def explain(self, cursor, query, params=None):
+        """[(table, access, detail, partitions read or None)] for every base table the query reads."""
+        cursor.execute('EXPLAIN ' + query, params or ())
+        columns = [column[0] for column in cursor.description]
+        plan = []
+        for row in cursor.fetchall():
+            row = dict(zip(columns, row))
+            table = row['table']
+            # Derived tables and unions (<derived2>, <union1,3>) are read from memory, and
+            # MIN()/MAX() answered from an index end have no table at all
+            if table is None or table.startswith('<'):
+                continue
+            access = {'ALL': FULL_SCAN, 'index': INDEX_SCAN}.get(row['type'], LOOKUP)
+            partitions = row['partitions'].split(',') if row.get('partitions') else None
+            plan.append((table, access, f"type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}",
+                         partitions))
+        return plan
+
+
+class SQLiteDialect:
+    name = 'sqlite'
+
+    def translate(self, query):
+        return sqlite_query(query)
+
+    def indexes(self, cursor, table):
+        cursor.execute(f"PRAGMA index_list({table});")
+        indexes = {}
+        for _, name, unique, *_ in cursor.fetchall():
+            cursor.execute(f"PRAGMA index_info({name});")
+            indexes[name] = (bool(unique), [column for _, _, column in cursor.fetchall()])
+        return indexes
+
+    def partitions(self, cursor, table):
+        return []  # SQLite has no table partitioning
+
+    def table_sizes(self, cursor, tables):
+        # Page sizes from the dbstat virtual table; an index counts towards the table it's on
+        sizes = {}
+        for table in tables:
+            cursor.execute(f"SELECT COUNT(*) FROM {table};")
+            rows = cursor.fetchone()[0]
+            cursor.execute("""
+                SELECT SUM(CASE WHEN s.type = 'table' THEN d.pgsize ELSE 0 END),
+                       SUM(CASE WHEN s.type = 'index' THEN d.pgsize ELSE 0 END)
+                FROM dbstat d JOIN sqlite_schema s ON s.name = d.name
+                WHERE s.tbl_name = %s;
+            """, (table,))
+            data, index = cursor.fetchone()
+            sizes[table] = (rows, data or 0, index or 0)
+        return sizes
+
+    def explain(self, cursor, query, params=None):
+        cursor.execute('EXPLAIN QUERY PLAN ' + query, params or ())
+        details = [row[3] for row in cursor.fetchall()]
+        derived = {match.group(1) for match in map(SQLITE_DERIVED.match, details) if match}
+        plan = []
+        for detail in details:
+            match = SQLITE_PLAN_LINE.match(detail)
+            # Subqueries and constant rows (SCAN CONSTANT ROW) aren't tables
+            if not match or match.group(2) in derived or match.group(2) == 'CONSTANT':
+                continue
+            if match.group(1) == 'SEARCH':
+                access = LOOKUP
+            elif 'INDEX' in match.group(4):
+                access = INDEX_SCAN
+            else:
+                access = FULL_SCAN
+            plan.append((match.group(2), access, detail, None))
+        return plan
+
+
+DIALECTS = {
+    'mysql': MySQLDialect(),
+    'sqlite': SQLiteDialect()
+}
+
+
+class SQLiteCursor:
+    """Accepts the MySQL driver's %s placeholders, upserts and dictionary=True rows."""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self.dictionary = dictionary
+
+    def execute(self, query, params=None):
+        self._cursor.execute(sqlite_query(query), params or ())
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(sqlite_query(query), seq_params)
+
+    def _convert(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return dict(zip([column[0] for column in self._cursor.description], row))
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._convert(row) for row in self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Local stand-in exposing the subset of the mysql.connector API the app uses."""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self._connection.executescript(SQLITE_SCHEMA)
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._connection.cursor(), dictionary=dictionary)
+
+    def start_transaction(self):
+        if not self._connection.in_transaction:
+            self._connection.execute('BEGIN')
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def ping(self, reconnect=False):
+        self._connection.execute('SELECT 1')
+
+    def is_connected(self):
+        try:
+            self.ping()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._connection.close()
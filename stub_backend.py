@@ -0,0 +1,115 @@
+# stub_backend.py
+# Local stand-in for the mod catalog and the CTS stats backend, for benchmarks and dry runs.
+#
+#   python stub_backend.py --snapshot data_archive/moddata_20231108.json --latency 0.05
+#
+# Serves /MODLOADERFILE.html and /api/get_mod?modName=... from an archived snapshot.
+import argparse
+import hashlib
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+def load_snapshot(path):
+    with open(path, 'r') as json_file:
+        return json.load(json_file)
+
+
+def catalog_html(mods):
+    options = []
+    for mod in mods:
+        options.append(f'<option value="{html.escape(mod["value"])}" '
+                       f'data-tags="{html.escape(" ".join(mod["data-tags"]))}">{html.escape(mod["name"])}</option>')
+    return '<select id="modSelect">\n' + '\n'.join(options) + '\n</select>\n'
+
+
+class StubBackend(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, mods, latency=0.0, error_rate=0.0):
+        super().__init__(address, StubHandler)
+        self.mods = {mod['value']: mod for mod in mods}
+        self.catalog = catalog_html(mods).encode('utf-8')
+        self.catalog_etag = '"' + hashlib.sha1(self.catalog).hexdigest() + '"'
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests_served = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real backends
+    disable_nagle_algorithm = True
+
+    def send_body(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests_served += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        parts = urlsplit(self.path)
+        if parts.path.endswith('/MODLOADERFILE.html'):
+            if self.headers.get('If-None-Match') == server.catalog_etag:
+                self.send_body(304, b'', 'text/html; charset=utf-8', server.catalog_etag)
+            else:
+                self.send_body(200, server.catalog, 'text/html; charset=utf-8', server.catalog_etag)
+        elif parts.path == '/api/get_mod':
+            if server.error_rate and random.random() < server.error_rate:
+                self.send_body(503, b'{"error": "injected failure"}', 'application/json')
+                return
+            value = parse_qs(parts.query).get('modName', [''])[0]
+            mod = server.mods.get(value)
+            if mod is None:
+                body = {}
+            else:
+                body = {'favs': mod['favs'], 'playCount': mod['play-count']}
+            self.send_body(200, json.dumps(body).encode('utf-8'), 'application/json')
+        else:
+            self.send_body(404, b'not found', 'text/plain')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_backend(mods, latency=0.0, error_rate=0.0, port=0):
+    """Start the stub on a background thread; call .shutdown() on the result to stop it."""
+    server = StubBackend(('127.0.0.1', port), mods, latency, error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stub mod catalog and stats backend.")
+    parser.add_argument('--snapshot', default='data_archive/moddata_20231108.json')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of get_mod calls answered with 503")
+    args = parser.parse_args()
+
+    server = StubBackend(('127.0.0.1', args.port), load_snapshot(args.snapshot), args.latency, args.error_rate)
+    print(f"Stub backend on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# test_api.py
+# Cursor validation of the JSON API, against an empty local SQLite database.
+#
+#   python -m pytest tests
+import base64
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db_handler
+from api import ApiError, decode_cursor, encode_cursor
+
+
+def cursor_of(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+@pytest.fixture
+def client(tmp_path):
+    db_handler.configure(backend='sqlite', sqlite_path=str(tmp_path / 'stats.db'))
+    from flask_app import app
+    return app.test_client()
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor(['2023-11-08', 'mod']), ['entry_date', 'value']) == ['2023-11-08', 'mod']
+
+
+@pytest.mark.parametrize('values', [[{}, 1], [[], 'a'], [True, 'a'], [None, 'a'], ['a'], {'a': 1}])
+def test_malformed_cursor_rejected(values):
+    with pytest.raises(ApiError):
+        decode_cursor(cursor_of(values), ['entry_date', 'value'])
+
+
+def test_none_only_for_nullable_columns():
+    assert decode_cursor(cursor_of([None, 'week']), ['period_value', 'period_type'],
+                         nullable=['period_value']) == [None, 'week']
+
+
+@pytest.mark.parametrize('cursor', [cursor_of([{}, 1]), cursor_of([None, 'mod']), 'not base64!', 'é'])
+def test_malformed_cursor_is_a_400(client, cursor):
+    response = client.get('/api/scenarios', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
@@ -0,0 +1,70 @@
+# test_offline.py
+# What the dashboard and the API answer while no database connection can be opened.
+#
+#   python -m pytest tests
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db_handler
+import stats_db
+
+
+def write_json(path, data):
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file, indent=4)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # SQLite can't create a file in a directory that doesn't exist, so every checkout fails
+    db_handler.configure(backend='sqlite', sqlite_path=str(tmp_path / 'missing' / 'stats.db'))
+    archive_dir = tmp_path / 'data_archive'
+    archive_dir.mkdir()
+    today = datetime.now().strftime('%Y%m%d')
+    write_json(archive_dir / f'dailyStats_{today}.json', {
+        'date': today,
+        'total_plays': {
+            time_period: {'change': 120 * days, 'most_played_mod': {'name': 'Day Mod', 'play_count': 40 * days}}
+            for time_period, days in [('last_day', 1), ('last_three_days', 3), ('last_week', 7), ('last_month', 30)]
+        }
+    })
+    write_json(archive_dir / 'weekTracker.json',
+               {'2023-45': {'total_plays': 8520, 'most_played_mod': {'name': 'Tracked Week Mod', 'play_count': 1242}}})
+    write_json(archive_dir / 'monthTracker.json',
+               {'2023-11': {'total_plays': 18641, 'most_played_mod': {'name': 'Tracked Month Mod', 'play_count': 2428}}})
+    monkeypatch.setattr(stats_db, 'ARCHIVE_DIR', str(archive_dir))
+    monkeypatch.setattr(stats_db, 'HISTORY_PATH', str(tmp_path / 'history.bin'))
+    # Forget snapshot dates other tests loaded, so the index has to ask the database
+    monkeypatch.setattr(stats_db.snapshot_dates, 'dates', [])
+    monkeypatch.setattr(stats_db.snapshot_dates, 'last_check', None)
+    from flask_app import app
+    return app.test_client()
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('/recent', 'Day Mod'),
+    ('/by_day', 'Day Mod'),
+    ('/by_week', 'Tracked Week Mod'),
+    ('/by_month', 'Tracked Month Mod')
+])
+def test_statistics_pages_fall_back_to_the_archive(client, path, expected):
+    response = client.get(path)
+    assert response.status_code == 200
+    assert expected in response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('path', ['/api/scenarios', '/api/play_tracker', '/api/scenarios/export.ndjson'])
+def test_api_is_a_503(client, path):
+    response = client.get(path)
+    assert response.status_code == 503
+    assert 'error' in response.get_json()
+
+
+def test_snapshot_pages_without_a_history_store_are_a_503(client):
+    assert client.get('/').status_code == 503